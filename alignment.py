@@ -0,0 +1,219 @@
+"""
+Whole-text alignment of typed text against the original.
+
+Alignment runs in two levels so it stays linear in the text length:
+
+1. Words are aligned with a banded resynchronisation pass. When two
+   words differ, the nearest offsets (at most ``BAND`` words on either
+   side) where both texts agree again are searched, so one skipped or
+   extra word no longer shifts every later word out of alignment.
+2. Each mismatched block of words is aligned character by character
+   with an exact edit-distance traceback, including the whitespace
+   between its words, so merged or split words cost one error.
+
+Original words the typist never reached are reported separately from
+the character errors.
+"""
+import re
+import logging
+from typing import List, NamedTuple, Tuple
+
+logger = logging.getLogger(__name__)
+
+# How many words ahead either text is searched to resynchronise
+BAND = 3
+# Mismatched blocks longer than this (in characters) are not merged further
+MAX_BLOCK_CHARS = 256
+
+MISSING = '∅'
+
+_WORD = re.compile(r'\S+')
+
+
+class CharError(NamedTuple):
+    """A single character-level error."""
+    kind: str        # 'substitution', 'insertion' or 'deletion'
+    position: int    # offset in the original text (insertions: where inserted)
+    original: str    # expected character, MISSING for insertions
+    typed: str       # typed character, MISSING for deletions
+
+
+class WordError(NamedTuple):
+    """A block of original words that was typed differently."""
+    original: str
+    typed: str
+    position: int    # index of the first original word
+
+
+class Alignment(NamedTuple):
+    """Result of aligning typed text against the original."""
+    char_errors: List[CharError]
+    word_errors: List[WordError]
+    unreached_words: int
+
+
+def _words(text: str) -> List[Tuple[str, int, int]]:
+    """Split text into (word, start, end) tuples."""
+    return [(m.group(), m.start(), m.end()) for m in _WORD.finditer(text)]
+
+
+# Resync candidates (orig skip, typed skip), nearest first and balanced skips first
+_CANDIDATES = sorted(((a, b) for a in range(BAND + 1) for b in range(BAND + 1) if a or b),
+                     key=lambda c: (c[0] + c[1], abs(c[0] - c[1])))
+
+
+def _align_words(orig: List[str], typed: List[str]) -> Tuple[List[Tuple[int, int, int, int]], int]:
+    """
+    Find the mismatched blocks between two word sequences.
+
+    Returns:
+        Tuple of the (i1, i2, j1, j2) blocks where ``orig[i1:i2]`` was typed
+        as ``typed[j1:j2]`` (everything between blocks matches exactly) and
+        the number of original words reached
+    """
+    blocks = []
+    i = j = 0
+    n, m = len(orig), len(typed)
+    while i < n and j < m:
+        if orig[i] == typed[j]:
+            i += 1
+            j += 1
+            continue
+
+        skip = (1, 1)
+        for a, b in _CANDIDATES:
+            if i + a < n and j + b < m and orig[i + a] == typed[j + b]:
+                # A match right after the mismatched word closes the block; further away,
+                # require the following word to agree too, unless a text ends there
+                if max(a, b) == 1 or i + a + 1 >= n or j + b + 1 >= m or orig[i + a + 1] == typed[j + b + 1]:
+                    skip = (a, b)
+                    break
+        else:
+            if j + 1 >= m and i + 1 < n:
+                # The typed text ends here: it may have merged the next original words,
+                # so take as many as align best, counting the rest as unreached
+                skip = (min(range(1, min(BAND, n - i) + 1),
+                            key=lambda k: _distance(' '.join(orig[i:i + k]), typed[j]) - k), 1)
+        blocks.append((i, i + skip[0], j, j + skip[1]))
+        i += skip[0]
+        j += skip[1]
+
+    if j < m:
+        # Extra words typed after the end of the original
+        blocks.append((n, n, j, m))
+    return blocks, i
+
+
+def _merge_blocks(blocks: List[Tuple[int, int, int, int]],
+                  orig: List[Tuple[str, int, int]],
+                  typed: List[Tuple[str, int, int]]) -> List[Tuple[int, int, int, int]]:
+    """Merge adjacent blocks so split or merged words are aligned together."""
+    merged = []
+    for block in blocks:
+        if merged and merged[-1][1] == block[0] and merged[-1][3] == block[2]:
+            i1, _, j1, _ = merged[-1]
+            candidate = (i1, block[1], j1, block[3])
+            if _span(orig, candidate[0], candidate[1]) <= MAX_BLOCK_CHARS and \
+                    _span(typed, candidate[2], candidate[3]) <= MAX_BLOCK_CHARS:
+                merged[-1] = candidate
+                continue
+        merged.append(block)
+    return merged
+
+
+def _span(words: List[Tuple[str, int, int]], start: int, end: int) -> int:
+    """Number of characters covered by ``words[start:end]``."""
+    return words[end - 1][2] - words[start][1] if end > start else 0
+
+
+def align_chars(a: str, b: str) -> List[Tuple[str, int, int]]:
+    """
+    Align two short strings with a minimum edit-distance traceback.
+
+    Args:
+        a: Expected string
+        b: Typed string
+
+    Returns:
+        List of (op, i, j) with op one of 'equal', 'substitution',
+        'deletion' (a[i] missing) or 'insertion' (b[j] extra)
+    """
+    # Matching ends need no DP; only the differing middle is aligned
+    prefix = 0
+    limit = min(len(a), len(b))
+    while prefix < limit and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix = 0
+    limit -= prefix
+    while suffix < limit and a[-1 - suffix] == b[-1 - suffix]:
+        suffix += 1
+    n, m = len(a) - prefix - suffix, len(b) - prefix - suffix
+    mid_a, mid_b = a[prefix:prefix + n], b[prefix:prefix + m]
+
+    # dist[i][j]: edit distance between mid_a[:i] and mid_b[:j]
+    dist = [list(range(m + 1))]
+    for i in range(1, n + 1):
+        row = [i] + [0] * m
+        prev = dist[-1]
+        ai = mid_a[i - 1]
+        for j in range(1, m + 1):
+            row[j] = min(prev[j - 1] + (ai != mid_b[j - 1]), prev[j] + 1, row[j - 1] + 1)
+        dist.append(row)
+
+    ops = [('equal', prefix + n + k, prefix + m + k) for k in reversed(range(suffix))]
+    i, j = n, m
+    while i or j:
+        if i and j and dist[i][j] == dist[i - 1][j - 1] + (mid_a[i - 1] != mid_b[j - 1]):
+            i, j = i - 1, j - 1
+            ops.append(('equal' if mid_a[i] == mid_b[j] else 'substitution', prefix + i, prefix + j))
+        elif i and dist[i][j] == dist[i - 1][j] + 1:
+            i -= 1
+            ops.append(('deletion', prefix + i, prefix + j))
+        else:
+            j -= 1
+            ops.append(('insertion', prefix + i, prefix + j))
+    ops.extend(('equal', k, k) for k in reversed(range(prefix)))
+    ops.reverse()
+    return ops
+
+
+def _distance(a: str, b: str) -> int:
+    """Edit distance between two short strings."""
+    return sum(op != 'equal' for op, _, _ in align_chars(a, b))
+
+
+def align_texts(original_text: str, typed_text: str) -> Alignment:
+    """
+    Align typed text against the original text.
+
+    Args:
+        original_text: The text that was to be typed
+        typed_text: The text that was actually typed
+
+    Returns:
+        Alignment with character errors, word errors and the number of
+        original words never reached
+    """
+    orig = _words(original_text)
+    typed = _words(typed_text)
+    blocks, reached = _align_words([w for w, _, _ in orig], [w for w, _, _ in typed])
+
+    char_errors = []
+    word_errors = []
+    for i1, i2, j1, j2 in _merge_blocks(blocks, orig, typed):
+        a_start = orig[i1][1] if i1 < len(orig) else len(original_text)
+        a = original_text[orig[i1][1]:orig[i2 - 1][2]] if i2 > i1 else ''
+        b = typed_text[typed[j1][1]:typed[j2 - 1][2]] if j2 > j1 else ''
+
+        word_errors.append(WordError(original=' '.join(w for w, _, _ in orig[i1:i2]),
+                                     typed=' '.join(w for w, _, _ in typed[j1:j2]),
+                                     position=i1))
+        for op, i, j in align_chars(a, b):
+            if op == 'substitution':
+                char_errors.append(CharError(op, a_start + i, a[i], b[j]))
+            elif op == 'deletion':
+                char_errors.append(CharError(op, a_start + i, a[i], MISSING))
+            elif op == 'insertion':
+                char_errors.append(CharError(op, a_start + i, MISSING, b[j]))
+
+    return Alignment(char_errors, word_errors, len(orig) - reached)
@@ -0,0 +1,230 @@
+"""
+Background analysis pipeline for typing test submissions.
+
+Submissions are persisted and scored inline, while the expensive stages
+(keystroke dynamics, WPM prediction and suggestion generation) run on a
+bounded pool of worker threads. Finished analyses are stored in the
+``test_analyses`` table so any worker process can serve them to clients
+polling by test id.
+"""
+import os
+import queue
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+from models import db, TestAnalysis
+
+logger = logging.getLogger(__name__)
+
+
+class PipelineFullError(Exception):
+    """Raised when the analysis queue has no room for another job."""
+
+
+class AnalysisJob:
+    """A single queued analysis job and its outcome."""
+
+    def __init__(self, job_id: str, owner_id: str, func: Callable[..., Dict[str, Any]],
+                 args: tuple):
+        """
+        Initialize the job.
+
+        Args:
+            job_id: Identifier of the job (the typing test id)
+            owner_id: User id that is allowed to read the result
+            func: Callable producing the analysis dictionary
+            args: Positional arguments for ``func``
+        """
+        self.job_id = job_id
+        self.owner_id = owner_id
+        self.func = func
+        self.args = args
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.finished_at = None
+        self.done = threading.Event()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize the job state for API responses."""
+        data = {'test_id': self.job_id, 'status': self.status}
+        if self.status == 'complete':
+            data['analysis'] = self.result
+        elif self.status == 'failed':
+            data['message'] = self.error
+        return data
+
+
+class AnalysisPipeline:
+    """
+    Bounded worker pool that runs submission analysis in the background.
+
+    Configuration is read from the Flask app:
+
+    - ``ANALYSIS_WORKERS``: number of worker threads (default 2)
+    - ``ANALYSIS_QUEUE_SIZE``: maximum number of pending jobs (default 100)
+    - ``ANALYSIS_RESULT_TTL``: seconds finished jobs stay in memory (default 300)
+    """
+
+    def __init__(self, app=None):
+        """Initialize the pipeline, optionally binding it to an app."""
+        self.app = None
+        self.workers = 2
+        self.queue_size = 100
+        self.result_ttl = 300
+        self._queue = None
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._threads = []
+        self._pid = None
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        """
+        Bind the pipeline to a Flask app and read its configuration.
+
+        Args:
+            app: Flask application
+        """
+        self.app = app
+        self.workers = max(1, int(app.config.get('ANALYSIS_WORKERS', 2)))
+        self.queue_size = max(1, int(app.config.get('ANALYSIS_QUEUE_SIZE', 100)))
+        self.result_ttl = int(app.config.get('ANALYSIS_RESULT_TTL', 300))
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        app.extensions['analysis_pipeline'] = self
+
+    def _ensure_started(self) -> None:
+        """Start the worker threads on first use (and again after a fork)."""
+        if self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+
+            # Threads do not survive fork(); pending jobs belong to the parent
+            self._queue = queue.Queue(maxsize=self.queue_size)
+            self._jobs = {}
+            self._threads = []
+            for i in range(self.workers):
+                thread = threading.Thread(
+                    target=self._worker, name=f"analysis-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            self._pid = os.getpid()
+            logger.debug(f"Started {self.workers} analysis workers")
+
+    def has_capacity(self) -> bool:
+        """Return True if the queue can accept another job."""
+        self._ensure_started()
+        return not self._queue.full()
+
+    def submit(self, job_id: str, owner_id: str,
+               func: Callable[..., Dict[str, Any]], *args) -> AnalysisJob:
+        """
+        Queue an analysis job.
+
+        Args:
+            job_id: Identifier of the job (the typing test id)
+            owner_id: User id that is allowed to read the result
+            func: Callable producing the analysis dictionary
+            *args: Positional arguments for ``func``
+
+        Returns:
+            The queued AnalysisJob
+
+        Raises:
+            PipelineFullError: If the queue is at capacity
+        """
+        self._ensure_started()
+        self._prune()
+
+        job = AnalysisJob(job_id, owner_id, func, args)
+        with self._lock:
+            self._jobs[job_id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self._jobs.pop(job_id, None)
+            raise PipelineFullError("Analysis queue is full")
+        return job
+
+    def run_inline(self, job_id: str, owner_id: str,
+                   func: Callable[..., Dict[str, Any]], *args) -> AnalysisJob:
+        """Run a job synchronously in the calling thread and persist its result."""
+        job = AnalysisJob(job_id, owner_id, func, args)
+        self._run(job)
+        return job
+
+    def get_job(self, job_id: str) -> Optional[AnalysisJob]:
+        """Return the in-memory job for an id, if this process knows it."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def wait(self, job: AnalysisJob, timeout: float) -> AnalysisJob:
+        """
+        Block until a job finishes or the timeout expires.
+
+        Args:
+            job: Job to wait for
+            timeout: Maximum number of seconds to wait
+
+        Returns:
+            The job, finished or not
+        """
+        if timeout > 0:
+            job.done.wait(timeout)
+        return job
+
+    def _prune(self) -> None:
+        """Drop finished jobs older than the result TTL."""
+        cutoff = time.monotonic() - self.result_ttl
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job.finished_at is not None and job.finished_at < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+    def _worker(self) -> None:
+        """Worker loop: take jobs off the queue and run them."""
+        while True:
+            job = self._queue.get()
+            try:
+                self._run(job)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job: AnalysisJob) -> None:
+        """Run a job inside an app context and persist the outcome."""
+        job.status = 'running'
+        with self.app.app_context():
+            try:
+                job.result = job.func(*job.args)
+                job.status = 'complete'
+            except Exception as e:
+                logger.exception(f"Analysis job {job.job_id} failed")
+                db.session.rollback()
+                job.error = str(e)
+                job.status = 'failed'
+
+            try:
+                db.session.merge(TestAnalysis(
+                    test_id=job.job_id,
+                    status=job.status,
+                    result=job.result if job.status == 'complete' else {'message': job.error},
+                    completed_at=datetime.now()
+                ))
+                db.session.commit()
+            except Exception as e:
+                logger.error(f"Error saving analysis for test {job.job_id}: {e}")
+                db.session.rollback()
+            finally:
+                db.session.remove()
+
+        job.finished_at = time.monotonic()
+        job.done.set()
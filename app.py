@@ -2,93 +2,191 @@ import os
 import logging
 import uuid
 import json
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash
-import nltk
+import time
+from datetime import datetime
+from typing import Any, Mapping, Optional
+from flask import Blueprint, Flask, Response, current_app, render_template, request, jsonify, session, redirect, url_for, flash
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from data_manager import DataManager
-from ml_models import WPMPredictor, KeystrokeDynamicsAnalyzer
-from utils import calculate_wpm, analyze_errors, generate_personalized_suggestions
-from models import db, UserProfile, TypingTest, GameResult, LessonProgress, User
+from analysis_pipeline import PipelineFullError
+from db_config import database_config, install_sqlite_pragmas, create_read_engine
+from identity import identity, count_queries
+from models import db, read_pool, read_only, UserProfile, TypingTest, LessonProgress, User, TestAnalysis
+from migrations import upgrade
 from forms import LoginForm, RegistrationForm
+from static_responses import static_json
+from services import services
 
-# Download NLTK data
-nltk.download('punkt')
-nltk.download('wordnet')
+# Modules that load numpy and the scoring code (drills, game_stream, keystroke_codec,
+# persistence, data_manager, utils, ...) are imported by the views that use them, so
+# importing the app or creating it loads none of them
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-# Initialize Flask app
-app = Flask(__name__)
-app.secret_key = os.environ.get("SESSION_SECRET", "fallback_secret_key_for_development")
+main = Blueprint('main', __name__)
 
-# Configure SQLite database
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///typemaster.db"
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {"connect_args": {"timeout": 30}}  # Increase timeout to 30 seconds
-
-# Initialize the database
-db.init_app(app)
-
-# Initialize Flask-Login
 login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = 'login'
+login_manager.login_view = 'main.login'
 login_manager.login_message = 'Please log in to access this page.'
 
+
 @login_manager.user_loader
 def load_user(user_id):
     """Load a user for Flask-Login."""
-    return User.query.get(int(user_id))
-
-with app.app_context():
-    # Create all database tables
-    db.create_all()
-
-# Initialize data manager and ML models
-data_manager = DataManager()
-wpm_predictor = WPMPredictor()
-keystroke_analyzer = KeystrokeDynamicsAnalyzer()
-
-
-@app.before_request
+    return identity.load_user(user_id)
+
+
+def create_app(config: Optional[Mapping[str, Any]] = None) -> Flask:
+    """
+    Create and configure the application.
+
+    Nothing expensive happens here: the shared objects in ``services``
+    are built on first use, unless ``PRELOAD_SHARED_STATE`` asks for the
+    read-only ones to be built now (for ``gunicorn --preload``). The
+    schema is brought up to date (missing tables, columns and indexes)
+    when ``SCHEMA_AUTO_CREATE`` is set (the default); deployments that
+    turn it off run ``python migrations.py upgrade``.
+
+    Args:
+        config: Settings overriding the ones read from the environment
+
+    Returns:
+        The Flask application
+    """
+    # Configure logging
+    logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper())
+
+    app = Flask(__name__)
+    app.secret_key = os.environ.get("SESSION_SECRET", "fallback_secret_key_for_development")
+
+    # Configure the database (DATABASE_URL, default SQLite in WAL mode; see db_config)
+    app.config.update(database_config())
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    # Read-only endpoints read from a replica if set, else from their own SQLite connections
+    app.config["READ_DATABASE_URL"] = os.environ.get("READ_DATABASE_URL")
+    # A user's reads stay on the primary this long after they write, covering replica lag
+    app.config["READ_AFTER_WRITE_SECONDS"] = float(os.environ.get("READ_AFTER_WRITE_SECONDS", 5))
+
+    # Configure the background analysis pipeline
+    app.config["ANALYSIS_WORKERS"] = int(os.environ.get("ANALYSIS_WORKERS", 2))
+    app.config["ANALYSIS_QUEUE_SIZE"] = int(os.environ.get("ANALYSIS_QUEUE_SIZE", 100))
+    app.config["ANALYSIS_RESULT_TTL"] = int(os.environ.get("ANALYSIS_RESULT_TTL", 300))
+
+    # Configure the per-user state cache (memory = per-process LRU, sqlite = shared per node)
+    app.config["USER_CACHE_BACKEND"] = os.environ.get("USER_CACHE_BACKEND", "memory")
+    app.config["USER_CACHE_SIZE"] = int(os.environ.get("USER_CACHE_SIZE", 1000))
+    app.config["USER_CACHE_TTL"] = int(os.environ.get("USER_CACHE_TTL", 300))
+    app.config["USER_CACHE_PATH"] = os.environ.get("USER_CACHE_PATH", os.path.join("data", "user_cache.sqlite"))
+
+    # Configure live test sessions (per-process, so multi-worker deployments need sticky routing)
+    app.config["LIVE_SESSION_MAX"] = int(os.environ.get("LIVE_SESSION_MAX", 1000))
+    app.config["LIVE_SESSION_TTL"] = int(os.environ.get("LIVE_SESSION_TTL", 600))
+
+    # Configure the Server-Sent Events channel for live test metrics
+    app.config["LIVE_EVENTS_MAX_SUBSCRIBERS"] = int(os.environ.get("LIVE_EVENTS_MAX_SUBSCRIBERS", 10000))
+    app.config["LIVE_EVENTS_HEARTBEAT"] = int(os.environ.get("LIVE_EVENTS_HEARTBEAT", 15))
+    app.config["LIVE_EVENTS_IDLE_TIMEOUT"] = int(os.environ.get("LIVE_EVENTS_IDLE_TIMEOUT", 120))
+
+    # Configure batch scoring (worker processes default to the number of CPUs)
+    app.config["BATCH_SCORING_WORKERS"] = int(os.environ.get("BATCH_SCORING_WORKERS", 0)) or None
+    app.config["BATCH_SCORING_CHUNK_SIZE"] = int(os.environ.get("BATCH_SCORING_CHUNK_SIZE", 50))
+    app.config["BATCH_SCORING_MAX_SUBMISSIONS"] = int(os.environ.get("BATCH_SCORING_MAX_SUBMISSIONS", 10000))
+    # multiprocessing start method of the workers (default: forkserver, or spawn where unavailable)
+    app.config["BATCH_SCORING_START_METHOD"] = os.environ.get("BATCH_SCORING_START_METHOD") or None
+
+    # Configure typing game tokens (the server keeps no per-game state)
+    app.config["GAME_TOKEN_MAX_AGE"] = int(os.environ.get("GAME_TOKEN_MAX_AGE", 3600))
+    app.config["GAME_PAGE_MAX"] = int(os.environ.get("GAME_PAGE_MAX", 500))
+
+    # Corpus of texts and game words built with `python corpus.py build` (default: the bundled texts)
+    app.config["CORPUS_PATH"] = os.environ.get("CORPUS_PATH")
+
+    # Extra chatbot answers, one JSON object per line, added after the bundled responses
+    app.config["CHATBOT_FAQ_PATH"] = os.environ.get("CHATBOT_FAQ_PATH")
+    app.config["CHATBOT_CACHE_SIZE"] = int(os.environ.get("CHATBOT_CACHE_SIZE", 10000))
+
+    # Largest number of points /api/user-progress returns per series or page
+    app.config["PROGRESS_MAX_POINTS"] = int(os.environ.get("PROGRESS_MAX_POINTS", 5000))
+
+    # Seconds browsers may reuse static API responses (lessons) before revalidating with their ETag
+    app.config["STATIC_MAX_AGE"] = int(os.environ.get("STATIC_MAX_AGE", 300))
+
+    # Days an anonymous profile may stay idle before compact_anonymous_profiles deletes it
+    app.config["ANONYMOUS_PROFILE_TTL_DAYS"] = int(os.environ.get("ANONYMOUS_PROFILE_TTL_DAYS", 30))
+
+    # Seconds a logged-in user's identity is cached per worker (0 disables), and the cache size
+    app.config["IDENTITY_CACHE_TTL"] = int(os.environ.get("IDENTITY_CACHE_TTL", 30))
+    app.config["IDENTITY_CACHE_SIZE"] = int(os.environ.get("IDENTITY_CACHE_SIZE", 10000))
+    # Return each request's SQL statement count in an X-Query-Count header
+    app.config["QUERY_COUNT_HEADER"] = os.environ.get("QUERY_COUNT_HEADER", "").lower() in ("1", "true", "yes")
+
+    # Upgrade the schema at startup; turn off where `python migrations.py upgrade` runs at deploy time
+    app.config["SCHEMA_AUTO_CREATE"] = os.environ.get("SCHEMA_AUTO_CREATE", "1").lower() in ("1", "true", "yes")
+    # Build the read-only shared state at startup, e.g. in the gunicorn master with --preload
+    app.config["PRELOAD_SHARED_STATE"] = os.environ.get("PRELOAD_SHARED_STATE", "").lower() in ("1", "true", "yes")
+
+    if config:
+        app.config.update(config)
+
+    # Initialize the database
+    db.init_app(app)
+    with app.app_context():
+        install_sqlite_pragmas(db.engine, app.config["SQLITE_PRAGMAS"])
+        read_engine = create_read_engine(db.engine, app.config["READ_DATABASE_URL"], app.config["SQLITE_PRAGMAS"])
+        count_queries(app, db.engine, read_engine)
+        if app.config["SCHEMA_AUTO_CREATE"]:
+            # Existing databases also need the columns and indexes added since they were created
+            upgrade()
+        # Forked workers must not inherit the connections opened so far
+        db.engine.dispose()
+    if read_engine is not None:
+        read_pool.init_app(app, read_engine)
+    identity.init_app(app)
+
+    # Initialize Flask-Login
+    login_manager.init_app(app)
+
+    app.register_blueprint(main)
+    services.init_app(app)
+    if app.config["PRELOAD_SHARED_STATE"]:
+        services.warm()
+    return app
+
+
+# Endpoints authenticated by a signed token instead of the login session
+SESSIONLESS_ENDPOINTS = {'main.game_words_page'}
+
+
+@main.before_app_request
 def check_user_session():
     """Ensure each user has a unique session ID for tracking."""
+    if request.endpoint in SESSIONLESS_ENDPOINTS:
+        return
+    
     # If user is logged in, use their profile_id for the session
-    if current_user.is_authenticated and current_user.profile:
+    # (profile_id avoids loading the profile just to read its key)
+    if current_user.is_authenticated and current_user.profile_id:
         # If session already has the correct user_id, no need to do anything
-        if 'user_id' in session and session['user_id'] == current_user.profile.user_id:
+        if 'user_id' in session and session['user_id'] == current_user.profile_id:
             return
         
         # Otherwise, set the session user_id to the user's profile_id
-        session['user_id'] = current_user.profile.user_id
+        session['user_id'] = current_user.profile_id
         logger.debug(f"Set session user_id to authenticated user's profile_id: {session['user_id']}")
         
-    # For anonymous users or users without a session ID, create a temporary one
+    # For anonymous users or users without a session ID, create a temporary one.
+    # It only lives in the cookie: the profile row is created by the first
+    # submission (see persistence.get_or_create_profile)
     elif 'user_id' not in session:
-        # Create a new session ID
         session['user_id'] = str(uuid.uuid4())
         logger.debug(f"Created new anonymous session with ID: {session['user_id']}")
-        
-        # Check if user exists in database, if not create a new profile
-        user = UserProfile.query.filter_by(user_id=session['user_id']).first()
-        if not user:
-            user = UserProfile(user_id=session['user_id'], error_statistics={})
-            db.session.add(user)
-            db.session.commit()
-            logger.debug(f"Created new user profile in database: {session['user_id']}")
-        
-        # Initialize user data in data_manager
-        data_manager.initialize_user(session['user_id'])
 
 
-@app.route('/login', methods=['GET', 'POST'])
+@main.route('/login', methods=['GET', 'POST'])
 def login():
     """User login page."""
     # Redirect if user is already logged in
     if current_user.is_authenticated:
-        return redirect(url_for('index'))
+        return redirect(url_for('.index'))
     
     form = LoginForm()
     if form.validate_on_submit():
@@ -98,7 +196,7 @@ def login():
         # Check if user exists and password is correct
         if user is None or not user.check_password(form.password.data):
             flash('Invalid username or password', 'danger')
-            return redirect(url_for('login'))
+            return redirect(url_for('.login'))
         
         # Log the user in and remember them if requested
         login_user(user, remember=form.remember_me.data)
@@ -106,25 +204,27 @@ def login():
         # If there was a page the user was trying to access, redirect there
         next_page = request.args.get('next')
         if not next_page or not next_page.startswith('/'):
-            next_page = url_for('index')
+            next_page = url_for('.index')
             
         # Connect session to user profile
-        if user.profile:
-            session['user_id'] = user.profile.user_id
-            logger.debug(f"Connected session to user profile: {user.profile.user_id}")
+        if user.profile_id:
+            session['user_id'] = user.profile_id
+            logger.debug(f"Connected session to user profile: {user.profile_id}")
         
         return redirect(next_page)
     
     return render_template('login.html', title='Sign In', form=form)
 
 
-@app.route('/logout')
+@main.route('/logout')
 def logout():
     """Log out the current user."""
     # Keep the existing session ID for continuity (anonymous browsing)
     session_id = session.get('user_id', str(uuid.uuid4()))
     
     # Log the user out from Flask-Login
+    if current_user.is_authenticated:
+        identity.invalidate(current_user.id)
     logout_user()
     
     # Assign a new session ID if we don't have one
@@ -133,15 +233,15 @@ def logout():
         logger.debug(f"Maintained session ID after logout: {session_id}")
     
     flash('You have been logged out.', 'info')
-    return redirect(url_for('index'))
+    return redirect(url_for('.index'))
 
 
-@app.route('/register', methods=['GET', 'POST'])
+@main.route('/register', methods=['GET', 'POST'])
 def register():
     """User registration page."""
     # Redirect if user is already logged in
     if current_user.is_authenticated:
-        return redirect(url_for('index'))
+        return redirect(url_for('.index'))
     
     form = RegistrationForm()
     if form.validate_on_submit():
@@ -165,50 +265,50 @@ def register():
         db.session.commit()
         
         # Initialize in data manager
-        data_manager.initialize_user(profile_id)
+        services.data_manager.initialize_user(profile_id)
         
         # Show success message and redirect to login
         flash('Registration successful! You can now log in.', 'success')
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
     
     return render_template('register.html', title='Register', form=form)
 
 
-@app.route('/')
+@main.route('/')
 def index():
     """Render the home page."""
     return render_template('index.html')
 
 
-@app.route('/typing-test')
+@main.route('/typing-test')
 @login_required
 def typing_test():
     """Render the typing test page."""
     return render_template('typing_test.html')
 
 
-@app.route('/typing-game')
+@main.route('/typing-game')
 @login_required
 def typing_game():
     """Render the typing game page."""
     return render_template('typing_game.html')
 
 
-@app.route('/lessons')
+@main.route('/lessons')
 @login_required
 def lessons():
     """Render the typing lessons page."""
     return render_template('lessons.html')
 
 
-@app.route('/progress')
+@main.route('/progress')
 @login_required
 def progress():
     """Render the progress tracking page."""
     return render_template('progress.html')
 
 
-@app.route('/chatbot')
+@main.route('/chatbot')
 @login_required
 def chatbot():
     """Render the chatbot page for typing-related queries."""
@@ -218,108 +318,221 @@ def chatbot():
 # API Endpoints
 
 
-@app.route('/api/get-text', methods=['GET'])
+@main.route('/api/get-text', methods=['GET'])
 @login_required
 def get_text():
-    """Get a typing test text based on difficulty level."""
+    """Get a typing test text based on difficulty level and optional length or character filters."""
     difficulty = request.args.get('difficulty', 'medium')
-    text = data_manager.get_random_text(difficulty)
+    text = services.data_manager.get_random_text(difficulty,
+                                        min_length=request.args.get('min_length', type=int),
+                                        max_length=request.args.get('max_length', type=int),
+                                        chars=request.args.get('chars', ''))
+    if text is None:
+        return jsonify({'status': 'not_found', 'message': 'No text matches the filters'}), 404
     return jsonify({'text': text})
 
 
-@app.route('/api/get-lesson', methods=['GET'])
+@main.route('/api/drill', methods=['GET'])
+@login_required
+def drill():
+    """Get a drill text weighted toward the user's weak keys and bigrams."""
+    from drills import weak_targets
+
+    user_id = session['user_id']
+    length = min(max(request.args.get('length', 20, type=int), 1), 200)
+    difficulty = request.args.get('difficulty', 'medium')
+
+    targets = weak_targets(services.data_manager.get_user_error_statistics(user_id),
+                           services.scorers.baseline_for(user_id).intervals)
+    return jsonify(services.drill_index.generate(targets, length, difficulty))
+
+
+@main.route('/api/get-lesson', methods=['GET'])
 @login_required
+@static_json()
 def get_lesson():
     """Get a typing lesson based on lesson number."""
     lesson_id = request.args.get('lesson_id', '1')
-    lesson = data_manager.get_lesson(lesson_id)
-    return jsonify(lesson)
+    return services.lesson_payloads.get(lesson_id, services.lesson_not_found)
+
+
+def analyze_submission(user_id, error_analysis, keystrokes):
+    """Run the heavy analysis stages for a submitted typing test."""
+    from utils import generate_personalized_suggestions
 
+    # Analyze keystroke dynamics on the columns already built for storage
+    keystroke_analysis = services.scorers.analyze_keystrokes(user_id, keystrokes.arrays())
+
+    # Get performance prediction
+    prediction = services.scorers.predictor_for(user_id).predict_from_stats(
+        services.data_manager.get_wpm_stats(user_id))
+
+    # Generate personalized suggestions
+    suggestions = generate_personalized_suggestions(
+        error_analysis, keystroke_analysis,
+        services.data_manager.get_user_error_statistics(user_id))
 
-@app.route('/api/submit-test', methods=['POST'])
+    return {
+        'keystroke_analysis': keystroke_analysis,
+        'prediction': prediction,
+        'suggestions': suggestions
+    }
+
+
+@main.route('/api/submit-test', methods=['POST'])
 @login_required
 def submit_test():
-    """Submit typing test results and get analysis."""
+    """Submit typing test results; the detailed analysis runs in the background."""
+    from keystroke_codec import KeystrokeLog, InvalidKeystrokesError, validate_events
+    from persistence import record_test_submission
+    from utils import calculate_wpm, analyze_errors
+
+    # Apply back-pressure before doing any work if the analysis queue is full
+    if not services.analysis_pipeline.has_capacity():
+        response = jsonify({
+            'status': 'busy',
+            'message': 'The server is busy analyzing other tests. Please retry shortly.'
+        })
+        response.headers['Retry-After'] = '5'
+        return response, 503
+
     data = request.json
     original_text = data.get('original_text', '')
     typed_text = data.get('typed_text', '')
     time_taken = data.get('time_taken', 0)  # in seconds
-    keystroke_data = data.get('keystroke_data', [])
+    try:
+        validate_events(data.get('keystroke_data', []))
+    except InvalidKeystrokesError as e:
+        return jsonify({'status': 'invalid', 'message': str(e)}), 400
+    # Encode the keystrokes once; storage and analysis share the columns
+    keystrokes = KeystrokeLog.from_events(data.get('keystroke_data', []))
 
     # Calculate WPM and analyze errors
     wpm = calculate_wpm(original_text, typed_text, time_taken)
     error_analysis = analyze_errors(original_text, typed_text)
     accuracy = error_analysis['accuracy']
 
-    # Save the test results
+    # Save the test results in a single transaction
     user_id = session['user_id']
     difficulty = data.get('difficulty', 'medium')
-    
-    # Get user profile from database
-    user_profile = UserProfile.query.filter_by(user_id=user_id).first()
-    if not user_profile:
-        user_profile = UserProfile(user_id=user_id, error_statistics={})
-        db.session.add(user_profile)
-        db.session.commit()
-    
-    # Create a new typing test record
-    test_id = str(uuid.uuid4())
-    typing_test = TypingTest(
-        id=test_id,
-        user_id=user_id,
-        original_text=original_text,
-        typed_text=typed_text,
-        wpm=wpm,
-        accuracy=accuracy,
-        time_taken=time_taken,
-        difficulty=difficulty,
-        error_details=error_analysis,
-        keystroke_data=keystroke_data
-    )
-    
-    # Add to database
-    db.session.add(typing_test)
-    db.session.commit()
-    
-    # Update error statistics
-    user_profile.update_error_statistics(error_analysis)
-    
-    # For backwards compatibility, also use the data manager
-    test_data = {
-        'wpm': wpm,
-        'accuracy': accuracy,
-        'error_analysis': error_analysis,
-        'difficulty': difficulty,
-        'keystroke_data': keystroke_data
-    }
-    data_manager.save_test_result(user_id, test_data)
-
-    # Analyze keystroke dynamics
-    keystroke_analysis = keystroke_analyzer.analyze(keystroke_data)
-
-    # Get performance prediction
-    prediction = wpm_predictor.predict_future_wpm(
-        data_manager.get_historical_wpm(user_id))
-
-    # Generate personalized suggestions
-    suggestions = generate_personalized_suggestions(
-        error_analysis, keystroke_analysis,
-        data_manager.get_user_error_statistics(user_id))
+    typing_test = record_test_submission(
+        user_id, original_text, typed_text, wpm, accuracy,
+        time_taken, difficulty, error_analysis, keystrokes)
+    test_id = typing_test.id
+    services.data_manager.invalidate_user(user_id)
+
+    # Queue keystroke analysis, prediction and suggestions
+    try:
+        services.analysis_pipeline.submit(test_id, user_id, analyze_submission,
+                                 user_id, error_analysis, keystrokes)
+    except PipelineFullError:
+        # The queue filled up since the capacity check; analyze inline instead
+        services.analysis_pipeline.run_inline(test_id, user_id, analyze_submission,
+                                     user_id, error_analysis, keystrokes)
 
     return jsonify({
+        'test_id': test_id,
         'wpm': wpm,
         'accuracy': accuracy,
         'error_analysis': error_analysis,
-        'keystroke_analysis': keystroke_analysis,
-        'prediction': prediction,
-        'suggestions': suggestions
-    })
+        'analysis_status': 'pending',
+        'analysis_url': url_for('.test_analysis', test_id=test_id)
+    }), 202
 
 
-@app.route('/api/predict-wpm', methods=['POST'])
+@main.route('/api/batch-score', methods=['POST'])
+@login_required
+def batch_score():
+    """
+    Score many submissions at once, e.g. for imports and re-scoring.
+
+    Results are streamed as NDJSON in input order, or with ``store`` the
+    submissions are saved as the user's tests in one bulk insert.
+    """
+    from batch_scoring import InvalidSubmissionError, validate_submission
+    from persistence import record_scored_tests
+
+    data = request.get_json(silent=True)
+    submissions = data.get('submissions') if isinstance(data, dict) else None
+    if not isinstance(submissions, list):
+        return jsonify({'status': 'invalid', 'message': 'submissions must be a list of objects'}), 400
+    if len(submissions) > current_app.config["BATCH_SCORING_MAX_SUBMISSIONS"]:
+        return jsonify({
+            'status': 'too_large',
+            'message': f"At most {current_app.config['BATCH_SCORING_MAX_SUBMISSIONS']} submissions per batch"
+        }), 413
+    # Every submission is checked before scoring starts: a streamed response cannot fail halfway
+    for index, submission in enumerate(submissions):
+        try:
+            validate_submission(submission)
+        except InvalidSubmissionError as e:
+            return jsonify({'status': 'invalid', 'message': f"submission {index}: {e}"}), 400
+
+    if data.get('store'):
+        user_id = session['user_id']
+        results = list(services.batch_scorer.score(submissions, encode_keystrokes=True))
+        test_ids = record_scored_tests(user_id, submissions, results)
+        services.data_manager.invalidate_user(user_id)
+        return jsonify({
+            'stored': len(test_ids),
+            'results': [{'test_id': test_id, 'wpm': result['wpm'], 'accuracy': result['accuracy']}
+                        for test_id, result in zip(test_ids, results)]
+        }), 201
+
+    def generate():
+        for index, result in enumerate(services.batch_scorer.score(submissions)):
+            result['index'] = index
+            yield json.dumps(result) + "\n"
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
+
+@main.route('/api/test-analysis/<test_id>', methods=['GET'])
+@login_required
+def test_analysis(test_id):
+    """Get the background analysis of a submitted test, optionally long-polling."""
+    user_id = session['user_id']
+    wait = min(max(request.args.get('wait', 0, type=float), 0), 30)
+
+    # Jobs queued by this process can be awaited directly
+    job = services.analysis_pipeline.get_job(test_id)
+    if job and job.owner_id == user_id:
+        services.analysis_pipeline.wait(job, wait)
+        status_code = 200 if job.status in ('complete', 'failed') else 202
+        return jsonify(job.to_dict()), status_code
+
+    # Otherwise look for a result persisted by any worker process
+    deadline = time.monotonic() + wait
+    while True:
+        stored = db.session.query(TestAnalysis).join(
+            TypingTest, TypingTest.id == TestAnalysis.test_id
+        ).filter(TestAnalysis.test_id == test_id, TypingTest.user_id == user_id).first()
+        if stored:
+            data = {'test_id': test_id, 'status': stored.status}
+            if stored.status == 'complete':
+                data['analysis'] = dict(stored.result)
+            else:
+                data['message'] = stored.result.get('message')
+            return jsonify(data)
+
+        if time.monotonic() >= deadline:
+            break
+        db.session.rollback()  # End the read transaction so new commits are visible
+        time.sleep(0.5)
+
+    test_exists = db.session.query(TypingTest.id).filter_by(id=test_id, user_id=user_id).first()
+    if not test_exists:
+        return jsonify({'status': 'not_found', 'message': 'Unknown test id'}), 404
+    return jsonify({'test_id': test_id, 'status': 'pending'}), 202
+
+
+@main.route('/api/predict-wpm', methods=['POST'])
 @login_required
+@read_only
 def predict_wpm():
     """Predict WPM based on partial typing test data."""
+    from utils import calculate_wpm
+
     data = request.json
     partial_text = data.get('partial_text', '')
     time_elapsed = data.get('time_elapsed', 0)
@@ -330,9 +543,9 @@ def predict_wpm():
 
     # Advanced prediction using ML model
     user_id = session['user_id']
-    historical_data = data_manager.get_historical_wpm(user_id)
-    predicted_wpm = wpm_predictor.predict_current_test_wpm(
-        current_wpm, keystroke_data, historical_data)
+    wpm_stats = services.data_manager.get_wpm_stats(user_id)
+    predicted_wpm = services.scorers.predictor_for(user_id).predict_current_test_wpm(
+        current_wpm, keystroke_data, wpm_stats)
 
     return jsonify({
         'current_wpm': current_wpm,
@@ -340,98 +553,248 @@ def predict_wpm():
     })
 
 
-@app.route('/api/user-progress', methods=['GET'])
+@main.route('/api/live-test', methods=['POST'])
+@login_required
+def open_live_test():
+    """Open a live session for streaming keystrokes of an in-progress test."""
+    user_id = session['user_id']
+    live_session = services.live_sessions.open(user_id, services.data_manager.get_wpm_stats(user_id))
+    return jsonify({'session_id': live_session.session_id, 'seq': 0}), 201
+
+
+@main.route('/api/live-test/<session_id>/keystrokes', methods=['POST'])
+@login_required
+def append_live_keystrokes(session_id):
+    """Append new keystrokes to a live session and predict the final WPM."""
+    from keystroke_codec import InvalidKeystrokesError
+    from live_sessions import SequenceGapError
+    from utils import calculate_wpm_from_length
+
+    user_id = session['user_id']
+    live_session = services.live_sessions.get(session_id, user_id)
+    if live_session is None:
+        return jsonify({'status': 'not_found', 'message': 'Unknown or expired live session'}), 404
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'status': 'error', 'message': 'Expected a JSON object'}), 400
+    try:
+        typed_length = int(data.get('typed_length', 0))
+        time_elapsed = float(data.get('time_elapsed', 0))
+        next_seq = live_session.append(data.get('seq', 0), data.get('keystrokes', []))
+    except SequenceGapError as e:
+        return jsonify({'status': 'gap', 'expected_seq': e.expected_seq}), 409
+    except (InvalidKeystrokesError, TypeError, ValueError) as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    current_wpm = calculate_wpm_from_length(typed_length, time_elapsed)
+    predicted_wpm = live_session.predict(services.scorers.predictor_for(user_id), current_wpm)
+    metrics = {
+        'current_wpm': current_wpm,
+        'predicted_wpm': predicted_wpm,
+        'seq': next_seq
+    }
+
+    # Clients listening on the event stream get the metrics pushed there
+    if data.get('stream') and services.live_events.publish(session_id, 'metrics', metrics):
+        return jsonify({'seq': next_seq}), 202
+    return jsonify(metrics)
+
+
+@main.route('/api/live-test/<session_id>/events', methods=['GET'])
 @login_required
+def live_test_events(session_id):
+    """Stream live metrics for a test as Server-Sent Events."""
+    if services.live_sessions.get(session_id, session['user_id']) is None:
+        return jsonify({'status': 'not_found', 'message': 'Unknown or expired live session'}), 404
+
+    subscription = services.live_events.subscribe(session_id)
+    if subscription is None:
+        response = jsonify({'status': 'busy', 'message': 'Too many live connections'})
+        response.headers['Retry-After'] = '30'
+        return response, 503
+
+    response = Response(services.live_events.stream(subscription), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # keep nginx from buffering the stream
+    return response
+
+
+@main.route('/api/live-test/<session_id>', methods=['DELETE'])
+@login_required
+def close_live_test(session_id):
+    """Discard a live session once its test has ended."""
+    if services.live_sessions.get(session_id, session['user_id']) is not None:
+        services.live_sessions.close(session_id)
+        services.live_events.close_channel(session_id)
+    return '', 204
+
+
+def _time_range_args():
+    """Parse the optional ISO 8601 ``start`` and ``end`` query arguments."""
+    return tuple(datetime.fromisoformat(request.args[name]) if request.args.get(name) else None
+                 for name in ('start', 'end'))
+
+
+@main.route('/api/user-progress', methods=['GET'])
+@login_required
+@read_only
 def user_progress():
-    """Get user's progress data for visualization."""
+    """Get user's progress data for visualization, downsampled to at most ``points`` per series."""
+    from data_manager import DataManager
+
     user_id = session['user_id']
+    points = min(max(request.args.get('points', DataManager.PROGRESS_POINTS, type=int), 3),
+                 current_app.config["PROGRESS_MAX_POINTS"])
+    try:
+        start, end = _time_range_args()
+    except ValueError as e:
+        return jsonify({'status': 'invalid', 'message': str(e)}), 400
     
-    # Get user from database
-    user_profile = UserProfile.query.filter_by(user_id=user_id).first()
-    
-    if user_profile:
-        # Get data from database models
-        wpm_history = user_profile.get_historical_wpm()
-        accuracy_history = user_profile.get_historical_accuracy()
-        error_statistics = user_profile.error_statistics
-    else:
-        # Fallback to data manager if user not found in database
-        wpm_history = data_manager.get_historical_wpm(user_id)
-        accuracy_history = data_manager.get_historical_accuracy(user_id)
-        error_statistics = data_manager.get_user_error_statistics(user_id)
+    # The default view is served from the user state cache, which is invalidated on every submission
+    progress = services.data_manager.get_progress(user_id, points, start, end)
+    error_statistics = services.data_manager.get_user_error_statistics(user_id)
 
     return jsonify({
-        'wpm_history': wpm_history,
-        'accuracy_history': accuracy_history,
+        'wpm_history': progress['wpm_history'],
+        'accuracy_history': progress['accuracy_history'],
+        'total_points': progress['total_points'],
         'error_statistics': error_statistics
     })
 
 
-@app.route('/api/game-words', methods=['GET'])
+@main.route('/api/user-progress/points', methods=['GET'])
+@login_required
+@read_only
+def user_progress_points():
+    """Get a page of the user's raw test results; pass ``next_cursor`` back as ``cursor`` for the next page."""
+    user_id = session['user_id']
+    limit = min(max(request.args.get('limit', 500, type=int), 1), current_app.config["PROGRESS_MAX_POINTS"])
+    try:
+        start, end = _time_range_args()
+        page = services.data_manager.get_progress_page(user_id, limit, request.args.get('cursor'), start, end)
+    except ValueError as e:
+        return jsonify({'status': 'invalid', 'message': str(e)}), 400
+    return jsonify(page)
+
+
+@main.route('/api/game-words', methods=['GET'])
 @login_required
 def game_words():
     """Get random words for the typing game."""
     count = int(request.args.get('count', '10'))
     difficulty = request.args.get('difficulty', 'medium')
-    words = data_manager.get_random_words(count, difficulty)
+    words = services.data_manager.get_random_words(count, difficulty)
     return jsonify({'words': words})
 
 
-@app.route('/api/submit-game', methods=['POST'])
+@main.route('/api/game/start', methods=['POST'])
+@login_required
+def start_game():
+    """Start a typing game: returns its signed token and the first page of words."""
+    from corpus import BANDS, DEFAULT_BAND
+    from game_stream import WordStream
+
+    data = request.get_json(silent=True)
+    difficulty = data.get('difficulty', DEFAULT_BAND) if isinstance(data, dict) else DEFAULT_BAND
+    if difficulty not in BANDS:
+        return jsonify({'status': 'invalid', 'message': f"difficulty must be one of {', '.join(BANDS)}"}), 400
+    token, ticket = services.game_tokens.issue(session['user_id'], difficulty)
+    count = min(max(request.args.get('count', 50, type=int), 1), current_app.config["GAME_PAGE_MAX"])
+    words = WordStream(services.data_manager.corpus.words, ticket.seed, difficulty).page(0, count)
+    return jsonify({'game_token': token, 'words': words, 'cursor': count}), 201
+
+
+@main.route('/api/game/words', methods=['GET'])
+def game_words_page():
+    """
+    Get the next words of a game from its token and a cursor.
+
+    The token is the credential, so no login session is loaded. With
+    ``stream`` the words are streamed as NDJSON instead of one page.
+    """
+    from game_stream import WordStream, InvalidGameToken
+
+    try:
+        ticket = services.game_tokens.verify(request.args.get('token', ''))
+    except InvalidGameToken as e:
+        return jsonify({'status': 'invalid_token', 'message': str(e)}), 401
+
+    cursor = max(request.args.get('cursor', 0, type=int), 0)
+    count = min(max(request.args.get('count', 50, type=int), 1), current_app.config["GAME_PAGE_MAX"])
+    stream = WordStream(services.data_manager.corpus.words, ticket.seed, ticket.difficulty)
+
+    if request.args.get('stream'):
+        def generate():
+            for position in range(cursor, cursor + count):
+                yield json.dumps({'cursor': position, 'word': stream.word(position)}) + "\n"
+        return Response(generate(), mimetype='application/x-ndjson')
+    return jsonify({'words': stream.page(cursor, count), 'cursor': cursor + count})
+
+
+@main.route('/api/submit-game', methods=['POST'])
 @login_required
 def submit_game():
-    """Submit typing game results."""
-    data = request.json
-    user_id = session['user_id']
-    score = data.get('score', 0)
-    words_typed = data.get('words_typed', 0)
+    """
+    Submit typing game results.
+
+    Games are replayed from their token's seed and scored on the server;
+    submissions without a game token are rejected.
+    """
+    from game_stream import WordStream, InvalidGameToken, GameVerificationError, verify_game
+    from persistence import record_game_submission, DuplicateGameError
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not data.get('game_token'):
+        return jsonify({'status': 'invalid', 'message': 'A game token is required'}), 400
+    try:
+        words_completed = int(data.get('words_completed', 0))
+    except (TypeError, ValueError):
+        return jsonify({'status': 'invalid', 'message': 'words_completed must be an integer'}), 400
+    # Keystroke accuracy is only known to the client, so it is only range-checked
     accuracy = data.get('accuracy', 0)
-    difficulty = data.get('difficulty', 'medium')
-
-    # Get user profile from database
-    user_profile = UserProfile.query.filter_by(user_id=user_id).first()
-    if not user_profile:
-        user_profile = UserProfile(user_id=user_id, error_statistics={})
-        db.session.add(user_profile)
-        db.session.commit()
-
-    # Create a new game result
-    game_result = GameResult(
-        user_id=user_id,
-        score=score,
-        words_typed=words_typed,
-        accuracy=accuracy,
-        difficulty=difficulty
-    )
-    
-    # Add to database
-    db.session.add(game_result)
-    db.session.commit()
-
-    # For backwards compatibility, also use the data manager
-    game_data = {
-        'score': score,
-        'words_typed': words_typed,
-        'accuracy': accuracy,
-        'difficulty': difficulty
-    }
-    data_manager.save_game_result(user_id, game_data)
-
-    return jsonify({'status': 'success'})
-
+    if isinstance(accuracy, bool) or not isinstance(accuracy, (int, float)) or not 0 <= accuracy <= 100:
+        return jsonify({'status': 'invalid', 'message': 'accuracy must be a number from 0 to 100'}), 400
+    user_id = session['user_id']
 
-@app.route('/api/chatbot-query', methods=['POST'])
+    try:
+        ticket = services.game_tokens.verify(data['game_token'])
+        if ticket.user_id != user_id:
+            raise InvalidGameToken("Game belongs to another user")
+        stream = WordStream(services.data_manager.corpus.words, ticket.seed, ticket.difficulty)
+        score, words = verify_game(stream, ticket, words_completed)
+    except InvalidGameToken as e:
+        return jsonify({'status': 'invalid_token', 'message': str(e)}), 403
+    except GameVerificationError as e:
+        return jsonify({'status': 'rejected', 'message': str(e)}), 422
+    game_data = {'score': score, 'words_typed': len(words), 'accuracy': accuracy,
+                 'difficulty': ticket.difficulty, 'seed': ticket.seed}
+
+    # Save the game result in a single transaction; the stored seed uses up the token
+    try:
+        record_game_submission(user_id, game_data)
+    except DuplicateGameError as e:
+        return jsonify({'status': 'invalid_token', 'message': str(e)}), 403
+    services.data_manager.invalidate_user(user_id)
+
+    return jsonify({'status': 'success', 'score': game_data['score']})
+
+
+@main.route('/api/chatbot-query', methods=['POST'])
 @login_required
 def chatbot_query():
     """Handle chatbot queries related to typing."""
     data = request.json
     query = data.get('query', '')
 
-    # Simple rule-based responses
-    response = data_manager.get_chatbot_response(query)
+    # Best answer first; the runners-up are offered as related topics
+    response, matches = services.chatbot_engine.answer(query)
 
-    return jsonify({'response': response})
+    return jsonify({
+        'response': response,
+        'related': [services.chatbot_engine.describe(match) for match in matches[1:]]
+    })
 
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    create_app().run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,164 @@
+"""
+Batch scoring of many typing test submissions on a process pool.
+
+Scoring is pure CPU work (WPM, whole-text error alignment and keystroke
+dynamics), so submissions are split into chunks and scored by worker
+processes, which sidesteps the GIL and scales with the number of cores.
+Results always come back in input order, one chunk at a time, so they
+can be streamed while later chunks are still being scored.
+
+Batch results are scored independently of each other and of any user's
+keystroke baseline, so a batch gives the same results however it is
+chunked.
+"""
+import os
+import math
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from keystroke_codec import KeystrokeLog, InvalidKeystrokesError, validate_events
+from ml_models import KeystrokeDynamicsAnalyzer
+from utils import calculate_wpm, analyze_errors
+
+logger = logging.getLogger(__name__)
+
+# Workers are never forked from the app process: its threads (analysis pipeline,
+# connection pools, logging) may hold locks that a forked child would inherit held
+DEFAULT_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+class InvalidSubmissionError(ValueError):
+    """Raised when a submission cannot be scored."""
+
+
+def validate_submission(submission: Any) -> None:
+    """
+    Check that a submission can be scored, before any of the batch is.
+
+    Args:
+        submission: Submission as received
+
+    Raises:
+        InvalidSubmissionError: If a field has the wrong type or
+            ``time_taken`` is not a finite, non-negative number
+    """
+    if not isinstance(submission, dict):
+        raise InvalidSubmissionError("submission must be an object")
+    for field in ('original_text', 'typed_text'):
+        if not isinstance(submission.get(field, ''), str):
+            raise InvalidSubmissionError(f"{field} must be a string")
+    time_taken = submission.get('time_taken', 0)
+    if (isinstance(time_taken, bool) or not isinstance(time_taken, (int, float))
+            or not math.isfinite(time_taken) or time_taken < 0):
+        raise InvalidSubmissionError("time_taken must be a non-negative number")
+    if not isinstance(submission.get('difficulty', 'medium'), str):
+        raise InvalidSubmissionError("difficulty must be a string")
+    try:
+        validate_events(submission.get('keystroke_data') or [])
+    except InvalidKeystrokesError as e:
+        raise InvalidSubmissionError(str(e)) from e
+
+
+def score_submission(submission: Dict[str, Any], encode_keystrokes: bool = False) -> Dict[str, Any]:
+    """
+    Score a single submission.
+
+    Args:
+        submission: Dict with original_text, typed_text, time_taken (seconds)
+            and optionally keystroke_data and difficulty
+        encode_keystrokes: Also return the encoded keystroke blob under
+            ``keystroke_blob``, ready for storage
+
+    Returns:
+        Dict with wpm, accuracy, error_analysis and keystroke_analysis
+    """
+    original_text = submission.get('original_text', '')
+    typed_text = submission.get('typed_text', '')
+    keystrokes = KeystrokeLog.from_events(submission.get('keystroke_data') or [])
+
+    error_analysis = analyze_errors(original_text, typed_text)
+    result = {
+        'wpm': calculate_wpm(original_text, typed_text, submission.get('time_taken', 0)),
+        'accuracy': error_analysis['accuracy'],
+        'error_analysis': error_analysis,
+        'keystroke_analysis': KeystrokeDynamicsAnalyzer().analyze(keystrokes.arrays())
+    }
+    if encode_keystrokes:
+        result['keystroke_blob'] = keystrokes.blob
+    return result
+
+
+def _score_chunk(submissions: List[Dict[str, Any]], encode_keystrokes: bool = False) -> List[Dict[str, Any]]:
+    """Score a chunk of submissions in a worker process."""
+    return [score_submission(submission, encode_keystrokes) for submission in submissions]
+
+
+def _chunks(items: List[Any], size: int) -> Iterator[List[Any]]:
+    """Split a list into consecutive chunks."""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class BatchScorer:
+    """Scores batches of submissions on a lazily started process pool."""
+
+    def __init__(self, workers: Optional[int] = None, chunk_size: int = 50,
+                 start_method: Optional[str] = None):
+        """
+        Initialize the scorer.
+
+        Args:
+            workers: Number of worker processes (default: number of CPUs);
+                1 scores in the calling process
+            chunk_size: Submissions sent to a worker at a time
+            start_method: multiprocessing start method (default: ``DEFAULT_START_METHOD``)
+        """
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.chunk_size = max(1, chunk_size)
+        self.start_method = start_method or DEFAULT_START_METHOD
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        """Get the process pool, starting it on first use."""
+        with self._lock:
+            if self._executor is None:
+                context = multiprocessing.get_context(self.start_method)
+                if self.start_method == 'forkserver':
+                    # Workers fork from a server that has the scoring code imported already
+                    context.set_forkserver_preload([__name__])
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+                logger.info(f"Started batch scoring pool with {self.workers} workers")
+            return self._executor
+
+    def score(self, submissions: Iterable[Dict[str, Any]],
+              encode_keystrokes: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        Score submissions, yielding results in input order.
+
+        Args:
+            submissions: Submissions as accepted by ``score_submission``
+            encode_keystrokes: Also return the encoded keystroke blobs
+
+        Yields:
+            One result per submission
+        """
+        submissions = list(submissions)
+        score_chunk = partial(_score_chunk, encode_keystrokes=encode_keystrokes)
+        if self.workers == 1 or len(submissions) <= self.chunk_size:
+            # Not worth the round trip to another process
+            yield from score_chunk(submissions)
+            return
+
+        for results in self._pool().map(score_chunk, _chunks(submissions, self.chunk_size)):
+            yield from results
+
+    def close(self) -> None:
+        """Shut down the process pool."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
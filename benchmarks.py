@@ -0,0 +1,1208 @@
+"""
+Performance benchmarks and stress tests for TypeMaster.
+
+Each benchmark is a function registered in ``BENCHMARKS`` and can be run
+from the command line:
+
+    python benchmarks.py <benchmark_name> [--sizes 1000,10000] [--threads 1,2,4,8]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List
+
+BENCHMARKS: Dict[str, Callable[[argparse.Namespace], None]] = {}
+
+
+def benchmark(fn: Callable[[argparse.Namespace], None]) -> Callable[[argparse.Namespace], None]:
+    """Register a function as a named benchmark."""
+    BENCHMARKS[fn.__name__] = fn
+    return fn
+
+
+def _int_list(value: str) -> List[int]:
+    """Parse a comma-separated list of integers."""
+    return [int(v) for v in value.split(',') if v]
+
+
+def synthetic_keystrokes(count: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Generate keystroke events shaped like the ones typing_test.js records.
+
+    Args:
+        count: Number of keystrokes
+        seed: Random seed
+
+    Returns:
+        List of keystroke dicts
+    """
+    rng = random.Random(seed)
+    alphabet = "abcdefghijklmnopqrstuvwxyz ,.ETAOIN"
+    keystrokes = []
+    timestamp = 0
+    for position in range(count):
+        key = rng.choice(alphabet)
+        # Slow down gradually and pause now and then
+        timestamp += int(rng.gauss(150 + position * 0.01, 40)) + (6000 if rng.random() < 0.001 else 0)
+        keystrokes.append({
+            'key': key,
+            'keyCode': ord(key.upper()),
+            'timestamp': max(timestamp, 1),
+            'shiftKey': key.isupper(),
+            'position': position
+        })
+    return keystrokes
+
+
+@contextmanager
+def _database_app(**config: Any) -> Iterator[Any]:
+    """
+    Run a benchmark body in the app context of an in-memory database.
+
+    Args:
+        **config: Extra Flask settings
+
+    Yields:
+        The Flask app, with the schema created
+    """
+    from flask import Flask
+    from models import db
+
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    app.config.update(config)
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+
+
+def _report(rows: List[List[Any]], headers: List[str]) -> None:
+    """Print a simple aligned table."""
+    widths = [max(len(str(x)) for x in column) for column in zip(headers, *rows)]
+    print("  ".join(str(h).rjust(w) for h, w in zip(headers, widths)))
+    for row in rows:
+        print("  ".join(str(x).rjust(w) for x, w in zip(row, widths)))
+
+
+@benchmark
+def scorer_registry(args: argparse.Namespace) -> None:
+    """
+    Stress the ScorerRegistry from many threads.
+
+    Every user's analysis, prediction and final baseline must match what a
+    single thread computes for that user alone; throughput is reported per
+    thread count.
+    """
+    from ml_models import WPMRunningStats
+    from scorer_registry import ScorerRegistry
+
+    users = 200
+    tests_per_user = 4
+    keystrokes = {f"user-{u}": [synthetic_keystrokes(args.sizes[0], seed=u * 100 + t)
+                                for t in range(tests_per_user)]
+                  for u in range(users)}
+    histories = {user_id: WPMRunningStats.from_history(
+        [{'wpm': 30 + (int(user_id.split('-')[1]) + i * 3) % 40} for i in range(20)]) for user_id in keystrokes}
+
+    def run_user(registry, user_id):
+        results = []
+        for data in keystrokes[user_id]:
+            results.append(registry.analyze_keystrokes(user_id, data))
+            results.append(registry.predictor_for(user_id).predict_from_stats(histories[user_id]))
+        return results
+
+    # Reference: each user scored alone on a single thread
+    reference_registry = ScorerRegistry()
+    expected = {user_id: run_user(reference_registry, user_id) for user_id in keystrokes}
+    expected_baselines = {user_id: dict(reference_registry.baseline_for(user_id).intervals)
+                          for user_id in keystrokes}
+
+    rows = []
+    base_rate = None
+    for threads in args.threads:
+        registry = ScorerRegistry()
+        order = list(keystrokes)
+        random.Random(threads).shuffle(order)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            results = dict(zip(order, pool.map(lambda u: run_user(registry, u), order)))
+        elapsed = time.perf_counter() - start
+
+        mismatches = sum(results[u] != expected[u] for u in order)
+        baseline_mismatches = sum(dict(registry.baseline_for(u).intervals) != expected_baselines[u]
+                                  for u in order)
+        rate = users * tests_per_user / elapsed
+        base_rate = base_rate or rate
+        rows.append([threads, f"{rate:,.0f}", f"{rate / base_rate:.2f}x",
+                     mismatches, baseline_mismatches])
+
+    _report(rows, ['threads', 'tests/s', 'scaling', 'result mismatches', 'baseline mismatches'])
+
+
+def _reference_keystroke_analysis(keystroke_data: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Pure-Python keystroke analysis as KeystrokeDynamicsAnalyzer computed it
+    before it was vectorized; the baseline for the keystroke_analyzer benchmark.
+    """
+    intervals = []
+    key_intervals = {}
+    for prev, curr in zip(keystroke_data, keystroke_data[1:]):
+        if prev.get('timestamp') and curr.get('timestamp'):
+            interval = curr['timestamp'] - prev['timestamp']
+            if interval < 5000:
+                intervals.append(interval)
+                if curr.get('key', ''):
+                    key_intervals.setdefault(curr['key'], []).append(interval)
+
+    avg_interval = sum(intervals) / len(intervals) if intervals else 0
+    slow_keys = [key for key, key_times in key_intervals.items()
+                 if len(key_times) >= 3 and sum(key_times) / len(key_times) > avg_interval * 1.5]
+
+    consistency = 50.0
+    if len(intervals) >= 5:
+        mean = sum(intervals) / len(intervals)
+        std_dev = (sum((x - mean) ** 2 for x in intervals) / len(intervals)) ** 0.5
+        consistency = max(0, min(100, 100 - ((std_dev / mean if mean > 0 else 1.0) * 50)))
+
+    fatigue_detected, fatigue_point = False, None
+    if len(intervals) >= 20:
+        window_size = min(10, len(intervals) // 5)
+        moving_avgs = [sum(intervals[i:i + window_size]) / window_size
+                       for i in range(len(intervals) - window_size + 1)]
+        first_quarter = moving_avgs[:len(moving_avgs) // 4]
+        last_quarter = moving_avgs[-len(moving_avgs) // 4:]
+        if first_quarter and last_quarter:
+            first_avg = sum(first_quarter) / len(first_quarter)
+            if sum(last_quarter) / len(last_quarter) > first_avg * 1.3:
+                fatigue_detected = True
+                for i in range(len(moving_avgs) // 2, len(moving_avgs)):
+                    if moving_avgs[i] > first_avg * 1.3:
+                        fatigue_point = i / len(moving_avgs)
+                        break
+
+    return {
+        'status': 'success',
+        'avg_interval': round(avg_interval, 2),
+        'rhythm_consistency': round(consistency, 2),
+        'slow_keys': slow_keys[:5],
+        'fatigue_detected': fatigue_detected,
+        'fatigue_point': fatigue_point if fatigue_detected else None,
+        'total_keystrokes': len(keystroke_data)
+    }
+
+
+def _best_time(fn: Callable[[], Any], repeat: int) -> float:
+    """Return the best wall-clock time of ``repeat`` calls."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+@benchmark
+def keystroke_analyzer(args: argparse.Namespace) -> None:
+    """
+    Compare the vectorized KeystrokeDynamicsAnalyzer with the pure-Python loops.
+
+    The vectorized engine is timed both from keystroke dicts (including
+    the one-off conversion to arrays) and from prebuilt KeystrokeArrays.
+    """
+    from ml_models import KeystrokeArrays, KeystrokeDynamicsAnalyzer
+
+    analyzer = KeystrokeDynamicsAnalyzer()
+    rows = []
+    for size in args.sizes:
+        data = synthetic_keystrokes(size, seed=size)
+        arrays = KeystrokeArrays.from_events(data)
+        same = analyzer.analyze(data) == analyzer.analyze(arrays) == _reference_keystroke_analysis(data)
+        python_time = _best_time(lambda: _reference_keystroke_analysis(data), args.repeat)
+        dicts_time = _best_time(lambda: analyzer.analyze(data), args.repeat)
+        arrays_time = _best_time(lambda: analyzer.analyze(arrays), args.repeat)
+        rows.append([f"{size:,}", f"{python_time * 1000:.2f}",
+                     f"{dicts_time * 1000:.2f}", f"{python_time / dicts_time:.1f}x",
+                     f"{arrays_time * 1000:.2f}", f"{python_time / arrays_time:.1f}x", same])
+
+    _report(rows, ['keystrokes', 'python ms', 'from dicts ms', 'speedup',
+                   'from arrays ms', 'speedup', 'same output'])
+
+
+@benchmark
+def keystroke_storage(args: argparse.Namespace) -> None:
+    """
+    Compare keystroke rows stored as JSON text with the binary blob format.
+
+    For each size (keystrokes per test) a user with 50 tests is written to
+    an in-memory SQLite database both ways; the stored bytes per row and
+    the time to load the user's full test rows are reported.
+    """
+    import json
+    from sqlalchemy import func, text
+    from models import db, TypingTest
+
+    tests_per_user = 50
+    rows = []
+    with _database_app():
+        for size in args.sizes:
+            data = synthetic_keystrokes(size, seed=size)
+            for i in range(tests_per_user):
+                # Legacy rows: the JSON text JSONEncodedDict used to write
+                db.session.execute(text("INSERT INTO typing_tests (id, user_id, keystroke_data) "
+                                        "VALUES (:id, :user_id, :data)"),
+                                   {'id': f"json-{size}-{i}", 'user_id': f"json-{size}",
+                                    'data': json.dumps(data)})
+                db.session.add(TypingTest(id=f"blob-{size}-{i}", user_id=f"blob-{size}",
+                                          keystroke_data=data))
+            db.session.commit()
+
+            def row_bytes(user_id):
+                return db.session.query(func.avg(func.length(TypingTest.keystroke_data))) \
+                    .filter_by(user_id=user_id).scalar()
+
+            def load(user_id):
+                db.session.expunge_all()
+                return TypingTest.query.filter_by(user_id=user_id).all()
+
+            json_bytes, blob_bytes = row_bytes(f"json-{size}"), row_bytes(f"blob-{size}")
+            json_time = _best_time(lambda: load(f"json-{size}"), args.repeat)
+            blob_time = _best_time(lambda: load(f"blob-{size}"), args.repeat)
+            same = [list(t.keystroke_data) for t in load(f"blob-{size}")][0] == data
+            rows.append([f"{size:,}", f"{json_bytes:,.0f}", f"{blob_bytes:,.0f}",
+                         f"{json_bytes / blob_bytes:.1f}x", f"{json_time * 1000:.1f}",
+                         f"{blob_time * 1000:.1f}", f"{json_time / blob_time:.1f}x", same])
+
+    _report(rows, ['keystrokes', 'json B/row', 'blob B/row', 'smaller',
+                   'json load ms', 'blob load ms', 'faster', 'lossless'])
+
+
+@benchmark
+def row_hydration(args: argparse.Namespace) -> None:
+    """
+    Time loading TypingTest rows with the heavy columns eager or deferred.
+
+    "before" undefers error_details and keystroke_data and decodes JSON
+    with the standard library, as every query used to; the other rows
+    show the available fast codec and the default deferred load.
+    """
+    import json_codec
+    from models import db, TypingTest, TEST_DETAILS, TEST_KEYSTROKES
+    from utils import analyze_errors
+
+    original = "The quick brown fox jumps over the lazy dog. " * 6
+    typed = original.replace('o', '0', 9).replace('the', 'teh')
+    error_analysis = analyze_errors(original, typed)
+    keystrokes = synthetic_keystrokes(len(typed))
+
+    rows = []
+    with _database_app():
+        for size in args.sizes:
+            user_id = f"user-{size}"
+            for i in range(size):
+                db.session.add(TypingTest(id=f"{size}-{i}", user_id=user_id, original_text=original,
+                                          typed_text=typed, wpm=60, accuracy=95,
+                                          error_details=error_analysis, keystroke_data=keystrokes))
+            db.session.commit()
+
+            def load(*options):
+                db.session.expunge_all()
+                tests = TypingTest.query.options(*options).filter_by(user_id=user_id).all()
+                return [(t.wpm, t.accuracy, t.timestamp) for t in tests]
+
+            codec = json_codec.active_codec().name
+            json_codec.use_codec('json')
+            before = _best_time(lambda: load(TEST_DETAILS, TEST_KEYSTROKES), args.repeat)
+            json_codec.use_codec(codec)
+            timings = [
+                ('before: eager, json', before),
+                (f"eager, {codec}", _best_time(lambda: load(TEST_DETAILS, TEST_KEYSTROKES), args.repeat)),
+                ('deferred (default)', _best_time(load, args.repeat)),
+            ]
+            for label, elapsed in timings:
+                rows.append([f"{size:,}", label, f"{elapsed * 1000:.1f}", f"{before / elapsed:.1f}x"])
+
+    _report(rows, ['rows', 'load', 'ms', 'speedup'])
+
+
+@benchmark
+def progress_history(args: argparse.Namespace) -> None:
+    """
+    Compare the full /api/user-progress history with the downsampled series and pages.
+
+    For each size, one user among many gets that many tests. The full
+    history is serialized as it used to be served; the downsampled view
+    keeps 500 points per series; a 30 day range and the last 500-point
+    page show that ranged reads depend on the rows returned, not on the
+    length of the history.
+    """
+    import json
+    from datetime import datetime, timedelta
+    from models import db, TypingTest, get_test_history, get_test_history_page
+    from data_manager import DataManager
+
+    manager = DataManager.__new__(DataManager)  # only the history methods are used
+
+    base = datetime(2020, 1, 1)
+    rows = []
+    with _database_app():
+        for size in args.sizes:
+            user_id = f"user-{size}"
+            # Interleave other users' tests so the user's rows are spread over the table
+            db.session.execute(TypingTest.__table__.insert(), [
+                dict(id=f"{size}-{i}", user_id=user_id if i % 4 == 0 else f"other-{i % 4}",
+                     wpm=40 + (i % 97) / 3, accuracy=90 + (i % 11), timestamp=base + timedelta(hours=i // 4))
+                for i in range(size * 4)])
+            db.session.commit()
+            end = base + timedelta(hours=size)
+            test_id, timestamp = get_test_history_page(user_id, 1, start=end - timedelta(hours=501))[0][:2]
+
+            full = _best_time(lambda: json.dumps(get_test_history(user_id)), args.repeat)
+            full_bytes = len(json.dumps(get_test_history(user_id)))
+            sampled = _best_time(lambda: json.dumps(manager._load_progress(user_id, 500, None, None)), args.repeat)
+            sampled_bytes = len(json.dumps(manager._load_progress(user_id, 500, None, None)))
+            ranged = _best_time(lambda: manager._load_progress(user_id, 500, end - timedelta(days=30), None),
+                                args.repeat)
+            page = _best_time(lambda: get_test_history_page(user_id, 500, (timestamp, test_id)), args.repeat)
+            rows.append([f"{size:,}", f"{full * 1e3:.1f}", f"{full_bytes / 1024:.0f}", f"{sampled * 1e3:.1f}",
+                         f"{sampled_bytes / 1024:.0f}", f"{ranged * 1e3:.1f}", f"{page * 1e3:.1f}"])
+
+    _report(rows, ['tests', 'full ms', 'full KiB', 'sampled ms', 'sampled KiB', '30 days ms', 'last page ms'])
+
+
+@benchmark
+def database_profile(args: argparse.Namespace) -> None:
+    """
+    Measure concurrent submit and progress traffic on each database profile.
+
+    SQLite with its default rollback journal (the old setup) is compared
+    with the WAL profile from db_config, and with PostgreSQL when
+    ``--database-url`` (or ``BENCHMARK_DATABASE_URL``) points at a scratch
+    database; only rows of ``bench-`` users are written and removed there.
+    For each thread count, every thread runs ``--sizes[0]`` operations:
+    one in four submits a test, the others read the last 30 days of a
+    random user's history through the (user_id, timestamp) index.
+    """
+    import shutil
+    import tempfile
+    import threading
+    from datetime import datetime, timedelta
+    from sqlalchemy import create_engine, delete, insert, select
+    from db_config import DEFAULT_SQLITE_PRAGMAS, engine_options, install_sqlite_pragmas
+    from models import db, TypingTest, UserProfile
+
+    users, tests_per_user = 50, 200
+    operations = args.sizes[0]
+    directory = tempfile.mkdtemp(prefix='db-bench-')
+    sqlite_url = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+    profiles = [
+        ('sqlite rollback journal', sqlite_url, {'journal_mode': 'DELETE', 'synchronous': 'FULL'}),
+        ('sqlite WAL profile', sqlite_url, DEFAULT_SQLITE_PRAGMAS),
+    ]
+    if args.database_url:
+        profiles.append(('postgresql pool', args.database_url, None))
+
+    base = datetime(2024, 1, 1)
+    tests, profile_rows = TypingTest.__table__, UserProfile.__table__
+    user_ids = [f"bench-{u}" for u in range(users)]
+    rows = []
+    try:
+        for name, url, pragmas in profiles:
+            options = engine_options(url)
+            if url.startswith('postgresql'):
+                options['pool_size'] = max(args.threads)
+            engine = create_engine(url, **options)
+            install_sqlite_pragmas(engine, pragmas)
+            db.metadata.create_all(engine)
+            with engine.begin() as conn:
+                conn.execute(delete(tests).where(tests.c.user_id.in_(user_ids)))
+                conn.execute(delete(profile_rows).where(profile_rows.c.user_id.in_(user_ids)))
+                conn.execute(insert(profile_rows), [{'user_id': user_id} for user_id in user_ids])
+                conn.execute(insert(tests), [
+                    {'id': f"seed-{u}-{i}", 'user_id': user_ids[u], 'wpm': 50.0, 'accuracy': 95.0,
+                     'timestamp': base + timedelta(hours=i)}
+                    for u in range(users) for i in range(tests_per_user)])
+            since = base + timedelta(hours=tests_per_user) - timedelta(days=30)
+
+            for thread_count in args.threads:
+                latencies = {'submit': [], 'progress': []}
+                lock = threading.Lock()
+
+                def worker(seed):
+                    rng = random.Random(seed)
+                    local = {'submit': [], 'progress': []}
+                    with engine.connect() as conn:
+                        for i in range(operations):
+                            user_id = rng.choice(user_ids)
+                            started = time.perf_counter()
+                            if i % 4 == 0:
+                                conn.execute(insert(tests).values(
+                                    id=f"{name}-{thread_count}-{seed}-{i}", user_id=user_id, wpm=rng.uniform(30, 90),
+                                    accuracy=rng.uniform(80, 100), timestamp=datetime.now()))
+                                conn.commit()
+                                local['submit'].append(time.perf_counter() - started)
+                            else:
+                                conn.execute(select(tests.c.timestamp, tests.c.wpm, tests.c.accuracy)
+                                             .where(tests.c.user_id == user_id, tests.c.timestamp >= since)
+                                             .order_by(tests.c.timestamp)).all()
+                                conn.rollback()  # end the read transaction, as a request would
+                                local['progress'].append(time.perf_counter() - started)
+                    with lock:
+                        for kind, values in local.items():
+                            latencies[kind].extend(values)
+
+                started = time.perf_counter()
+                threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(thread_count)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                elapsed = time.perf_counter() - started
+
+                def p95(values):
+                    return sorted(values)[int(len(values) * 0.95)] * 1e3 if values else 0.0
+                rows.append([name, thread_count, f"{thread_count * operations / elapsed:.0f}",
+                             f"{p95(latencies['submit']):.1f}", f"{p95(latencies['progress']):.1f}"])
+
+            with engine.begin() as conn:
+                conn.execute(delete(tests).where(tests.c.user_id.in_(user_ids)))
+                conn.execute(delete(profile_rows).where(profile_rows.c.user_id.in_(user_ids)))
+            engine.dispose()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    _report(rows, ['profile', 'threads', 'ops/s', 'submit p95 ms', 'progress p95 ms'])
+
+
+@benchmark
+def read_pool(args: argparse.Namespace) -> None:
+    """
+    Measure submit latency while progress readers share or bypass the write pool.
+
+    For each ``--threads`` count, that many readers repeatedly load a
+    user's full history (``--sizes[0]`` tests) while two writers submit
+    tests. Readers either use the primary engine, as before, or the
+    query-only read engine from ``create_read_engine``. Both engines have
+    the default pool of 5 connections plus 10 overflow; a submit that
+    waits more than 2 seconds for a connection counts as timed out.
+    """
+    import shutil
+    import tempfile
+    import threading
+    from datetime import datetime, timedelta
+    from sqlalchemy import create_engine, insert, select
+    from sqlalchemy.exc import TimeoutError as PoolTimeout
+    from db_config import engine_options, install_sqlite_pragmas, create_read_engine
+    from models import db, TypingTest
+
+    directory = tempfile.mkdtemp(prefix='read-pool-bench-')
+    url = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+    tests = TypingTest.__table__
+    rows = []
+    try:
+        primary = create_engine(url, pool_timeout=2, **engine_options(url))
+        install_sqlite_pragmas(primary)
+        db.metadata.create_all(primary)
+        base = datetime(2024, 1, 1)
+        with primary.begin() as conn:
+            conn.execute(insert(tests), [{'id': f"seed-{i}", 'user_id': 'reader', 'wpm': 50.0, 'accuracy': 95.0,
+                                          'timestamp': base + timedelta(hours=i)} for i in range(args.sizes[0])])
+        reader_engine = create_read_engine(primary)
+
+        for readers in args.threads:
+            for label, engine in (('shared pool', primary), ('read pool', reader_engine)):
+                stop = threading.Event()
+                submits, reads, timeouts = [], [0], [0]
+                lock = threading.Lock()
+
+                def read():
+                    while not stop.is_set():
+                        try:
+                            with engine.connect() as conn:
+                                conn.execute(select(tests.c.timestamp, tests.c.wpm, tests.c.accuracy)
+                                             .where(tests.c.user_id == 'reader').order_by(tests.c.timestamp)).all()
+                        except PoolTimeout:
+                            continue
+                        with lock:
+                            reads[0] += 1
+
+                def write(seed):
+                    for i in range(50):
+                        started = time.perf_counter()
+                        try:
+                            with primary.begin() as conn:
+                                conn.execute(insert(tests).values(id=f"{label}-{readers}-{seed}-{i}",
+                                                                  user_id='writer', wpm=60.0, accuracy=97.0,
+                                                                  timestamp=datetime.now()))
+                        except PoolTimeout:
+                            with lock:
+                                timeouts[0] += 1
+                            continue
+                        submits.append(time.perf_counter() - started)
+
+                reader_threads = [threading.Thread(target=read) for _ in range(readers)]
+                writer_threads = [threading.Thread(target=write, args=(seed,)) for seed in range(2)]
+                started = time.perf_counter()
+                for thread in reader_threads + writer_threads:
+                    thread.start()
+                for thread in writer_threads:
+                    thread.join()
+                stop.set()
+                for thread in reader_threads:
+                    thread.join()
+                elapsed = time.perf_counter() - started
+                submits.sort()
+                p95 = f"{submits[int(len(submits) * 0.95)] * 1e3:.1f}" if submits else '-'
+                rows.append([readers, label, p95, timeouts[0], f"{reads[0] / elapsed:.0f}"])
+        primary.dispose()
+        reader_engine.dispose()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    _report(rows, ['readers', 'reads via', 'submit p95 ms', 'submits timed out', 'reads/s'])
+
+
+@benchmark
+def anonymous_profiles(args: argparse.Namespace) -> None:
+    """
+    Measure compact_anonymous_profiles on a table of idle anonymous profiles.
+
+    For each size, that many idle anonymous profiles (every other one
+    with five tests and a game result) sit next to as many registered
+    and recently active ones. The longest batch is how long a single
+    compaction transaction holds its locks.
+    """
+    from datetime import datetime, timedelta
+    from sqlalchemy import event, insert
+    from models import db, TypingTest, GameResult, UserProfile, User
+    import migrations
+
+    idle = datetime.now() - timedelta(days=60)
+    rows = []
+    with _database_app(ANONYMOUS_PROFILE_TTL_DAYS=30):
+        commits = []
+        event.listen(db.session, 'after_commit', lambda session: commits.append(time.perf_counter()))
+        for size in args.sizes:
+            profiles = [dict(user_id=f"idle-{size}-{i}", last_active_at=idle) for i in range(size)]
+            profiles += [dict(user_id=f"active-{size}-{i}", last_active_at=datetime.now()) for i in range(size)]
+            profiles += [dict(user_id=f"registered-{size}-{i}", last_active_at=idle) for i in range(size)]
+            db.session.execute(insert(UserProfile), profiles)
+            db.session.execute(insert(User), [dict(username=f"user-{size}-{i}", email=f"{size}-{i}@example.com",
+                                                   profile_id=f"registered-{size}-{i}") for i in range(size)])
+            db.session.execute(insert(TypingTest), [
+                dict(id=f"{size}-{i}-{j}", user_id=f"idle-{size}-{i}", wpm=40.0, accuracy=95.0, timestamp=idle)
+                for i in range(0, size, 2) for j in range(5)])
+            db.session.execute(insert(GameResult), [dict(user_id=f"idle-{size}-{i}", score=10, timestamp=idle)
+                                                    for i in range(0, size, 2)])
+            db.session.commit()
+
+            commits.clear()
+            started = time.perf_counter()
+            result = migrations.compact_anonymous_profiles()
+            elapsed = time.perf_counter() - started
+            longest = max(b - a for a, b in zip([started] + commits, commits)) if commits else elapsed
+            rows.append([f"{size:,}", result['profiles_deleted'], result['rows_deleted'], f"{elapsed * 1e3:.0f}",
+                         f"{longest * 1e3:.1f}", UserProfile.query.count()])
+            UserProfile.query.delete()
+            User.query.delete()
+            db.session.commit()
+
+    _report(rows, ['idle profiles', 'profiles deleted', 'rows deleted', 'total ms', 'longest batch ms',
+                   'profiles kept'])
+
+
+@benchmark
+def identity_resolution(args: argparse.Namespace) -> None:
+    """
+    Compare the identity queries and time of resolving the logged-in user per request.
+
+    Each request loads one of ``--sizes[0]`` users and reads their
+    profile id, as ``check_user_session`` does: formerly by primary key
+    with a lazy profile load, now with ``IdentityResolver`` without and
+    with its per-worker cache.
+    """
+    from sqlalchemy import event, insert
+    from models import db, User, UserProfile
+    from identity import IdentityResolver
+
+    users = args.sizes[0]
+    requests = 2000
+
+    def legacy(user_id):
+        return db.session.get(User, int(user_id)).profile.user_id
+
+    rows = []
+    with _database_app() as app:
+        db.session.execute(insert(UserProfile), [dict(user_id=f"profile-{i}") for i in range(users)])
+        db.session.execute(insert(User), [dict(id=i + 1, username=f"user-{i}", email=f"{i}@example.com",
+                                               profile_id=f"profile-{i}") for i in range(users)])
+        db.session.commit()
+        queries = [0]
+        event.listen(db.engine, 'before_cursor_execute', lambda *a: queries.__setitem__(0, queries[0] + 1))
+
+        uncached, cached = IdentityResolver(cache_ttl=0), IdentityResolver(cache_size=users)
+        for label, load in (('User.query.get + lazy profile', legacy),
+                            ('joined query', lambda user_id: uncached.load_user(user_id).profile_id),
+                            ('joined query + cache', lambda user_id: cached.load_user(user_id).profile_id)):
+            def run():
+                for i in range(requests):
+                    with app.test_request_context():
+                        load(str(i % users + 1))
+                        db.session.remove()
+
+            run()  # warm the cache
+            queries[0] = 0
+            run()
+            per_request = queries[0] / requests
+            elapsed = _best_time(run, args.repeat)
+            rows.append([label, f"{per_request:.2f}", f"{elapsed / requests * 1e6:.0f}"])
+
+    _report(rows, ['identity via', 'queries/request', 'us/request'])
+
+
+@benchmark
+def error_statistics(args: argparse.Namespace) -> None:
+    """
+    Check that recording a submission's errors costs the same at any history length.
+
+    One user submits tests with random character and word errors; the
+    time per submission and the size of the profile's statistics are
+    reported once the history reaches each size (e.g. --sizes 100,1000,10000).
+    """
+    import json
+    from models import db, UserProfile, ErrorEvent
+
+    rng = random.Random(0)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+
+    def submission():
+        return {
+            'character_errors': {f"{rng.choice(letters)}->{rng.choice(letters)}": rng.randint(1, 3)
+                                 for _ in range(rng.randint(1, 8))},
+            'word_errors': [{'original': 'word', 'typed': 'wrod', 'position': i} for i in range(3)],
+            'total_characters': 300
+        }
+
+    def submit():
+        profile = db.session.get(UserProfile, 'user')
+        profile.update_error_statistics(submission())
+
+    rows = []
+    with _database_app():
+        db.session.add(UserProfile(user_id='user', error_statistics={}))
+        db.session.commit()
+
+        done = 0
+        for size in sorted(args.sizes):
+            while done < size:
+                submit()
+                done += 1
+            per_submit = _best_time(lambda: [submit() for _ in range(20)], args.repeat) / 20
+            done += 20 * args.repeat
+            profile_bytes = len(json.dumps(db.session.get(UserProfile, 'user').error_statistics))
+            pairs = ErrorEvent.query.filter_by(user_id='user').count()
+            rows.append([f"{size:,}", f"{per_submit * 1000:.2f}", f"{profile_bytes:,}", pairs])
+
+    _report(rows, ['submissions', 'ms/submit', 'profile bytes', 'error pairs'])
+
+
+def _reference_analyze_errors(original_text: str, typed_text: str) -> Dict[str, Any]:
+    """
+    Word-by-word error analysis as utils.analyze_errors computed it before
+    whole-text alignment; the baseline for the error_alignment benchmark.
+    """
+    import difflib
+
+    original_words = original_text.split()
+    typed_words = typed_text.split()
+    error_count = 0
+    character_errors = {}
+    for orig_word, typed_word in zip(original_words, typed_words):
+        if orig_word == typed_word:
+            continue
+        matcher = difflib.SequenceMatcher(None, orig_word, typed_word)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == 'equal':
+                continue
+            error_count += max(i2 - i1, j2 - j1)
+            if tag == 'replace':
+                pairs = [f"{o}->{t}" for o, t in zip(orig_word[i1:i2], typed_word[j1:j2])]
+            elif tag == 'delete':
+                pairs = [f"{o}->∅" for o in orig_word[i1:i2]]
+            else:
+                pairs = [f"∅->{t}" for t in typed_word[j1:j2]]
+            for pair in pairs:
+                character_errors[pair] = character_errors.get(pair, 0) + 1
+    error_count += abs(len(original_words) - len(typed_words))
+    return {'error_count': error_count, 'character_errors': character_errors}
+
+
+def synthetic_typing(original_text: str, error_rate: float = 0.02, seed: int = 0) -> tuple:
+    """
+    Type a text with random mistakes.
+
+    Characters are substituted, dropped or doubled, and now and then a
+    whole word is skipped or repeated.
+
+    Args:
+        original_text: Text to type
+        error_rate: Probability of a mistake per character
+        seed: Random seed
+
+    Returns:
+        Tuple of the typed text and the number of characters mistyped
+    """
+    rng = random.Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    typed_words = []
+    mistakes = 0
+    for word in original_text.split():
+        roll = rng.random()
+        if roll < error_rate:
+            mistakes += len(word)  # skipped word
+            continue
+        if roll < 2 * error_rate:
+            typed_words.append(word)  # repeated word
+            mistakes += len(word)
+        chars = []
+        for char in word:
+            roll = rng.random()
+            if roll < error_rate / 3:
+                chars.append(rng.choice(letters))
+            elif roll < 2 * error_rate / 3:
+                pass
+            elif roll < error_rate:
+                chars.extend((char, char))
+            else:
+                chars.append(char)
+                continue
+            mistakes += 1
+        typed_words.append(''.join(chars))
+    return ' '.join(typed_words), mistakes
+
+
+@benchmark
+def error_alignment(args: argparse.Namespace) -> None:
+    """
+    Compare whole-text alignment against the old word-by-word error analysis.
+
+    Runs on the HARD_TEXTS corpus and on synthetic texts of each size in
+    characters (e.g. --sizes 1000,10000), typed with about 2% mistakes
+    including skipped and repeated words. Reports the time of both
+    implementations and the errors each counts next to the mistakes made.
+    """
+    from text_data import HARD_TEXTS
+    from utils import analyze_errors
+
+    rng = random.Random(0)
+    vocabulary = [word for text in HARD_TEXTS for word in text.split()]
+    inputs = [('HARD_TEXTS', ' '.join(HARD_TEXTS))]
+    for size in args.sizes:
+        words, length = [], 0
+        while length < size:
+            words.append(rng.choice(vocabulary))
+            length += len(words[-1]) + 1
+        inputs.append((f"{size:,} chars", ' '.join(words)))
+
+    rows = []
+    for label, original_text in inputs:
+        typed_text, mistakes = synthetic_typing(original_text)
+        old = _reference_analyze_errors(original_text, typed_text)
+        new = analyze_errors(original_text, typed_text)
+        old_time = _best_time(lambda: _reference_analyze_errors(original_text, typed_text), args.repeat)
+        new_time = _best_time(lambda: analyze_errors(original_text, typed_text), args.repeat)
+        rows.append([label, f"{old_time * 1000:.2f}", f"{new_time * 1000:.2f}",
+                     f"{old_time / new_time:.1f}x", mistakes, old['error_count'], new['error_count']])
+
+    _report(rows, ['input', 'old ms', 'new ms', 'speedup', 'mistakes', 'old errors', 'new errors'])
+
+
+@benchmark
+def batch_scoring(args: argparse.Namespace) -> None:
+    """
+    Measure batch scoring throughput as worker processes are added.
+
+    Scores the largest of --sizes synthetic submissions (300-character
+    texts with typing mistakes and keystrokes) with each worker count in
+    --threads, and checks the results match scoring them one by one.
+    """
+    from text_data import HARD_TEXTS
+    from batch_scoring import BatchScorer, score_submission
+
+    rng = random.Random(0)
+    vocabulary = [word for text in HARD_TEXTS for word in text.split()]
+    submissions = []
+    for seed in range(max(args.sizes)):
+        original_text = ' '.join(rng.choice(vocabulary) for _ in range(50))[:300]
+        typed_text, _ = synthetic_typing(original_text, seed=seed)
+        submissions.append({
+            'original_text': original_text,
+            'typed_text': typed_text,
+            'time_taken': 60,
+            'keystroke_data': synthetic_keystrokes(len(typed_text), seed=seed)
+        })
+    expected = [score_submission(submission)['wpm'] for submission in submissions[:100]]
+
+    rows = []
+    base = None
+    for workers in args.threads:
+        scorer = BatchScorer(workers=workers)
+        list(scorer.score(submissions[:scorer.chunk_size * workers + 1]))  # start the pool
+        results = []
+        best = _best_time(lambda: results.__setitem__(slice(None), scorer.score(submissions)), args.repeat)
+        scorer.close()
+
+        rate = len(submissions) / best
+        base = base or rate
+        mismatches = sum(result['wpm'] != wpm for result, wpm in zip(results, expected))
+        rows.append([workers, f"{rate:,.0f}", f"{rate / base:.2f}x", mismatches])
+
+    print(f"{len(submissions):,} submissions, {os.cpu_count()} CPUs")
+    _report(rows, ['workers', 'submissions/s', 'scaling', 'mismatches'])
+
+
+@benchmark
+def corpus_sampling(args: argparse.Namespace) -> None:
+    """
+    Measure corpus index build time, size and sampling cost as the corpus grows.
+
+    For each size, that many synthetic passages are built into a temporary
+    index, which is then opened and sampled by difficulty band with and
+    without a feature filter. Python heap growth from opening and sampling
+    the index should stay flat, since the arrays are memory-mapped.
+    """
+    import shutil
+    import tempfile
+    import tracemalloc
+    from text_data import HARD_TEXTS
+    from corpus import Corpus, build_index
+
+    vocabulary = [word for text in HARD_TEXTS for word in text.split()]
+
+    def passages(count):
+        rng = random.Random(0)
+        for _ in range(count):
+            yield {'text': ' '.join(rng.choice(vocabulary) for _ in range(rng.randint(10, 80))),
+                   'weight': rng.random()}
+
+    rows = []
+    for size in args.sizes:
+        directory = tempfile.mkdtemp(prefix='corpus-bench-')
+        try:
+            start = time.perf_counter()
+            build_index(directory, passages(size))
+            build_time = time.perf_counter() - start
+            disk = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+            tracemalloc.start()
+            corpus = Corpus(directory)
+            rng = random.Random(1)
+            for _ in range(1000):
+                corpus.texts.sample('hard', rng)
+                corpus.texts.sample('hard', rng, max_length=200, chars='q')
+            heap = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            draws = 20000
+            plain = _best_time(lambda: [corpus.texts.sample('hard', rng) for _ in range(draws)], args.repeat)
+            filtered = _best_time(lambda: [corpus.texts.sample('hard', rng, max_length=200, chars='q')
+                                           for _ in range(draws // 10)], args.repeat)
+
+            rows.append([f"{size:,}", f"{build_time:.2f}", f"{disk / 1e6:.1f}", f"{heap / 1e3:,.0f}",
+                         f"{plain / draws * 1e6:.1f}", f"{filtered / (draws // 10) * 1e6:.1f}"])
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    _report(rows, ['passages', 'build s', 'index MB', 'peak heap KB', 'us/sample', 'us/filtered sample'])
+
+
+@benchmark
+def drill_generation(args: argparse.Namespace) -> None:
+    """
+    Check that drill generation stays well under a millisecond as the vocabulary grows.
+
+    For each size, that many synthetic words are built into a corpus and a
+    DrillIndex, and 20-word drills are generated for a user with typical
+    error statistics and slow keys.
+    """
+    import shutil
+    import tempfile
+    from corpus import Corpus, build_index
+    from drills import DrillIndex, weak_targets
+
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    error_statistics = {
+        'most_common_errors': {'e->r': 12, 'x->c': 7, 'q->∅': 4, 'i->o': 3},
+        'word_errors': [{'original': 'their', 'typed': 'thier'}, {'original': 'quick', 'typed': 'quikc'}]
+    }
+    key_intervals = {letter: 120.0 + 40 * (letter in 'zxqb') for letter in letters}
+
+    rows = []
+    for size in args.sizes:
+        rng = random.Random(0)
+        words = ({'text': ''.join(rng.choice(letters) for _ in range(rng.randint(2, 12)))} for _ in range(size))
+        directory = tempfile.mkdtemp(prefix='drill-bench-')
+        try:
+            build_index(directory, [], words)
+            start = time.perf_counter()
+            index = DrillIndex([Corpus(directory).words])
+            build_time = time.perf_counter() - start
+
+            drills = 2000
+            per_drill = _best_time(lambda: [index.generate(weak_targets(error_statistics, key_intervals), 20)
+                                            for _ in range(drills)], args.repeat) / drills
+            rows.append([f"{size:,}", f"{build_time:.2f}", f"{per_drill * 1e6:.0f}"])
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    _report(rows, ['words', 'index build s', 'us/drill'])
+
+
+@benchmark
+def game_stream(args: argparse.Namespace) -> None:
+    """
+    Check that serving a page of game words costs the same at any cursor and vocabulary size.
+
+    For each size, that many synthetic words are built into a corpus and
+    50-word pages are served from the start of a game and from far into it.
+    """
+    import shutil
+    import tempfile
+    from corpus import Corpus, build_index
+    from game_stream import WordStream
+
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    rows = []
+    for size in args.sizes:
+        rng = random.Random(0)
+        words = ({'text': ''.join(rng.choice(letters) for _ in range(rng.randint(2, 12)))} for _ in range(size))
+        directory = tempfile.mkdtemp(prefix='game-bench-')
+        try:
+            build_index(directory, [], words)
+            stream = WordStream(Corpus(directory).words, seed=12345, difficulty='medium')
+            pages = 200
+            first = _best_time(lambda: [stream.page(0, 50) for _ in range(pages)], args.repeat) / pages
+            far = _best_time(lambda: [stream.page(10 ** 9, 50) for _ in range(pages)], args.repeat) / pages
+            rows.append([f"{size:,}", f"{first * 1e6:.0f}", f"{far * 1e6:.0f}"])
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    _report(rows, ['words', 'us/page at 0', 'us/page at 1e9'])
+
+
+@benchmark
+def chatbot_retrieval(args: argparse.Namespace) -> None:
+    """
+    Compare the indexed chatbot against a linear scan of its patterns.
+
+    For each size, a synthetic knowledge base of that many entries (two or
+    three word phrases over a 5,000 word vocabulary) is indexed, and
+    distinct queries mixing known phrases with noise words are answered
+    by the old substring scan, by the engine's search and by its cached
+    answer path.
+    """
+    from chatbot_engine import ChatbotEngine, KnowledgeEntry
+
+    rng = random.Random(0)
+    vocabulary = [f"w{i}" for i in range(5000)]
+    rows = []
+    for size in args.sizes:
+        responses = {}
+        while len(responses) < size:
+            phrase = ' '.join(rng.choice(vocabulary) for _ in range(rng.randint(2, 3)))
+            responses[phrase] = f"answer {len(responses)} " + ' '.join(rng.sample(vocabulary, 12))
+        patterns = list(responses)
+        queries = [' '.join(rng.sample(vocabulary, 4) + [rng.choice(patterns)] + rng.sample(vocabulary, 3))
+                   for _ in range(200)]
+
+        def linear():
+            for query in queries:
+                lowered = query.lower()
+                next((response for pattern, response in responses.items() if pattern.lower() in lowered), None)
+
+        build_start = time.perf_counter()
+        engine = ChatbotEngine([KnowledgeEntry((pattern,), response) for pattern, response in responses.items()])
+        build = time.perf_counter() - build_start
+
+        scan = _best_time(linear, args.repeat) / len(queries)
+        indexed = _best_time(lambda: [engine.search(query) for query in queries], args.repeat) / len(queries)
+        cached = _best_time(lambda: [engine.answer(query) for query in queries], args.repeat) / len(queries)
+        rows.append([f"{size:,}", f"{build * 1e3:.0f}", f"{scan * 1e6:.1f}", f"{indexed * 1e6:.1f}",
+                     f"{cached * 1e6:.1f}"])
+
+    _report(rows, ['entries', 'build ms', 'scan us/query', 'search us/query', 'cached us/query'])
+
+
+@benchmark
+def static_payloads(args: argparse.Namespace) -> None:
+    """
+    Compare serving lessons with jsonify against their pre-serialized payloads.
+
+    The body is answered by ``jsonify``, by ``payload_response``
+    (plain and gzip-accepting clients) and as a ``304`` revalidation,
+    inside a request context but without the routing and login layers,
+    which cost the same in every case.
+    """
+    from flask import Flask, jsonify
+    from static_responses import build_payloads, payload_response
+    from text_data import LESSONS
+
+    app = Flask('benchmark')
+    # One lesson, as /api/get-lesson serves, and every lesson as a larger read-mostly body
+    values = {'one lesson': LESSONS['1'], 'all lessons': LESSONS}
+    payloads = build_payloads(values)
+    rows = []
+    for key, value in values.items():
+        payload = payloads[key]
+        cases = [
+            ('jsonify', {}, lambda: jsonify(value)),
+            ('payload', {}, lambda: payload_response(payload)),
+            ('payload gzip', {'Accept-Encoding': 'gzip'}, lambda: payload_response(payload)),
+            ('304', {'If-None-Match': f'"{payload.etag}"'}, lambda: payload_response(payload)),
+        ]
+        for name, headers, respond in cases:
+            with app.test_request_context('/api/get-lesson', headers=headers):
+                def run():
+                    for _ in range(100):
+                        respond().get_data()
+                elapsed = _best_time(run, args.repeat) / 100
+                rows.append([key, name, f"{elapsed * 1e6:.1f}", len(respond().get_data())])
+
+    _report(rows, ['body', 'response', 'us/request', 'body bytes'])
+
+
+@benchmark
+def live_events(args: argparse.Namespace) -> None:
+    """
+    Measure the cost of idle SSE subscribers in the LiveEventHub.
+
+    For each size, that many subscribers are opened (one per channel, as
+    live test sessions are) and the memory they hold plus the time to
+    publish one event to every channel are reported. A gevent worker adds
+    roughly one greenlet per connection on top of this.
+    """
+    import tracemalloc
+    from live_events import LiveEventHub
+
+    rows = []
+    for size in args.sizes:
+        hub = LiveEventHub(max_subscribers=size)
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        subscriptions = [hub.subscribe(f"session-{i}") for i in range(size)]
+        held = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+
+        best = float('inf')
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            for i in range(size):
+                hub.publish(f"session-{i}", 'metrics', {'current_wpm': 60.0, 'predicted_wpm': 62.5, 'seq': i})
+            best = min(best, time.perf_counter() - start)
+            for subscription in subscriptions:
+                list(subscription.drain())
+                subscription.wait(0)
+
+        rows.append([f"{size:,}", f"{held / size:,.0f}", f"{size / best:,.0f}"])
+
+    _report(rows, ['subscribers', 'bytes/subscriber', 'events/s'])
+
+
+_STARTUP_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+application = app.create_app()
+created = time.perf_counter()
+application.test_client().get('/api/get-lesson?lesson_id=1')
+print(json.dumps([imported - started, created - imported, time.perf_counter() - created, len(sys.modules)]))
+"""
+
+
+@benchmark
+def startup(args: argparse.Namespace) -> None:
+    """
+    Track the cost of starting a worker, each run in a fresh interpreter.
+
+    Reports the time to import ``app``, to run ``create_app`` (lazily, and
+    with ``PRELOAD_SHARED_STATE`` as in a ``gunicorn --preload`` master)
+    and to serve the first request, then the heaviest imports of ``app``
+    from ``python -X importtime``. ``nltk``, which ``app`` used to import
+    and download data with, is timed for reference.
+
+    The interpreters run in a temporary directory, so the database, the
+    user cache and the corpus index under ``data/`` are created there
+    rather than in the checkout. The corpus is built before the runs, as
+    a deployed worker finds it already built.
+    """
+    import json
+    import shutil
+    import subprocess
+    import tempfile
+    from corpus import default_corpus
+
+    directory = tempfile.mkdtemp(prefix='startup-bench-')
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, SESSION_SECRET='benchmark', LOG_LEVEL='WARNING',
+               PYTHONPATH=os.pathsep.join(filter(None, [here, os.environ.get('PYTHONPATH')])),
+               DATABASE_URL=f"sqlite:///{os.path.join(directory, 'bench.db')}",
+               USER_CACHE_PATH=os.path.join(directory, 'data', 'user_cache.sqlite'))
+    rows = []
+    try:
+        default_corpus(os.path.join(directory, 'data', 'corpus'))
+        for label, preload in (('lazy', ''), ('preload', '1')):
+            runs = [json.loads(subprocess.run([sys.executable, '-c', _STARTUP_SCRIPT], cwd=directory, check=True,
+                                              capture_output=True, text=True,
+                                              env=dict(env, PRELOAD_SHARED_STATE=preload)).stdout)
+                    for _ in range(args.repeat)]
+            best = [min(run[i] for run in runs) for i in range(3)]
+            rows.append([label] + [f"{seconds * 1e3:.0f}" for seconds in best] + [runs[0][3]])
+        nltk = min(float(subprocess.run([sys.executable, '-c', 'import time; t = time.perf_counter(); import nltk; '
+                                         'print(time.perf_counter() - t)'], cwd=directory, capture_output=True,
+                                        text=True, env=env).stdout or 'nan') for _ in range(args.repeat))
+        rows.append(['import nltk', f"{nltk * 1e3:.0f}", '-', '-', '-'])
+
+        profile = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=directory, check=True,
+                                 capture_output=True, text=True, env=env).stderr
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    _report(rows, ['start', 'import ms', 'create_app ms', 'first request ms', 'modules'])
+    print()
+    imports = []
+    for line in profile.splitlines():
+        parts = line.split('|')
+        # Names are indented by nesting depth; depth 1 are the modules app itself imports
+        if len(parts) == 3 and parts[1].strip().isdigit() and parts[2].startswith('   ') \
+                and not parts[2].startswith('     '):
+            imports.append((int(parts[1]), parts[2].strip()))
+    _report([[name, f"{micros / 1e3:.0f}"] for micros, name in sorted(imports, reverse=True)[:8]],
+            ['imported by app', 'cumulative ms'])
+
+
+def main(argv=None) -> int:
+    """Run a benchmark from the command line."""
+    parser = argparse.ArgumentParser(description="Run a TypeMaster benchmark.")
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+    parser.add_argument('--sizes', type=_int_list, default=[1000, 10000, 100000],
+                        help="Comma-separated input sizes")
+    parser.add_argument('--threads', type=_int_list, default=[1, 2, 4, 8],
+                        help="Comma-separated thread counts")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="Repetitions per measurement (best time is reported)")
+    parser.add_argument('--database-url', default=os.environ.get('BENCHMARK_DATABASE_URL'),
+                        help="Scratch PostgreSQL database for database_profile")
+    args = parser.parse_args(argv)
+
+    BENCHMARKS[args.benchmark](args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,282 @@
+"""
+Retrieval engine for the typing chatbot.
+
+The knowledge base is indexed once when the engine is built:
+
+- an Aho-Corasick automaton over the tokens of every entry's trigger
+  phrases finds all exact phrase matches in one pass over the query
+- a BM25 inverted index over the phrases, questions and answers ranks
+  entries for queries that contain no exact phrase
+
+Answers are cached per normalized query, so repeated questions cost a
+dictionary lookup.
+"""
+import re
+import json
+import math
+import heapq
+import logging
+from collections import defaultdict, deque
+from typing import Any, Dict, Iterable, List, NamedTuple, Sequence, Tuple
+from user_cache import LRUCacheBackend, MISSING
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESPONSE = ("I'm not sure how to help with that. Try asking about typing speed, accuracy, "
+                    "or how to improve your typing skills.")
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Phrase tokens count this many times in an entry's BM25 document
+PHRASE_BOOST = 3
+# Lowest BM25 score accepted as an answer
+MIN_SCORE = 1.0
+# Terms in more than this share of the entries carry no signal and are skipped
+MAX_DOCUMENT_FREQUENCY = 0.5
+# Postings kept per term, highest scoring first, so a query's cost does not
+# grow with the knowledge base
+MAX_POSTINGS = 64
+
+STOPWORDS = frozenset("""
+    a an and are as at be but by can do does for from how i in is it me my of on or so that the
+    to what when where which who why with you your
+""".split())
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase a text and split it into alphanumeric tokens."""
+    return _TOKEN.findall(text.lower())
+
+
+class KnowledgeEntry(NamedTuple):
+    """One answer in the knowledge base."""
+    phrases: Tuple[str, ...]  # exact trigger phrases
+    response: str
+    question: str = ''
+
+
+class Match(NamedTuple):
+    """A ranked knowledge base entry for a query."""
+    entry_id: int
+    score: float
+    kind: str  # 'phrase' or 'bm25'
+
+
+class PhraseAutomaton:
+    """Aho-Corasick automaton matching token sequences."""
+
+    def __init__(self, phrases: Iterable[Tuple[Sequence[str], int]]):
+        """
+        Build the automaton.
+
+        Args:
+            phrases: (tokens, entry id) pairs
+        """
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[Tuple[int, int]]] = [[]]  # (entry id, phrase length) per state
+
+        for tokens, entry_id in phrases:
+            state = 0
+            for token in tokens:
+                following = self._goto[state].get(token)
+                if following is None:
+                    following = len(self._goto)
+                    self._goto[state][token] = following
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                state = following
+            if tokens:
+                self._output[state].append((entry_id, len(tokens)))
+
+        # Breadth-first: each state's failure link is the longest proper suffix in the trie
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for token, following in self._goto[state].items():
+                queue.append(following)
+                fallback = self._fail[state]
+                while fallback and token not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                suffix = self._goto[fallback].get(token, 0)
+                # Children of the root fall back to the root, not to themselves
+                self._fail[following] = suffix if suffix != following else 0
+                self._output[following] = self._output[following] + self._output[self._fail[following]]
+
+    def __len__(self) -> int:
+        return len(self._goto)
+
+    def find(self, tokens: Sequence[str]) -> List[Tuple[int, int]]:
+        """
+        Find every phrase occurring in a token sequence.
+
+        Args:
+            tokens: Query tokens
+
+        Returns:
+            (entry id, phrase length) for each occurrence
+        """
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        found = []
+        for token in tokens:
+            while state and token not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(token, 0)
+            if output[state]:
+                found.extend(output[state])
+        return found
+
+
+class ChatbotEngine:
+    """Answers typing questions from an indexed knowledge base."""
+
+    def __init__(self, entries: Sequence[KnowledgeEntry], default_response: str = DEFAULT_RESPONSE,
+                 cache_size: int = 10000, cache_ttl: float = 3600):
+        """
+        Index a knowledge base.
+
+        Args:
+            entries: Knowledge base entries; earlier entries win ties
+            default_response: Answer when nothing matches
+            cache_size: Maximum number of cached answers
+            cache_ttl: Seconds an answer stays cached
+        """
+        self.entries = list(entries)
+        self.default_response = default_response
+        self._cache = LRUCacheBackend(max_size=cache_size, ttl=cache_ttl)
+
+        self._automaton = PhraseAutomaton(
+            (tokenize(phrase), entry_id)
+            for entry_id, entry in enumerate(self.entries) for phrase in entry.phrases)
+
+        # Term frequencies: term -> {entry id: count}
+        postings: Dict[str, Dict[int, int]] = {}
+        self._lengths = []
+        for entry_id, entry in enumerate(self.entries):
+            terms = [t for phrase in entry.phrases for t in tokenize(phrase)] * PHRASE_BOOST
+            terms += tokenize(entry.question) + tokenize(entry.response)
+            terms = [t for t in terms if t not in STOPWORDS]
+            self._lengths.append(len(terms))
+            for term in terms:
+                counts = postings.setdefault(term, {})
+                counts[entry_id] = counts.get(entry_id, 0) + 1
+
+        count = len(self.entries)
+        average_length = sum(self._lengths) / count if count else 0.0
+        # Precompute each posting's full BM25 contribution, so a query only sums them,
+        # and keep the strongest postings of each term
+        self._postings: Dict[str, List[Tuple[int, float]]] = {}
+        for term, counts in postings.items():
+            if len(counts) > MAX_DOCUMENT_FREQUENCY * count and count > 2:
+                continue
+            idf = math.log(1 + (count - len(counts) + 0.5) / (len(counts) + 0.5))
+            contributions = [
+                (entry_id, idf * tf * (BM25_K1 + 1) /
+                 (tf + BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[entry_id] / average_length)))
+                for entry_id, tf in counts.items()]
+            self._postings[term] = heapq.nsmallest(MAX_POSTINGS, contributions, key=lambda item: (-item[1], item[0]))
+        logger.info(f"Indexed {count} chatbot entries ({len(self._automaton)} phrase states, "
+                    f"{len(self._postings)} terms)")
+
+    @classmethod
+    def from_responses(cls, responses: Dict[str, str], **kwargs: Any) -> 'ChatbotEngine':
+        """
+        Build an engine from a phrase -> response dict such as ``CHATBOT_RESPONSES``.
+
+        Args:
+            responses: Trigger phrase to response mapping
+            **kwargs: Passed to the constructor
+
+        Returns:
+            The ChatbotEngine
+        """
+        return cls([KnowledgeEntry((phrase,), response) for phrase, response in responses.items()], **kwargs)
+
+    @staticmethod
+    def load_faq(path: str) -> List[KnowledgeEntry]:
+        """
+        Read knowledge base entries from a JSON Lines file.
+
+        Each line holds an object with ``answer`` and ``question`` and
+        optionally ``phrases``, a list of exact trigger phrases.
+
+        Args:
+            path: Path to the file
+
+        Returns:
+            The entries, in file order
+        """
+        entries = []
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    item = json.loads(line)
+                    entries.append(KnowledgeEntry(tuple(item.get('phrases', ())), item['answer'],
+                                                  item.get('question', '')))
+        return entries
+
+    def search(self, query: str, limit: int = 3) -> List[Match]:
+        """
+        Rank the knowledge base entries for a query.
+
+        Entries with an exact phrase in the query come first, longest
+        phrase first; the rest are ranked by BM25 score.
+
+        Args:
+            query: User's query text
+            limit: Maximum number of matches
+
+        Returns:
+            Matches, best first
+        """
+        tokens = tokenize(query)
+
+        phrase_lengths: Dict[int, int] = {}
+        for entry_id, length in self._automaton.find(tokens):
+            if length > phrase_lengths.get(entry_id, 0):
+                phrase_lengths[entry_id] = length
+        matches = [Match(entry_id, float(length), 'phrase') for entry_id, length in
+                   sorted(phrase_lengths.items(), key=lambda item: (-item[1], item[0]))[:limit]]
+        if len(matches) >= limit:
+            return matches
+
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokens):
+            for entry_id, contribution in self._postings.get(term, ()):
+                scores[entry_id] += contribution
+        # (score, -entry id) so that ties go to the earlier entry
+        candidates = [(score, -entry_id) for entry_id, score in scores.items()
+                      if score >= MIN_SCORE and entry_id not in phrase_lengths]
+        for score, negated_id in heapq.nlargest(limit - len(matches), candidates):
+            matches.append(Match(-negated_id, score, 'bm25'))
+        return matches
+
+    def answer(self, query: str) -> Tuple[str, List[Match]]:
+        """
+        Answer a query, using the cache for repeated queries.
+
+        Args:
+            query: User's query text
+
+        Returns:
+            Tuple of the response and the ranked matches it came from
+        """
+        key = ' '.join(tokenize(query))
+        cached = self._cache.get(key)
+        if cached is not MISSING:
+            return cached
+
+        matches = self.search(query)
+        result = (self.entries[matches[0].entry_id].response if matches else self.default_response, matches)
+        self._cache.set(key, result)
+        return result
+
+    def describe(self, match: Match) -> str:
+        """Return a short label for a matched entry: its question or first phrase."""
+        entry = self.entries[match.entry_id]
+        return entry.question or (entry.phrases[0] if entry.phrases else '')
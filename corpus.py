@@ -0,0 +1,603 @@
+"""
+Memory-mapped corpus of typing texts and game words.
+
+A corpus is built once into a directory of flat binary arrays plus a
+``meta.json`` describing them. Every worker process maps the same files,
+so the operating system shares their pages and memory stays flat however
+large the corpus grows. Each section (``texts`` and ``words``) stores:
+
+- the UTF-8 bytes of all items and their offsets
+- per-item features: length, word count, weight, a character histogram
+  (sparse bigram histograms alongside) and a computed difficulty score
+- the items grouped by difficulty band, with a Walker/Vose alias table per
+  band so a weighted random item is drawn in constant time
+
+Difficulty is the percentile of a score combining length, mean word
+length, the share of shifted or non-letter characters and how unusual
+the item's bigrams are within the corpus. Items with an explicit
+``difficulty`` label keep it as their band; the others are split into
+bands by difficulty percentile.
+
+Build a corpus from a JSON Lines file (one ``{"text": ..., "weight": ...,
+"difficulty": ...}`` object per line) or a text file (one passage per
+line) with:
+
+    python corpus.py build passages.jsonl data/corpus [--words words.txt]
+"""
+import os
+import re
+import sys
+import json
+import math
+import random
+import shutil
+import hashlib
+import logging
+import argparse
+import tempfile
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+BANDS = ('easy', 'medium', 'hard')
+DEFAULT_BAND = 'medium'
+
+# Characters with their own histogram bin (after lowercasing); the rest share OTHER
+ALPHABET = " abcdefghijklmnopqrstuvwxyz0123456789.,;:'\"!?-()"
+OTHER = len(ALPHABET)
+NUM_CHARS = len(ALPHABET) + 1
+
+# Rejection attempts for filtered sampling before scanning the band
+MAX_FILTER_ATTEMPTS = 32
+# Items examined at a time when a filter rejects most of a band
+SCAN_CHUNK = 65536
+
+_WORD = re.compile(r"[a-z]+(?:'[a-z]+)?")
+
+
+class _CharCodes(dict):
+    """str.translate table mapping characters to histogram bins."""
+
+    def __missing__(self, codepoint: int) -> int:
+        return OTHER
+
+
+_CHAR_CODES = _CharCodes({ord(char): code for code, char in enumerate(ALPHABET)})
+
+
+def char_code(char: str) -> int:
+    """Return the histogram bin of a character."""
+    return _CHAR_CODES[ord(char.lower())]
+
+
+def bigram_code(bigram: str) -> int:
+    """Return the bigram histogram bin of a two-character string."""
+    return char_code(bigram[0]) * NUM_CHARS + char_code(bigram[1])
+
+
+def _encode_chars(text: str) -> np.ndarray:
+    """Map a text to an array of histogram bins."""
+    return np.frombuffer(text.lower().translate(_CHAR_CODES).encode('latin-1'), dtype=np.uint8)
+
+
+class _SectionWriter:
+    """Streams the items of one section to disk and computes their features."""
+
+    def __init__(self, directory: str, name: str):
+        self.directory = directory
+        self.name = name
+        self.offsets = array('q', [0])
+        self.lengths = array('i')
+        self.word_counts = array('i')
+        self.symbols = array('i')
+        self.weights = array('f')
+        self.labels = array('b')
+        self.bigram_indptr = array('q', [0])
+        self.bigram_totals = np.zeros(NUM_CHARS * NUM_CHARS, dtype=np.int64)
+        self._files = {part: open(self._path(part), 'wb')
+                       for part in ('data', 'char_hist', 'bigram_ids', 'bigram_counts')}
+
+    def _path(self, part: str) -> str:
+        return os.path.join(self.directory, f"{self.name}.{part}.bin")
+
+    def add(self, text: str, weight: float = 1.0, label: Optional[str] = None) -> None:
+        """Append an item."""
+        encoded = text.encode('utf-8')
+        self._files['data'].write(encoded)
+        self.offsets.append(self.offsets[-1] + len(encoded))
+
+        codes = _encode_chars(text)
+        chars = np.bincount(codes, minlength=NUM_CHARS)
+        self._files['char_hist'].write(np.minimum(chars, 65535).astype(np.uint16).tobytes())
+
+        bigrams = np.bincount(codes[:-1].astype(np.intp) * NUM_CHARS + codes[1:],
+                              minlength=NUM_CHARS * NUM_CHARS)
+        present = np.flatnonzero(bigrams)
+        self._files['bigram_ids'].write(present.astype(np.uint16).tobytes())
+        self._files['bigram_counts'].write(np.minimum(bigrams[present], 65535).astype(np.uint16).tobytes())
+        self.bigram_indptr.append(self.bigram_indptr[-1] + len(present))
+        self.bigram_totals += bigrams
+
+        letters_and_spaces = int(chars[:27].sum())
+        self.lengths.append(len(text))
+        self.word_counts.append(len(text.split()))
+        # Shifted characters and anything but letters and spaces are harder to type
+        self.symbols.append(len(text) - letters_and_spaces + sum(map(str.isupper, text)))
+        self.weights.append(max(float(weight), 0.0))
+        self.labels.append(BANDS.index(label) if label in BANDS else -1)
+
+    def finish(self) -> Dict[str, Any]:
+        """Compute difficulty, bands and alias tables and write the remaining arrays."""
+        for f in self._files.values():
+            f.close()
+        count = len(self.lengths)
+        arrays = {
+            'data': ('uint8', [self.offsets[-1]]),
+            'char_hist': ('uint16', [count, NUM_CHARS]),
+            'bigram_ids': ('uint16', [self.bigram_indptr[-1]]),
+            'bigram_counts': ('uint16', [self.bigram_indptr[-1]]),
+        }
+
+        lengths = np.frombuffer(self.lengths, dtype=np.int32)
+        word_counts = np.frombuffer(self.word_counts, dtype=np.int32)
+        weights = np.frombuffer(self.weights, dtype=np.float32)
+        indptr = np.frombuffer(self.bigram_indptr, dtype=np.int64)
+
+        # Mean surprisal of each item's bigrams under the corpus-wide distribution
+        surprisal = np.zeros(count)
+        if indptr[-1]:
+            ids = np.fromfile(self._path('bigram_ids'), dtype=np.uint16)
+            counts = np.fromfile(self._path('bigram_counts'), dtype=np.uint16).astype(np.float64)
+            information = -np.log2(self.bigram_totals / self.bigram_totals.sum(), where=self.bigram_totals > 0,
+                                   out=np.zeros(len(self.bigram_totals)))
+            nonempty = indptr[1:] > indptr[:-1]
+            sums = np.add.reduceat(information[ids] * counts, indptr[:-1][nonempty])
+            totals = np.add.reduceat(counts, indptr[:-1][nonempty])
+            surprisal[nonempty] = sums / totals
+
+        components = [lengths / np.maximum(word_counts, 1),
+                      np.frombuffer(self.symbols, dtype=np.int32) / np.maximum(lengths, 1),
+                      surprisal,
+                      np.log1p(lengths)]
+        score = sum((c - c.mean()) / (c.std() or 1.0) for c in components) if count else np.zeros(0)
+        difficulty = np.empty(count, dtype=np.float32)
+        difficulty[np.argsort(score, kind='stable')] = np.arange(count) / max(count - 1, 1)
+
+        bands = np.frombuffer(self.labels, dtype=np.int8).astype(np.uint8)
+        unlabeled = bands == 255
+        bands[unlabeled] = np.minimum((difficulty[unlabeled] * len(BANDS)).astype(np.uint8), len(BANDS) - 1)
+
+        members, band_offsets, alias_prob, alias_idx = _alias_tables(bands, weights)
+        columns = {
+            'offsets': np.frombuffer(self.offsets, dtype=np.int64),
+            'lengths': lengths,
+            'word_counts': word_counts,
+            'weights': weights,
+            'difficulty': difficulty,
+            'bands': bands,
+            'bigram_indptr': indptr,
+            'band_members': members,
+            'band_offsets': band_offsets,
+            'alias_prob': alias_prob,
+            'alias_idx': alias_idx,
+        }
+        for part, values in columns.items():
+            values.tofile(self._path(part))
+            arrays[part] = (values.dtype.name, list(values.shape))
+        return {'count': count, 'arrays': arrays}
+
+
+def _alias_tables(bands: np.ndarray, weights: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """
+    Group items by band and build a Vose alias table for each band.
+
+    Returns:
+        Tuple of the item ids ordered by band, the band offsets into them,
+        and the alias probabilities and alias positions (relative to the
+        band's start) for each position
+    """
+    members = np.argsort(bands, kind='stable').astype(np.int32)
+    band_offsets = np.searchsorted(bands[members], np.arange(len(BANDS) + 1)).astype(np.int64)
+    alias_prob = np.ones(len(members), dtype=np.float64)
+    alias_idx = np.zeros(len(members), dtype=np.int32)
+
+    for band in range(len(BANDS)):
+        start, end = band_offsets[band], band_offsets[band + 1]
+        size = end - start
+        band_weights = weights[members[start:end]].astype(np.float64)
+        total = band_weights.sum()
+        if size == 0 or total <= 0:
+            alias_idx[start:end] = np.arange(size)
+            continue
+
+        scaled = band_weights * size / total
+        prob = np.ones(size)
+        alias = np.arange(size, dtype=np.int32)
+        small = [i for i in range(size) if scaled[i] < 1.0]
+        large = [i for i in range(size) if scaled[i] >= 1.0]
+        while small and large:
+            less, more = small.pop(), large[-1]
+            prob[less] = scaled[less]
+            alias[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            if scaled[more] < 1.0:
+                small.append(large.pop())
+        alias_prob[start:end] = prob
+        alias_idx[start:end] = alias
+    return members, band_offsets, alias_prob, alias_idx
+
+
+def build_index(directory: str, texts: Iterable[Dict[str, Any]],
+                words: Optional[Iterable[Dict[str, Any]]] = None,
+                source: str = '') -> Dict[str, Any]:
+    """
+    Build a corpus index into a directory.
+
+    Items are streamed to disk, so only a few numbers per item are kept
+    in memory while building.
+
+    Args:
+        directory: Directory to write (created if needed)
+        texts: Dicts with ``text`` and optionally ``weight`` and ``difficulty``
+        words: Dicts like ``texts`` for the game words; if not given, the
+            distinct words of the texts are used
+        source: Identifier of the source data, stored in the metadata
+
+    Returns:
+        The corpus metadata
+    """
+    os.makedirs(directory, exist_ok=True)
+    text_writer = _SectionWriter(directory, 'texts')
+    vocabulary = set() if words is None else None
+    for item in texts:
+        text_writer.add(item['text'], item.get('weight', 1.0), item.get('difficulty'))
+        if vocabulary is not None:
+            vocabulary.update(_WORD.findall(item['text'].lower()))
+
+    word_writer = _SectionWriter(directory, 'words')
+    if words is None:
+        words = ({'text': word} for word in sorted(vocabulary))
+    for item in words:
+        word_writer.add(item['text'], item.get('weight', 1.0), item.get('difficulty'))
+
+    meta = {
+        'version': FORMAT_VERSION,
+        'source': source,
+        'alphabet': ALPHABET,
+        'bands': list(BANDS),
+        'sections': {'texts': text_writer.finish(), 'words': word_writer.finish()}
+    }
+    with open(os.path.join(directory, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    logger.info(f"Built corpus in {directory}: {meta['sections']['texts']['count']} texts, "
+                f"{meta['sections']['words']['count']} words")
+    return meta
+
+
+class CorpusSection:
+    """Read-only, memory-mapped view of one section of a corpus."""
+
+    def __init__(self, directory: str, name: str, meta: Dict[str, Any]):
+        """
+        Map a section's arrays.
+
+        Args:
+            directory: Corpus directory
+            name: Section name (``texts`` or ``words``)
+            meta: The section's metadata
+        """
+        self.name = name
+        self.count = meta['count']
+        for part, (dtype, shape) in meta['arrays'].items():
+            path = os.path.join(directory, f"{name}.{part}.bin")
+            if math.prod(shape) == 0:
+                values = np.zeros(shape, dtype=dtype)  # empty files cannot be mapped
+            else:
+                # A plain ndarray view keeps the mapping but indexes much faster than np.memmap
+                values = np.memmap(path, dtype=dtype, mode='r', shape=tuple(shape)).view(np.ndarray)
+            setattr(self, part, values)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def get(self, item_id: int) -> str:
+        """Return the text of an item."""
+        return bytes(self.data[self.offsets[item_id]:self.offsets[item_id + 1]]).decode('utf-8')
+
+    def features(self, item_id: int) -> Dict[str, Any]:
+        """Return the precomputed features of an item."""
+        start, end = self.bigram_indptr[item_id], self.bigram_indptr[item_id + 1]
+        codes = ALPHABET + '\0'
+        return {
+            'length': int(self.lengths[item_id]),
+            'words': int(self.word_counts[item_id]),
+            'weight': float(self.weights[item_id]),
+            'difficulty': float(self.difficulty[item_id]),
+            'band': BANDS[self.bands[item_id]],
+            'chars': {codes[code]: int(n) for code, n in enumerate(self.char_hist[item_id]) if n},
+            'bigrams': {codes[code // NUM_CHARS] + codes[code % NUM_CHARS]: int(n)
+                        for code, n in zip(self.bigram_ids[start:end], self.bigram_counts[start:end])}
+        }
+
+    def band_size(self, band: str) -> int:
+        """Return the number of items in a difficulty band."""
+        index = BANDS.index(band)
+        return int(self.band_offsets[index + 1] - self.band_offsets[index])
+
+    def _resolve_band(self, band: str) -> int:
+        """Map a band name to a non-empty band, falling back to the default one."""
+        band = band.lower() if band and band.lower() in BANDS else DEFAULT_BAND
+        for candidate in (band, DEFAULT_BAND) + BANDS:
+            if self.band_size(candidate):
+                return BANDS.index(candidate)
+        raise LookupError(f"Corpus section {self.name!r} is empty")
+
+    def band_items(self, band: str) -> np.ndarray:
+        """
+        Return the ids of the items in a difficulty band.
+
+        Args:
+            band: Difficulty band (unknown or empty bands fall back like ``sample``)
+
+        Returns:
+            Read-only array of item ids
+        """
+        index = self._resolve_band(band)
+        return self.band_members[self.band_offsets[index]:self.band_offsets[index + 1]]
+
+    def _draw(self, band: int, rng: random.Random) -> int:
+        """Draw a weighted random item from a band in constant time."""
+        start = int(self.band_offsets[band])
+        position = start + int(rng.random() * (self.band_offsets[band + 1] - start))
+        if rng.random() >= self.alias_prob[position]:
+            position = start + int(self.alias_idx[position])
+        return int(self.band_members[position])
+
+    def _matches(self, ids: np.ndarray, min_length: Optional[int], max_length: Optional[int],
+                 chars: Sequence[int], bigrams: Sequence[int]) -> np.ndarray:
+        """Return which of the given items pass the feature filters."""
+        mask = np.ones(len(ids), dtype=bool)
+        lengths = self.lengths[ids]
+        if min_length is not None:
+            mask &= lengths >= min_length
+        if max_length is not None:
+            mask &= lengths <= max_length
+        if chars:
+            mask &= (self.char_hist[ids][:, list(chars)] > 0).all(axis=1)
+        for code in bigrams:
+            for k in np.flatnonzero(mask):
+                start, end = self.bigram_indptr[ids[k]], self.bigram_indptr[ids[k] + 1]
+                row = self.bigram_ids[start:end]
+                found = np.searchsorted(row, code)
+                mask[k] = found < len(row) and row[found] == code
+        return mask
+
+    def sample(self, band: str = DEFAULT_BAND, rng: Optional[random.Random] = None,
+               min_length: Optional[int] = None, max_length: Optional[int] = None,
+               chars: str = '', bigrams: Sequence[str] = ()) -> Optional[int]:
+        """
+        Draw a weighted random item from a difficulty band.
+
+        Without filters this takes constant time. With filters, a few
+        candidates are drawn and checked first; only if all are rejected
+        is the band scanned, in bounded chunks.
+
+        Args:
+            band: Difficulty band (unknown bands fall back to the default)
+            rng: Random number generator (default: the ``random`` module)
+            min_length: Minimum length in characters
+            max_length: Maximum length in characters
+            chars: Characters the item must contain
+            bigrams: Two-character sequences the item must contain
+
+        Returns:
+            The item id, or None if no item in the band passes the filters
+        """
+        rng = rng or random
+        band_index = self._resolve_band(band)
+        if min_length is None and max_length is None and not chars and not bigrams:
+            return self._draw(band_index, rng)
+
+        filters = (min_length, max_length, sorted({char_code(c) for c in chars}),
+                   sorted({bigram_code(b) for b in bigrams}))
+        candidates = np.array([self._draw(band_index, rng) for _ in range(MAX_FILTER_ATTEMPTS)])
+        passing = candidates[self._matches(candidates, *filters)]
+        if len(passing):
+            return int(passing[0])
+
+        # The filters reject most of the band; pick among all passing items by weight
+        start, end = int(self.band_offsets[band_index]), int(self.band_offsets[band_index + 1])
+        chosen, seen_weight = None, 0.0
+        for chunk_start in range(start, end, SCAN_CHUNK):
+            ids = np.asarray(self.band_members[chunk_start:min(chunk_start + SCAN_CHUNK, end)])
+            ids = ids[self._matches(ids, *filters)]
+            if not len(ids):
+                continue
+            cumulative = np.cumsum(self.weights[ids], dtype=np.float64)
+            if cumulative[-1] <= 0:
+                continue
+            # Reservoir-style: keep the chunk's pick with probability proportional to its weight
+            seen_weight += cumulative[-1]
+            if rng.random() * seen_weight < cumulative[-1]:
+                chosen = int(ids[np.searchsorted(cumulative, rng.random() * cumulative[-1], side='right')])
+        return chosen
+
+    def sample_distinct(self, count: int, band: str = DEFAULT_BAND,
+                        rng: Optional[random.Random] = None) -> List[int]:
+        """
+        Draw up to ``count`` distinct weighted random items from a band.
+
+        Args:
+            count: Number of items wanted
+            band: Difficulty band (unknown bands fall back to the default)
+            rng: Random number generator (default: the ``random`` module)
+
+        Returns:
+            Item ids; fewer than ``count`` only if the band is smaller
+        """
+        rng = rng or random
+        band_index = self._resolve_band(band)
+        start, end = int(self.band_offsets[band_index]), int(self.band_offsets[band_index + 1])
+        if end - start <= count:
+            ids = [int(i) for i in self.band_members[start:end]]
+            rng.shuffle(ids)
+            return ids
+
+        chosen = {}
+        for _ in range(8 * count):
+            chosen.setdefault(self._draw(band_index, rng), None)
+            if len(chosen) == count:
+                return list(chosen)
+        # Heavily skewed weights; top up from the rest of the band
+        rest = [int(i) for i in self.band_members[start:end] if int(i) not in chosen]
+        return list(chosen) + rng.sample(rest, count - len(chosen))
+
+
+class Corpus:
+    """A memory-mapped corpus with a ``texts`` and a ``words`` section."""
+
+    def __init__(self, directory: str):
+        """
+        Open a built corpus.
+
+        Args:
+            directory: Directory written by ``build_index``
+
+        Raises:
+            ValueError: If the index was written by an incompatible version
+        """
+        with open(os.path.join(directory, 'meta.json')) as f:
+            self.meta = json.load(f)
+        if self.meta.get('version') != FORMAT_VERSION or self.meta.get('alphabet') != ALPHABET:
+            raise ValueError(f"Corpus in {directory} has an incompatible format")
+        self.directory = directory
+        self.texts = CorpusSection(directory, 'texts', self.meta['sections']['texts'])
+        self.words = CorpusSection(directory, 'words', self.meta['sections']['words'])
+
+    def random_text(self, difficulty: str = DEFAULT_BAND, rng: Optional[random.Random] = None,
+                    **filters: Any) -> Optional[str]:
+        """
+        Get a weighted random text from a difficulty band.
+
+        Args:
+            difficulty: Difficulty band (easy, medium, hard)
+            rng: Random number generator (default: the ``random`` module)
+            **filters: Feature filters accepted by ``CorpusSection.sample``
+
+        Returns:
+            The text, or None if no text passes the filters
+        """
+        item_id = self.texts.sample(difficulty, rng, **filters)
+        return None if item_id is None else self.texts.get(item_id)
+
+    def random_words(self, count: int, difficulty: str = DEFAULT_BAND,
+                     rng: Optional[random.Random] = None) -> List[str]:
+        """
+        Get distinct weighted random words from a difficulty band.
+
+        Args:
+            count: Number of words
+            difficulty: Difficulty band (easy, medium, hard)
+            rng: Random number generator (default: the ``random`` module)
+
+        Returns:
+            List of words
+        """
+        return [self.words.get(i) for i in self.words.sample_distinct(count, difficulty, rng)]
+
+
+def read_source(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Stream the items of a corpus source file.
+
+    Args:
+        path: ``.jsonl`` file of item objects, or a text file with one item per line
+
+    Yields:
+        Item dicts with at least ``text``
+    """
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            yield json.loads(line) if path.endswith('.jsonl') else {'text': line}
+
+
+def _builtin_items() -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Return the texts and words bundled in ``text_data``, labeled with their band."""
+    import text_data
+    texts = [{'text': text, 'difficulty': band}
+             for band, items in zip(BANDS, (text_data.EASY_TEXTS, text_data.MEDIUM_TEXTS, text_data.HARD_TEXTS))
+             for text in items]
+    words = [{'text': word, 'difficulty': band}
+             for band, items in zip(BANDS, (text_data.EASY_WORDS, text_data.MEDIUM_WORDS, text_data.HARD_WORDS))
+             for word in items]
+    return texts, words
+
+
+def default_corpus(directory: str) -> Corpus:
+    """
+    Open the corpus in a directory, building it from ``text_data`` if needed.
+
+    A directory holding a corpus built from another source is opened as
+    is; one built from an older version of the bundled texts is rebuilt.
+    Concurrent workers build into private temporary directories and the
+    first to finish publishes its index.
+
+    Args:
+        directory: Corpus directory
+
+    Returns:
+        The opened Corpus
+    """
+    texts, words = _builtin_items()
+    fingerprint = 'builtin:' + hashlib.sha256(
+        json.dumps([texts, words, FORMAT_VERSION, ALPHABET]).encode('utf-8')).hexdigest()[:16]
+
+    try:
+        corpus = Corpus(directory)
+        if not corpus.meta.get('source', '').startswith('builtin:') or corpus.meta['source'] == fingerprint:
+            return corpus
+    except (OSError, ValueError, KeyError):
+        pass
+
+    parent = os.path.dirname(os.path.abspath(directory))
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix='.corpus-', dir=parent)
+    build_index(staging, texts, words, source=fingerprint)
+    try:
+        if os.path.isdir(directory):
+            shutil.rmtree(directory)  # mapped files stay readable for open corpora
+        os.rename(staging, directory)
+    except OSError:
+        # Another worker published its index first
+        shutil.rmtree(staging, ignore_errors=True)
+    return Corpus(directory)
+
+
+def main(argv=None) -> int:
+    """Build a corpus index from the command line."""
+    parser = argparse.ArgumentParser(description="Build a TypeMaster corpus index.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser('build', help="Build an index from a source file")
+    build.add_argument('source', help="Passages: .jsonl objects or one passage per line")
+    build.add_argument('directory', help="Directory to write the index to")
+    build.add_argument('--words', help="Game words: .jsonl objects or one word per line "
+                                       "(default: the distinct words of the passages)")
+    args = parser.parse_args(argv)
+
+    words = read_source(args.words) if args.words else None
+    meta = build_index(args.directory, read_source(args.source), words,
+                       source=os.path.abspath(args.source))
+    for name, section in meta['sections'].items():
+        print(f"{name}: {section['count']:,} items")
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
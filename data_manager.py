@@ -1,128 +1,101 @@
 import os
-import pickle
-import uuid
-import random
+import json
+import base64
 import logging
 from datetime import datetime
 from typing import List, Dict, Any, Optional
-from models import UserProfile, TypingTest
-from text_data import (
-    EASY_TEXTS, MEDIUM_TEXTS, HARD_TEXTS,
-    EASY_WORDS, MEDIUM_WORDS, HARD_WORDS,
-    LESSONS, CHATBOT_RESPONSES
-)
+import numpy as np
+from models import (read_session, UserProfile, PredictorState, RECENT_WORD_ERRORS, get_test_history,
+                    iter_test_history, get_test_history_page)
+from downsampling import lttb
+from ml_models import WPMRunningStats
+from persistence import get_or_create_profile
+from user_cache import UserStateCache
+from corpus import Corpus, default_corpus
+from chatbot_engine import ChatbotEngine
+from text_data import LESSONS, CHATBOT_RESPONSES
 
 logger = logging.getLogger(__name__)
 
+def _encode_cursor(timestamp: datetime, test_id: str) -> str:
+    """Encode the position after a test as an opaque page cursor."""
+    return base64.urlsafe_b64encode(f"{timestamp.isoformat()}|{test_id}".encode('utf-8')).decode('ascii')
+
+
+def _decode_cursor(cursor: str) -> tuple:
+    """Decode a page cursor to (timestamp, test id), raising ValueError if it is malformed."""
+    try:
+        timestamp, test_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|', 1)
+        return datetime.fromisoformat(timestamp), test_id
+    except (ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
 class DataManager:
     """
     Class for managing application data, including user profiles, texts, and lessons.
     """
     
-    def __init__(self, data_dir: str = "data"):
+    # Cached per-user state fields, dropped together when the user writes
+    USER_STATE_FIELDS = ('history', 'progress', 'error_statistics', 'wpm_stats')
+    
+    # Points per chart series when the client does not ask for a number
+    PROGRESS_POINTS = 500
+    
+    def __init__(self, data_dir: str = "data", cache: Optional[UserStateCache] = None,
+                 corpus: Optional[Corpus] = None, chatbot: Optional[ChatbotEngine] = None):
         """
         Initialize the DataManager.
         
         Args:
             data_dir: Directory to store data files
+            cache: Bounded cache for per-user state (defaults to an in-process LRU)
+            corpus: Texts and words to practice with (defaults to the bundled
+                texts, indexed under ``data_dir``)
+            chatbot: Chatbot knowledge base (defaults to the bundled responses)
         """
         self.data_dir = data_dir
-        self.users = {}  # In-memory cache of user profiles
+        self.cache = cache if cache is not None else UserStateCache()
         
         # Ensure data directory exists
         os.makedirs(self.data_dir, exist_ok=True)
-    
-    def _get_user_file_path(self, user_id: str) -> str:
-        """
-        Get the file path for a user's data file.
-        
-        Args:
-            user_id: Unique user identifier
-            
-        Returns:
-            File path for the user's data
-        """
-        return os.path.join(self.data_dir, f"user_{user_id}.pkl")
-    
-    def _save_user(self, user_id: str) -> None:
-        """
-        Save a user's profile to disk.
-        
-        Args:
-            user_id: Unique user identifier
-        """
-        if user_id in self.users:
-            file_path = self._get_user_file_path(user_id)
-            with open(file_path, 'wb') as f:
-                pickle.dump(self.users[user_id], f)
-    
-    def _load_user(self, user_id: str) -> Optional[UserProfile]:
-        """
-        Load a user's profile from disk.
         
-        Args:
-            user_id: Unique user identifier
-            
-        Returns:
-            UserProfile if found, None otherwise
-        """
-        file_path = self._get_user_file_path(user_id)
-        if os.path.exists(file_path):
-            try:
-                with open(file_path, 'rb') as f:
-                    return pickle.load(f)
-            except Exception as e:
-                logger.error(f"Error loading user profile: {e}")
-                return None
-        return None
+        self.corpus = corpus if corpus is not None else default_corpus(os.path.join(self.data_dir, "corpus"))
+        self.chatbot = chatbot if chatbot is not None else ChatbotEngine.from_responses(CHATBOT_RESPONSES)
     
-    def get_user(self, user_id: str) -> UserProfile:
+    def initialize_user(self, user_id: str) -> None:
         """
-        Get a user's profile, loading it from disk if necessary.
+        Initialize a new user profile.
         
         Args:
             user_id: Unique user identifier
-            
-        Returns:
-            UserProfile for the user
         """
-        if user_id not in self.users:
-            profile = self._load_user(user_id)
-            if profile:
-                self.users[user_id] = profile
-            else:
-                self.users[user_id] = UserProfile(user_id=user_id)
-        
-        return self.users[user_id]
+        # A new user has no state yet; make sure nothing stale is cached
+        self.invalidate_user(user_id)
+        logger.debug(f"Initialized new user profile: {user_id}")
     
-    def initialize_user(self, user_id: str) -> None:
+    def invalidate_user(self, user_id: str) -> None:
         """
-        Initialize a new user profile.
+        Drop a user's cached state after their data has changed.
         
         Args:
             user_id: Unique user identifier
         """
-        if user_id not in self.users:
-            self.users[user_id] = UserProfile(user_id=user_id)
-            self._save_user(user_id)
-            logger.debug(f"Initialized new user profile: {user_id}")
+        self.cache.invalidate(user_id, *self.USER_STATE_FIELDS)
     
-    def get_random_text(self, difficulty: str = "medium") -> str:
+    def get_random_text(self, difficulty: str = "medium", **filters: Any) -> Optional[str]:
         """
         Get a random typing test text based on difficulty.
         
         Args:
             difficulty: Difficulty level (easy, medium, hard)
+            **filters: Feature filters such as min_length, max_length and
+                chars (see ``CorpusSection.sample``)
             
         Returns:
-            Random text for typing test
+            Random text for typing test, or None if no text passes the filters
         """
-        if difficulty.lower() == "easy":
-            return random.choice(EASY_TEXTS)
-        elif difficulty.lower() == "hard":
-            return random.choice(HARD_TEXTS)
-        else:  # Default to medium
-            return random.choice(MEDIUM_TEXTS)
+        return self.corpus.random_text(difficulty, **filters)
     
     def get_random_words(self, count: int = 10, difficulty: str = "medium") -> List[str]:
         """
@@ -135,14 +108,7 @@ class DataManager:
         Returns:
             List of random words
         """
-        if difficulty.lower() == "easy":
-            word_list = EASY_WORDS
-        elif difficulty.lower() == "hard":
-            word_list = HARD_WORDS
-        else:  # Default to medium
-            word_list = MEDIUM_WORDS
-        
-        return random.sample(word_list, min(count, len(word_list)))
+        return self.corpus.random_words(count, difficulty)
     
     def get_lesson(self, lesson_id: str) -> Dict[str, Any]:
         """
@@ -165,62 +131,6 @@ class DataManager:
                 "difficulty": "N/A"
             }
     
-    def save_test_result(self, user_id: str, test_data: Dict[str, Any]) -> None:
-        """
-        Save a typing test result for a user.
-        
-        Args:
-            user_id: Unique user identifier
-            test_data: Dictionary with test results
-        """
-        user = self.get_user(user_id)
-        
-        # Create a TypingTest object
-        test_id = str(uuid.uuid4())
-        test = TypingTest(
-            id=test_id,
-            user_id=user_id,
-            original_text=test_data.get('original_text', ''),
-            typed_text=test_data.get('typed_text', ''),
-            wpm=test_data.get('wpm', 0),
-            accuracy=test_data.get('accuracy', 0),
-            time_taken=test_data.get('time_taken', 0),
-            difficulty=test_data.get('difficulty', 'medium'),
-            error_details=test_data.get('error_analysis', {}),
-            keystroke_data=test_data.get('keystroke_data', [])
-        )
-        
-        # Add test to user profile
-        user.add_test(test)
-        
-        # Update error statistics
-        if 'error_analysis' in test_data:
-            user.update_error_statistics(test_data['error_analysis'])
-        
-        # Save user profile
-        self._save_user(user_id)
-        logger.debug(f"Saved test result for user {user_id}: WPM={test.wpm}, Accuracy={test.accuracy}")
-    
-    def save_game_result(self, user_id: str, game_data: Dict[str, Any]) -> None:
-        """
-        Save a typing game result for a user.
-        
-        Args:
-            user_id: Unique user identifier
-            game_data: Dictionary with game results
-        """
-        user = self.get_user(user_id)
-        
-        # Add timestamp to game data
-        game_data['timestamp'] = datetime.now().isoformat()
-        
-        # Add game result to user profile
-        user.add_game_result(game_data)
-        
-        # Save user profile
-        self._save_user(user_id)
-        logger.debug(f"Saved game result for user {user_id}: Score={game_data.get('score', 0)}")
-    
     def update_lesson_progress(self, user_id: str, lesson_id: str, 
                               completed: bool, score: Optional[float] = None) -> None:
         """
@@ -232,13 +142,10 @@ class DataManager:
             completed: Whether the lesson was completed
             score: Optional score for the lesson
         """
-        user = self.get_user(user_id)
+        user = get_or_create_profile(user_id)
         
         # Update lesson progress
         user.update_lesson_progress(lesson_id, completed, score)
-        
-        # Save user profile
-        self._save_user(user_id)
         logger.debug(f"Updated lesson progress for user {user_id}, lesson {lesson_id}")
     
     def get_historical_wpm(self, user_id: str) -> List[Dict[str, Any]]:
@@ -251,8 +158,7 @@ class DataManager:
         Returns:
             List of historical WPM data points
         """
-        user = self.get_user(user_id)
-        return user.get_historical_wpm()
+        return self.get_history(user_id)['wpm_history']
     
     def get_historical_accuracy(self, user_id: str) -> List[Dict[str, Any]]:
         """
@@ -264,8 +170,110 @@ class DataManager:
         Returns:
             List of historical accuracy data points
         """
-        user = self.get_user(user_id)
-        return user.get_historical_accuracy()
+        return self.get_history(user_id)['accuracy_history']
+    
+    def get_history(self, user_id: str) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Get historical WPM and accuracy data for a user from one query.
+        
+        Args:
+            user_id: Unique user identifier
+            
+        Returns:
+            Dict with 'wpm_history' and 'accuracy_history' lists
+        """
+        return self.cache.get_or_load(user_id, 'history',
+                                      lambda: get_test_history(user_id))
+    
+    def get_progress(self, user_id: str, points: int = PROGRESS_POINTS,
+                     start: Optional[datetime] = None, end: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        Get a user's WPM and accuracy history downsampled for charting.
+        
+        Each series is reduced to at most ``points`` points with LTTB, so
+        the payload stays small however many tests the user has taken. The
+        default view (whole history, default point count) is cached.
+        
+        Args:
+            user_id: Unique user identifier
+            points: Maximum number of points per series
+            start: Only tests taken at or after this time
+            end: Only tests taken before this time
+            
+        Returns:
+            Dict with 'wpm_history' and 'accuracy_history' lists and the
+            number of tests in the range as 'total_points'
+        """
+        if start is None and end is None and points == self.PROGRESS_POINTS:
+            return self.cache.get_or_load(user_id, 'progress',
+                                          lambda: self._load_progress(user_id, points, None, None))
+        return self._load_progress(user_id, points, start, end)
+    
+    def _load_progress(self, user_id: str, points: int, start: Optional[datetime],
+                       end: Optional[datetime]) -> Dict[str, Any]:
+        """Load and downsample a user's history in a time range."""
+        rows = list(iter_test_history(user_id, start=start, end=end))
+        times = np.array([row[0] for row in rows], dtype='datetime64[us]').astype(np.float64)
+        
+        series = {}
+        for name, column in (('wpm', 1), ('accuracy', 2)):
+            values = np.nan_to_num(np.array([row[column] for row in rows], dtype=np.float64))
+            series[f'{name}_history'] = [
+                {'timestamp': rows[i][0].isoformat(), name: rows[i][column]}
+                for i in lttb(times, values, points).tolist()
+            ]
+        series['total_points'] = len(rows)
+        return series
+    
+    def get_progress_page(self, user_id: str, limit: int, cursor: Optional[str] = None,
+                          start: Optional[datetime] = None, end: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        Get one page of a user's raw test results.
+        
+        Args:
+            user_id: Unique user identifier
+            limit: Maximum number of points
+            cursor: ``next_cursor`` of the previous page
+            start: Only tests taken at or after this time
+            end: Only tests taken before this time
+            
+        Returns:
+            Dict with the 'points' and the 'next_cursor' (None on the last page)
+            
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        rows = get_test_history_page(user_id, limit, _decode_cursor(cursor) if cursor else None, start, end)
+        next_cursor = None
+        if len(rows) == limit:
+            test_id, timestamp, _, _ = rows[-1]
+            next_cursor = _encode_cursor(timestamp, test_id)
+        return {
+            'points': [{'test_id': test_id, 'timestamp': timestamp.isoformat(), 'wpm': wpm, 'accuracy': accuracy}
+                       for test_id, timestamp, wpm, accuracy in rows],
+            'next_cursor': next_cursor
+        }
+    
+    def get_wpm_stats(self, user_id: str) -> WPMRunningStats:
+        """
+        Get a user's running WPM statistics for constant-time prediction.
+        
+        Args:
+            user_id: Unique user identifier
+            
+        Returns:
+            WPMRunningStats for the user
+        """
+        data = self.cache.get_or_load(user_id, 'wpm_stats',
+                                      lambda: self._load_wpm_stats(user_id))
+        return WPMRunningStats.from_dict(data)
+    
+    def _load_wpm_stats(self, user_id: str) -> Dict[str, Any]:
+        """Load a user's stored WPM statistics, seeding them from history if missing."""
+        state = read_session().get(PredictorState, user_id)
+        if state is not None:
+            return dict(state.stats)
+        return WPMRunningStats.from_history(self.get_historical_wpm(user_id)).to_dict()
     
     def get_user_error_statistics(self, user_id: str) -> Dict[str, Any]:
         """
@@ -277,8 +285,21 @@ class DataManager:
         Returns:
             Dictionary with error statistics
         """
-        user = self.get_user(user_id)
-        return user.error_statistics
+        return self.cache.get_or_load(user_id, 'error_statistics',
+                                      lambda: self._load_error_statistics(user_id))
+    
+    def _load_error_statistics(self, user_id: str) -> Dict[str, Any]:
+        """Load a plain copy of a user's error statistics from the database."""
+        profile = read_session().get(UserProfile, user_id)
+        if not profile or not profile.error_statistics:
+            return {}
+        stats = json.loads(json.dumps(profile.error_statistics))
+        
+        # Profiles not yet normalized still carry every character error;
+        # the per-pair counts now live in the ErrorEvent table
+        stats.pop('character_errors', None)
+        stats['word_errors'] = stats.get('word_errors', [])[-RECENT_WORD_ERRORS:]
+        return stats
     
     def get_chatbot_response(self, query: str) -> str:
         """
@@ -290,12 +311,6 @@ class DataManager:
         Returns:
             Chatbot response text
         """
-        query = query.lower()
-        
-        # Check for exact matches first
-        for pattern, response in CHATBOT_RESPONSES.items():
-            if pattern.lower() in query:
-                return response
-        
-        # Default response if no match
-        return "I'm not sure how to help with that. Try asking about typing speed, accuracy, or how to improve your typing skills."
+        # Exact phrases first, then the best ranked entry; repeated queries are cached
+        response, _ = self.chatbot.answer(query)
+        return response
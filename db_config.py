@@ -0,0 +1,179 @@
+"""
+Database engine profiles.
+
+The database is chosen with ``DATABASE_URL`` (SQLite by default). Each
+backend gets the settings that matter for its concurrency model:
+
+- SQLite runs in WAL mode, so readers no longer wait for writers, with
+  ``synchronous=NORMAL``, a larger page cache and memory-mapped reads.
+  The pragmas are applied to every new connection.
+- PostgreSQL (through ``psycopg2``) uses a sized connection pool with
+  pre-ping and recycling, so workers reuse connections instead of
+  opening one per request.
+
+Every setting can be overridden from the environment; see
+``database_config``. ``create_read_engine`` builds the engine read-only
+requests are routed to (see ``models.ReadPool``).
+"""
+import os
+import logging
+from typing import Any, Dict, Mapping, Optional
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DATABASE_URL = "sqlite:///typemaster.db"
+
+# Applied in this order to every SQLite connection
+DEFAULT_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    # Durable across application crashes; only an OS crash can lose the last commits
+    'synchronous': 'NORMAL',
+    'cache_size': -64000,  # negative: KiB, so about 64 MB of page cache
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+
+def database_url(environ: Mapping[str, str] = os.environ) -> str:
+    """
+    Return the configured database URL.
+
+    Args:
+        environ: Environment to read ``DATABASE_URL`` from
+
+    Returns:
+        The URL, with the ``postgres://`` scheme some hosts hand out
+        rewritten to the ``postgresql://`` SQLAlchemy expects
+    """
+    url = environ.get("DATABASE_URL") or DEFAULT_DATABASE_URL
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+    return url
+
+
+def sqlite_pragmas(environ: Mapping[str, str] = os.environ) -> Dict[str, Any]:
+    """
+    Return the SQLite pragmas to apply, with environment overrides.
+
+    ``SQLITE_JOURNAL_MODE``, ``SQLITE_SYNCHRONOUS``, ``SQLITE_CACHE_SIZE``
+    and ``SQLITE_MMAP_SIZE`` override the defaults.
+    """
+    pragmas = dict(DEFAULT_SQLITE_PRAGMAS)
+    for name in ('journal_mode', 'synchronous'):
+        if environ.get(f"SQLITE_{name.upper()}"):
+            pragmas[name] = environ[f"SQLITE_{name.upper()}"]
+    for name in ('cache_size', 'mmap_size'):
+        if environ.get(f"SQLITE_{name.upper()}"):
+            pragmas[name] = int(environ[f"SQLITE_{name.upper()}"])
+    return pragmas
+
+
+def engine_options(url: str, environ: Mapping[str, str] = os.environ) -> Dict[str, Any]:
+    """
+    Return the SQLAlchemy engine options for a database URL.
+
+    PostgreSQL pools are sized with ``DB_POOL_SIZE`` (default 10),
+    ``DB_MAX_OVERFLOW`` (default 20), ``DB_POOL_TIMEOUT`` (seconds,
+    default 30) and ``DB_POOL_RECYCLE`` (seconds, default 1800).
+
+    Args:
+        url: Database URL
+        environ: Environment to read overrides from
+
+    Returns:
+        Options for ``create_engine`` / ``SQLALCHEMY_ENGINE_OPTIONS``
+    """
+    backend = make_url(url).get_backend_name()
+    if backend == 'sqlite':
+        # Writers wait this long for the write lock instead of failing at once
+        return {"connect_args": {"timeout": int(environ.get("SQLITE_BUSY_TIMEOUT", 30))}}
+    if backend == 'postgresql':
+        return {
+            "pool_size": int(environ.get("DB_POOL_SIZE", 10)),
+            "max_overflow": int(environ.get("DB_MAX_OVERFLOW", 20)),
+            "pool_timeout": int(environ.get("DB_POOL_TIMEOUT", 30)),
+            "pool_recycle": int(environ.get("DB_POOL_RECYCLE", 1800)),
+            "pool_pre_ping": True,
+        }
+    return {"pool_pre_ping": True}
+
+
+def database_config(environ: Mapping[str, str] = os.environ) -> Dict[str, Any]:
+    """
+    Return the Flask-SQLAlchemy settings for the configured database.
+
+    Args:
+        environ: Environment to read the settings from
+
+    Returns:
+        Dict of ``SQLALCHEMY_*`` settings plus ``SQLITE_PRAGMAS``
+    """
+    url = database_url(environ)
+    return {
+        "SQLALCHEMY_DATABASE_URI": url,
+        "SQLALCHEMY_ENGINE_OPTIONS": engine_options(url, environ),
+        "SQLITE_PRAGMAS": sqlite_pragmas(environ),
+    }
+
+
+def install_sqlite_pragmas(engine: Engine, pragmas: Optional[Mapping[str, Any]] = None) -> None:
+    """
+    Apply pragmas to every new connection of a SQLite engine.
+
+    Engines of other databases are left untouched.
+
+    Args:
+        engine: Engine to configure
+        pragmas: Pragmas to apply (default: ``DEFAULT_SQLITE_PRAGMAS``)
+    """
+    if engine.dialect.name != 'sqlite':
+        return
+    pragmas = dict(DEFAULT_SQLITE_PRAGMAS if pragmas is None else pragmas)
+    if engine.url.database in (None, '', ':memory:'):
+        # An in-memory database has no journal file to put in WAL mode
+        pragmas.pop('journal_mode', None)
+
+    @event.listens_for(engine, 'connect')
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+    logger.debug(f"SQLite pragmas for {engine.url}: {pragmas}")
+
+
+def create_read_engine(primary: Engine, url: Optional[str] = None,
+                       pragmas: Optional[Mapping[str, Any]] = None,
+                       environ: Mapping[str, str] = os.environ) -> Optional[Engine]:
+    """
+    Create the engine for read-only queries.
+
+    With ``url`` (``READ_DATABASE_URL``, e.g. a PostgreSQL replica) the
+    engine connects there. Otherwise a SQLite file database gets a second
+    pool of ``query_only`` connections to the same file, which WAL lets
+    read alongside the writer. Other setups have no read engine.
+
+    Args:
+        primary: The read-write engine
+        url: Read replica URL
+        pragmas: SQLite pragmas of the primary
+        environ: Environment to read pool overrides from
+
+    Returns:
+        The read engine, or None if reads should stay on the primary
+    """
+    if url:
+        url = database_url({"DATABASE_URL": url})
+        engine = create_engine(url, **engine_options(url, environ))
+    elif primary.dialect.name == 'sqlite' and primary.url.database not in (None, '', ':memory:'):
+        engine = create_engine(primary.url, **engine_options(str(primary.url), environ))
+    else:
+        return None
+    install_sqlite_pragmas(engine, dict(DEFAULT_SQLITE_PRAGMAS if pragmas is None else pragmas, query_only='ON'))
+    logger.info(f"Routing read-only queries to {engine.url!r}")
+    return engine
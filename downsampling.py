@@ -0,0 +1,57 @@
+"""
+Downsampling of long time series for charts.
+
+``lttb`` implements Largest-Triangle-Three-Buckets: the first and last
+points are kept and every bucket in between contributes the point that
+forms the largest triangle with the point chosen for the previous bucket
+and the mean of the next bucket. Spikes and trend changes survive, so a
+chart of a few hundred points looks like the chart of every point.
+"""
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Choose the points of a series to keep.
+
+    Args:
+        x: Increasing x values (e.g. timestamps in seconds)
+        y: y values, one per x value
+        threshold: Number of points to keep
+
+    Returns:
+        Sorted indices of the points to keep; all of them when the series
+        has no more than ``threshold`` points
+    """
+    count = len(x)
+    if threshold >= count or count <= 2:
+        return np.arange(count)
+    if threshold < 3:
+        return np.array([0, count - 1])[:max(threshold, 0)]
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # Bucket boundaries for the points between the first and the last
+    edges = np.linspace(1, count - 1, threshold - 1).astype(np.int64)
+    # Mean of each bucket, the third corner of the triangles of the bucket before it
+    sums_x = np.add.reduceat(x[1:count - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:count - 1], edges[:-1] - 1)
+    sizes = np.diff(edges)
+    means_x = np.append(sums_x / sizes, x[-1])
+    means_y = np.append(sums_y / sizes, y[-1])
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, count - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        ax, ay = x[previous], y[previous]
+        # Twice the triangle areas; the constant factor does not change the argmax
+        areas = np.abs((ax - means_x[bucket + 1]) * (y[start:end] - ay)
+                       - (ax - x[start:end]) * (means_y[bucket + 1] - ay))
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
@@ -0,0 +1,233 @@
+"""
+Drill texts targeting a user's weak keys.
+
+A DrillIndex maps every character and bigram to the words containing
+it, grouped by difficulty band, so building a drill only draws from the
+posting lists of the targeted keys and never scans the vocabulary. The
+index is built once from the precomputed histograms of one or more
+corpus word sections.
+
+A user's targets are weighted from their most common character errors,
+the bigrams where their recent word errors started and the keys their
+keystroke baseline shows as slow.
+"""
+import bisect
+import random
+import logging
+from typing import Any, Dict, Mapping, Optional, Sequence
+import numpy as np
+from corpus import ALPHABET, BANDS, DEFAULT_BAND, NUM_CHARS, OTHER, CorpusSection, char_code, bigram_code
+
+logger = logging.getLogger(__name__)
+
+# Share of the drill weight given to each source of weak keys
+ERROR_SHARE = 0.4
+BIGRAM_SHARE = 0.3
+SLOW_KEY_SHARE = 0.3
+# Keys this much slower than the user's average interval count as slow
+SLOW_KEY_RATIO = 1.2
+MAX_TARGETS = 8
+
+_NUM_KEYS = NUM_CHARS + NUM_CHARS * NUM_CHARS  # characters, then bigrams
+_SPACE = ALPHABET.index(' ')
+
+
+def _target_key(target: str) -> Optional[int]:
+    """Map a character or bigram to its posting list key."""
+    if len(target) == 1:
+        code = char_code(target)
+        return None if code in (_SPACE, OTHER) else code
+    if len(target) == 2:
+        first, second = char_code(target[0]), char_code(target[1])
+        if _SPACE in (first, second) or OTHER in (first, second):
+            return None
+        return NUM_CHARS + bigram_code(target)
+    return None
+
+
+def _normalized(weights: Dict[str, float]) -> Dict[str, float]:
+    total = sum(weights.values())
+    return {target: weight / total for target, weight in weights.items()} if total > 0 else {}
+
+
+def weak_targets(error_statistics: Mapping[str, Any], key_intervals: Mapping[str, float],
+                 limit: int = MAX_TARGETS) -> Dict[str, float]:
+    """
+    Weight the characters and bigrams a user should practise.
+
+    Args:
+        error_statistics: The user's error statistics (most_common_errors, word_errors)
+        key_intervals: Average interval per key from the user's keystroke baseline
+        limit: Maximum number of targets
+
+    Returns:
+        Dict mapping lowercase characters and bigrams to weights summing to 1
+    """
+    errors = {}
+    for error, count in (error_statistics.get('most_common_errors') or {}).items():
+        expected = error.split('->')[0].lower()
+        if _target_key(expected) is not None:
+            errors[expected] = errors.get(expected, 0) + count
+
+    # The bigram ending where each recent word error starts
+    bigrams = {}
+    for word_error in error_statistics.get('word_errors') or []:
+        original, typed = word_error.get('original', '').lower(), word_error.get('typed', '').lower()
+        position = next((i for i, (a, b) in enumerate(zip(original, typed)) if a != b),
+                        min(len(original), len(typed)))
+        bigram = original[position - 1:position + 1] if position else ''
+        if _target_key(bigram) is not None:
+            bigrams[bigram] = bigrams.get(bigram, 0) + 1
+
+    slow = {}
+    char_intervals = {key.lower(): interval for key, interval in key_intervals.items()
+                      if len(key) == 1 and _target_key(key) is not None}
+    if char_intervals:
+        average = sum(char_intervals.values()) / len(char_intervals)
+        slow = {key: interval / average - 1 for key, interval in char_intervals.items()
+                if average > 0 and interval > average * SLOW_KEY_RATIO}
+
+    targets = {}
+    for weights, share in ((errors, ERROR_SHARE), (bigrams, BIGRAM_SHARE), (slow, SLOW_KEY_SHARE)):
+        for target, weight in _normalized(weights).items():
+            targets[target] = targets.get(target, 0) + weight * share
+    strongest = sorted(targets.items(), key=lambda item: (-item[1], item[0]))[:limit]
+    return _normalized(dict(strongest))
+
+
+class DrillIndex:
+    """Inverted index from characters and bigrams to words, by difficulty band."""
+
+    def __init__(self, sections: Sequence[CorpusSection]):
+        """
+        Build the index.
+
+        Args:
+            sections: Corpus word sections to draw drill words from
+        """
+        self._sections = list(sections)
+        self._starts = []  # first global word id of each section
+        keys, word_ids = [], []
+        start = 0
+        for section in self._sections:
+            self._starts.append(start)
+            ids = np.arange(section.count, dtype=np.int64)
+
+            # Character postings from the histograms (spaces and OTHER are never targets)
+            rows, codes = np.nonzero(section.char_hist[:, :OTHER])
+            keep = codes != _SPACE
+            keys.append(codes[keep])
+            word_ids.append(rows[keep] + start)
+
+            # Bigram postings from the sparse histograms
+            indptr = np.asarray(section.bigram_indptr)
+            rows = np.repeat(ids, np.diff(indptr))
+            codes = np.asarray(section.bigram_ids).astype(np.int64)
+            first, second = codes // NUM_CHARS, codes % NUM_CHARS
+            keep = (first != _SPACE) & (second != _SPACE) & (first != OTHER) & (second != OTHER)
+            keys.append(codes[keep] + NUM_CHARS)
+            word_ids.append(rows[keep] + start)
+
+            start += section.count
+        self._starts.append(start)
+
+        keys = np.concatenate(keys) if keys else np.zeros(0, dtype=np.int64)
+        word_ids = np.concatenate(word_ids) if word_ids else np.zeros(0, dtype=np.int64)
+        word_bands = np.concatenate([np.asarray(s.bands) for s in self._sections]) if self._sections \
+            else np.zeros(0, dtype=np.uint8)
+        bands = word_bands[word_ids].astype(np.int64)
+
+        # Postings sorted by key, then band: each (key, band) is one contiguous slice
+        slots = keys * len(BANDS) + bands
+        order = np.argsort(slots, kind='stable')
+        self._postings = word_ids[order].astype(np.int32)
+        counts = np.bincount(slots, minlength=_NUM_KEYS * len(BANDS))
+        # Plain lists make the per-word lookups in generate() cheap
+        self._offsets = [0] + np.cumsum(counts).tolist()
+        self._all_words = np.argsort(word_bands, kind='stable').astype(np.int32)
+        self._band_offsets = np.searchsorted(word_bands[self._all_words], np.arange(len(BANDS) + 1)).tolist()
+        logger.info(f"Built drill index over {start} words with {len(self._postings)} postings")
+
+    def __len__(self) -> int:
+        return self._starts[-1]
+
+    def word(self, word_id: int) -> str:
+        """Return a word by its global id."""
+        section = bisect.bisect_right(self._starts, word_id) - 1
+        return self._sections[section].get(word_id - self._starts[section])
+
+    def words_with(self, target: str, difficulty: Optional[str] = None) -> int:
+        """Return how many words contain a character or bigram."""
+        key = _target_key(target.lower())
+        if key is None:
+            return 0
+        if difficulty in BANDS:
+            slot = key * len(BANDS) + BANDS.index(difficulty)
+            return self._offsets[slot + 1] - self._offsets[slot]
+        return self._offsets[(key + 1) * len(BANDS)] - self._offsets[key * len(BANDS)]
+
+    def _pick(self, start: int, end: int, source, rng: random.Random) -> int:
+        return int(source[start + int(rng.random() * (end - start))])
+
+    def generate(self, targets: Mapping[str, float], length: int = 20,
+                 difficulty: str = DEFAULT_BAND, rng: Optional[random.Random] = None) -> Dict[str, Any]:
+        """
+        Build a drill text weighted toward the given targets.
+
+        Each word is drawn for a target picked by weight, preferring words
+        of the requested difficulty band. Without usable targets the drill
+        is made of random words from the band.
+
+        Args:
+            targets: Weights of characters and bigrams to practise
+            length: Number of words
+            difficulty: Preferred difficulty band
+            rng: Random number generator (default: the ``random`` module)
+
+        Returns:
+            Dict with the drill text, its words and the targets used
+        """
+        rng = rng or random
+        band = BANDS.index(difficulty) if difficulty in BANDS else BANDS.index(DEFAULT_BAND)
+        offsets = self._offsets
+
+        # Posting slices per usable target: the preferred band, else every band
+        slices, cumulative, total = [], [], 0.0
+        for target, weight in targets.items():
+            key = _target_key(target.lower())
+            if key is None or weight <= 0:
+                continue
+            slot = key * len(BANDS) + band
+            start, end = offsets[slot], offsets[slot + 1]
+            if start == end:
+                start, end = offsets[key * len(BANDS)], offsets[(key + 1) * len(BANDS)]
+            if start == end:
+                continue
+            slices.append((target, start, end))
+            total += weight
+            cumulative.append(total)
+
+        word_ids = []
+        if slices:
+            used = set()
+            for _ in range(length):
+                _, start, end = slices[bisect.bisect_right(cumulative, rng.random() * total)]
+                # Redraw a few times to keep small posting lists from repeating words
+                for _ in range(3):
+                    word_id = self._pick(start, end, self._postings, rng)
+                    if word_id not in used:
+                        break
+                used.add(word_id)
+                word_ids.append(word_id)
+        elif len(self):
+            start, end = self._band_offsets[band], self._band_offsets[band + 1]
+            if start == end:
+                start, end = 0, len(self._all_words)
+            word_ids = [self._pick(start, end, self._all_words, rng) for _ in range(length)]
+
+        words = [self.word(word_id) for word_id in word_ids]
+        return {
+            'text': ' '.join(words),
+            'words': words,
+            'targets': [target for target, _, _ in slices]
+        }
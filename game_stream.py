@@ -0,0 +1,224 @@
+"""
+Seeded word streams for the typing game.
+
+A game is identified by a signed token holding the player, a random seed,
+the difficulty and the game length; the server stores nothing per game. Word ``i`` of a
+game is computed directly from the seed: the difficulty band's words are
+walked in a keyed pseudo-random permutation (a Feistel network with
+cycle walking), reshuffled with a new key each time the band is
+exhausted. Any page of the stream can therefore be served, or resumed,
+in time proportional to the page, and a submitted game is verified by
+replaying the words the player claims to have typed.
+"""
+import time
+import secrets
+import logging
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+from corpus import CorpusSection
+
+logger = logging.getLogger(__name__)
+
+_MASK64 = (1 << 64) - 1
+_FEISTEL_ROUNDS = 4
+
+# Fastest plausible game typing, in words of five characters per minute
+MAX_GAME_WPM = 250
+# Length of a game (typing_game.js), and the allowance for submitting it after the timer ends
+GAME_SECONDS = 60
+SUBMIT_GRACE_SECONDS = 5
+
+
+class InvalidGameToken(Exception):
+    """Raised when a game token is forged or expired."""
+
+
+class GameVerificationError(Exception):
+    """Raised when a submitted game cannot have been played as claimed."""
+
+
+def _mix64(value: int) -> int:
+    """SplitMix64 finalizer: a fast, well-distributed 64-bit hash."""
+    value = (value + 0x9E3779B97F4A7C15) & _MASK64
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return value ^ (value >> 31)
+
+
+class Permutation:
+    """A keyed pseudo-random permutation of ``range(size)`` evaluated one value at a time."""
+
+    def __init__(self, size: int, key: int):
+        """
+        Initialize the permutation.
+
+        Args:
+            size: Size of the permuted range
+            key: Permutation key
+        """
+        self.size = size
+        self._half_bits = max(1, ((size - 1).bit_length() + 1) // 2)
+        self._half_mask = (1 << self._half_bits) - 1
+        self._round_keys = [_mix64(key ^ (round_number << 56)) for round_number in range(_FEISTEL_ROUNDS)]
+
+    def __call__(self, index: int) -> int:
+        """Return the value ``index`` is mapped to."""
+        half_bits, half_mask = self._half_bits, self._half_mask
+        value = index
+        while True:
+            # Feistel rounds (multiply-shift round function) permute the enclosing
+            # power-of-two domain ...
+            left, right = value >> half_bits, value & half_mask
+            for round_key in self._round_keys:
+                left, right = right, left ^ ((((right ^ round_key) * 0x9E3779B97F4A7C15) & _MASK64) >> 40 & half_mask)
+            value = (left << half_bits) | right
+            # ... and walking the cycle until it lands back inside the range permutes range(size)
+            if value < self.size:
+                return value
+
+
+class WordStream:
+    """The deterministic word sequence of one game."""
+
+    def __init__(self, words: CorpusSection, seed: int, difficulty: str):
+        """
+        Initialize the stream.
+
+        Args:
+            words: Corpus word section to draw from
+            seed: Game seed
+            difficulty: Difficulty band
+        """
+        self.words = words
+        self.seed = seed
+        self._band = words.band_items(difficulty)
+        self._cycle = None
+        self._permutation = None
+
+    def _permutation_for(self, cycle: int) -> Permutation:
+        """Return the shuffle used for one pass over the band."""
+        if cycle != self._cycle:
+            self._permutation = Permutation(len(self._band), _mix64(self.seed ^ _mix64(cycle)))
+            self._cycle = cycle
+        return self._permutation
+
+    def word(self, position: int) -> str:
+        """Return the word at a position of the stream."""
+        cycle, index = divmod(position, len(self._band))
+        return self.words.get(int(self._band[self._permutation_for(cycle)(index)]))
+
+    def page(self, cursor: int, count: int) -> List[str]:
+        """Return ``count`` words starting at ``cursor``."""
+        return [self.word(position) for position in range(cursor, cursor + count)]
+
+    def iter_words(self, cursor: int = 0) -> Iterator[Tuple[int, str]]:
+        """Yield (position, word) pairs from ``cursor`` on, without end."""
+        position = cursor
+        while True:
+            yield position, self.word(position)
+            position += 1
+
+
+class GameTicket(NamedTuple):
+    """The contents of a verified game token."""
+    user_id: str
+    seed: int
+    difficulty: str
+    issued_at: float
+    seconds: int
+
+
+class GameTokens:
+    """
+    Issues and checks signed game tokens.
+
+    A token can be verified any number of times; that its game is only
+    submitted once is enforced by the unique seed of the stored result.
+    """
+
+    def __init__(self, secret_key: str, max_age: int = 3600):
+        """
+        Initialize the token issuer.
+
+        Args:
+            secret_key: Key used to sign tokens
+            max_age: Seconds a token stays valid
+        """
+        self.max_age = max_age
+        self._serializer = URLSafeTimedSerializer(secret_key, salt='typing-game')
+
+    def issue(self, user_id: str, difficulty: str, seconds: int = GAME_SECONDS) -> Tuple[str, GameTicket]:
+        """
+        Start a game for a user.
+
+        Args:
+            user_id: Unique user identifier
+            difficulty: Difficulty band
+            seconds: Length of the game
+
+        Returns:
+            Tuple of the signed token and its ticket
+        """
+        seed = secrets.randbits(63)
+        token = self._serializer.dumps({'u': user_id, 's': seed, 'd': difficulty, 'l': seconds})
+        return token, GameTicket(user_id, seed, difficulty, time.time(), seconds)
+
+    def verify(self, token: str) -> GameTicket:
+        """
+        Check a game token.
+
+        Args:
+            token: Token from ``issue``
+
+        Returns:
+            The GameTicket
+
+        Raises:
+            InvalidGameToken: If the token is forged or expired
+        """
+        try:
+            payload, issued_at = self._serializer.loads(token, max_age=self.max_age, return_timestamp=True)
+        except SignatureExpired:
+            raise InvalidGameToken("Game token has expired")
+        except BadSignature:
+            raise InvalidGameToken("Invalid game token")
+        return GameTicket(payload['u'], payload['s'], payload['d'], issued_at.timestamp(),
+                          payload.get('l', GAME_SECONDS))
+
+
+def word_points(word: str) -> int:
+    """Points for typing a word: longer words are worth more."""
+    return max(1, len(word) // 3)
+
+
+def verify_game(stream: WordStream, ticket: GameTicket, words_completed: int,
+                submitted_at: Optional[float] = None) -> Tuple[int, List[str]]:
+    """
+    Replay a game and compute its score.
+
+    Args:
+        stream: The game's word stream
+        ticket: The game's ticket
+        words_completed: Number of words the player claims to have typed
+        submitted_at: Submission time (default: now)
+
+    Returns:
+        Tuple of the score and the words typed
+
+    Raises:
+        GameVerificationError: If the words could not have been typed in the time taken
+    """
+    if words_completed < 0:
+        raise GameVerificationError("Negative word count")
+    # Time after the game ended was not spent typing, however late the token is submitted
+    elapsed = min(max((submitted_at or time.time()) - ticket.issued_at, 1.0),
+                  ticket.seconds + SUBMIT_GRACE_SECONDS)
+    minutes = elapsed / 60
+    # Every word takes at least two characters with its space; reject before replaying
+    if words_completed * 2 / 5 / minutes > MAX_GAME_WPM:
+        raise GameVerificationError(f"{words_completed} words in {elapsed:.0f}s is not plausible")
+
+    words = stream.page(0, words_completed)
+    if sum(len(word) + 1 for word in words) / 5 / minutes > MAX_GAME_WPM:
+        raise GameVerificationError(f"{words_completed} words in {elapsed:.0f}s is not plausible")
+    return sum(word_points(word) for word in words), words
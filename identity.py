@@ -0,0 +1,150 @@
+"""
+Request identity resolution.
+
+Flask-Login loads the logged-in User once per request through
+``IdentityResolver.load_user``. The User is loaded with its profile in a
+single joined query and kept on ``flask.g`` for the rest of the request.
+Optionally, a plain snapshot of the user's columns is also kept in a
+short-TTL cache per worker, so repeated requests by the same user need no
+identity query at all. The profile itself is never cached across
+requests, since submissions update it.
+
+Cached entries are dropped on logout and whenever a User's password or
+active flag changes in this worker. Other workers see the change once
+their entry expires, so the TTL should stay short.
+
+``count_queries`` counts the SQL statements each request runs.
+"""
+import logging
+from typing import Any, Optional
+from flask import Flask, Response, g, has_request_context
+from sqlalchemy import event, inspect, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import joinedload, make_transient_to_detached
+from models import db, User
+from user_cache import LRUCacheBackend, MISSING
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_TTL = 30
+QUERY_COUNT_HEADER = 'X-Query-Count'
+
+
+class IdentityResolver:
+    """Loads the logged-in User for each request."""
+
+    def __init__(self, cache_size: int = 10000, cache_ttl: float = DEFAULT_CACHE_TTL):
+        """
+        Initialize the resolver.
+
+        Args:
+            cache_size: Maximum number of users cached per worker
+            cache_ttl: Seconds a user stays cached; 0 disables the cache
+        """
+        self._cache = LRUCacheBackend(max_size=cache_size, ttl=cache_ttl) if cache_ttl > 0 else None
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app: Flask) -> None:
+        """
+        Take the cache settings from ``IDENTITY_CACHE_SIZE`` and ``IDENTITY_CACHE_TTL``.
+
+        Args:
+            app: Flask application
+        """
+        ttl = app.config.get('IDENTITY_CACHE_TTL', DEFAULT_CACHE_TTL)
+        size = app.config.get('IDENTITY_CACHE_SIZE', 10000)
+        self._cache = LRUCacheBackend(max_size=size, ttl=ttl) if ttl > 0 else None
+
+    def load_user(self, user_id: str) -> Optional[User]:
+        """
+        Load a User by id for Flask-Login.
+
+        Args:
+            user_id: User id as stored in the login session
+
+        Returns:
+            The User attached to the current session, or None if there is none
+        """
+        if has_request_context() and getattr(g, '_identity_id', None) == user_id:
+            return g._identity_user
+
+        user = self._from_cache(user_id)
+        if user is None:
+            self.misses += 1
+            # The profile comes in the same query and stays in the session's identity map
+            user = db.session.scalar(
+                select(User).options(joinedload(User.profile)).where(User.id == int(user_id)))
+            if user is not None and self._cache is not None:
+                self._cache.set(user_id, {column.key: getattr(user, column.key)
+                                          for column in User.__mapper__.column_attrs})
+
+        if has_request_context():
+            g._identity_id, g._identity_user = user_id, user
+        return user
+
+    def _from_cache(self, user_id: str) -> Optional[User]:
+        """Rebuild a cached User and attach it to the session without a query."""
+        if self._cache is None:
+            return None
+        columns = self._cache.get(user_id)
+        if columns is MISSING:
+            return None
+        self.hits += 1
+        user = User(**columns)
+        make_transient_to_detached(user)
+        # load=False trusts the cached columns; the profile still loads lazily if used
+        return db.session.merge(user, load=False)
+
+    def invalidate(self, user_id: Any) -> None:
+        """
+        Drop a user from the cache, e.g. on logout.
+
+        Args:
+            user_id: User id
+        """
+        if self._cache is not None:
+            self._cache.delete(str(user_id))
+        if has_request_context() and getattr(g, '_identity_id', None) == str(user_id):
+            g._identity_id = g._identity_user = None
+
+
+identity = IdentityResolver()
+
+
+@event.listens_for(User.password_hash, 'set')
+@event.listens_for(User.is_active, 'set')
+def _invalidate_on_change(user, value, oldvalue, initiator):
+    """Drop a user's cached identity when a credential changes."""
+    # Users being created or rebuilt from the cache are not persistent yet
+    if inspect(user).persistent:
+        identity.invalidate(user.id)
+
+
+def count_queries(app: Flask, *engines: Optional[Engine]) -> None:
+    """
+    Count the SQL statements each request runs on the given engines.
+
+    The count is kept in ``g.query_count``, logged at debug level and,
+    with ``QUERY_COUNT_HEADER`` enabled, returned in an ``X-Query-Count``
+    response header.
+
+    Args:
+        app: Flask application
+        *engines: Engines to count statements on (None entries are skipped)
+    """
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context():
+            g.query_count = g.get('query_count', 0) + 1
+
+    for engine in engines:
+        if engine is not None:
+            event.listen(engine, 'before_cursor_execute', count)
+
+    @app.after_request
+    def report_query_count(response: Response) -> Response:
+        queries = g.get('query_count', 0)
+        logger.debug(f"{queries} queries for {response.status_code} response")
+        if app.config.get('QUERY_COUNT_HEADER'):
+            response.headers[QUERY_COUNT_HEADER] = str(queries)
+        return response
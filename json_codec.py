@@ -0,0 +1,94 @@
+"""
+Pluggable JSON codec for the JSON-encoded database columns.
+
+``orjson`` is used when it is installed and the standard library ``json``
+module otherwise. The active codec can be switched with ``use_codec``
+or the ``TYPEMASTER_JSON_CODEC`` environment variable; both codecs read
+each other's output, so switching needs no data migration.
+"""
+import os
+import json
+import logging
+from typing import Any, Callable, Dict
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+class JSONCodec:
+    """A named pair of JSON encode/decode functions producing text."""
+
+    def __init__(self, name: str, dumps: Callable[[Any], str], loads: Callable[[str], Any]):
+        """
+        Initialize a codec.
+
+        Args:
+            name: Codec name
+            dumps: Function encoding a value to a JSON string
+            loads: Function decoding a JSON string or bytes
+        """
+        self.name = name
+        self.dumps = dumps
+        self.loads = loads
+
+    def __repr__(self) -> str:
+        return f"<JSONCodec {self.name}>"
+
+
+def _orjson_dumps(value: Any) -> str:
+    try:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    except TypeError:
+        # Types orjson refuses (e.g. float subclasses, big ints) keep working
+        return json.dumps(value)
+
+
+CODECS: Dict[str, JSONCodec] = {'json': JSONCodec('json', json.dumps, json.loads)}
+if orjson is not None:
+    CODECS['orjson'] = JSONCodec('orjson', _orjson_dumps, orjson.loads)
+
+_active = CODECS['orjson' if orjson is not None else 'json']
+
+
+def use_codec(name: str) -> JSONCodec:
+    """
+    Switch the codec used by ``dumps`` and ``loads``.
+
+    Args:
+        name: Name of a codec in ``CODECS``
+
+    Returns:
+        The now active codec
+
+    Raises:
+        ValueError: If the codec is not available
+    """
+    global _active
+    if name not in CODECS:
+        raise ValueError(f"JSON codec {name!r} is not available (have: {', '.join(CODECS)})")
+    _active = CODECS[name]
+    return _active
+
+
+def active_codec() -> JSONCodec:
+    """Return the codec in use."""
+    return _active
+
+
+def dumps(value: Any) -> str:
+    """Encode a value to a JSON string with the active codec."""
+    return _active.dumps(value)
+
+
+def loads(text: str) -> Any:
+    """Decode a JSON string with the active codec."""
+    return _active.loads(text)
+
+
+if os.environ.get("TYPEMASTER_JSON_CODEC"):
+    use_codec(os.environ["TYPEMASTER_JSON_CODEC"])
+logger.debug(f"Using JSON codec {_active.name}")
@@ -0,0 +1,415 @@
+"""
+Compact binary storage format for typing test keystrokes.
+
+Keystrokes recorded by the client all have the same five fields (key,
+keyCode, timestamp, shiftKey, position), so storing them as a JSON list
+of dicts repeats every field name per keystroke. A blob stores them as
+columns instead:
+
+    byte 0      format version (1)
+    byte 1      flags: bit 0 = zlib-compressed payload, bit 1 = JSON payload
+    payload     varint count, key dictionary of (key, keyCode) entries,
+                then length-prefixed varint sections for the dictionary
+                index, zigzag timestamp deltas and zigzag position deltas,
+                then the shiftKey flags packed eight to a byte
+
+Events that do not fit that shape (missing or extra fields, fractional
+timestamps, ...) are stored as a JSON payload in the same envelope, so
+encoding is always lossless. Legacy rows holding a bare JSON list are
+still readable.
+
+Blobs are decoded lazily: ``KeystrokeLog.arrays()`` goes straight from
+the columns to the arrays the keystroke analyzer works on without
+building any dicts.
+"""
+import json
+import math
+import zlib
+import logging
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+import numpy as np
+from ml_models import KeystrokeArrays
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+FLAG_ZLIB = 0x01
+FLAG_JSON = 0x02
+
+# Fields every keystroke recorded by typing_test.js has
+EVENT_FIELDS = ('key', 'keyCode', 'timestamp', 'shiftKey', 'position')
+
+# Payloads smaller than this are not worth compressing
+COMPRESS_MIN_BYTES = 64
+
+_INT64_MIN, _INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+class KeystrokeCodecError(ValueError):
+    """Raised when a keystroke blob cannot be decoded."""
+
+
+class InvalidKeystrokesError(ValueError):
+    """Raised when submitted keystrokes are not a list of keystroke objects."""
+
+
+def validate_events(events: Any) -> None:
+    """
+    Check that submitted keystrokes can be analyzed.
+
+    Any list of objects can be stored (odd shapes go to the JSON
+    payload), but the analyzer needs objects with numeric timestamps.
+
+    Args:
+        events: Keystroke events as received
+
+    Raises:
+        InvalidKeystrokesError: If ``events`` is not a list of objects, or a
+            timestamp is present but not a finite number
+    """
+    if not isinstance(events, list):
+        raise InvalidKeystrokesError("keystrokes must be a list")
+    for event in events:
+        if not isinstance(event, dict):
+            raise InvalidKeystrokesError("each keystroke must be an object")
+        timestamp = event.get('timestamp')
+        if timestamp is not None and (isinstance(timestamp, bool) or not isinstance(timestamp, (int, float))
+                                      or not math.isfinite(timestamp)):
+            raise InvalidKeystrokesError("keystroke timestamps must be numbers")
+
+
+def _zigzag(values: np.ndarray) -> np.ndarray:
+    """Map signed integers to unsigned ones so small magnitudes stay small."""
+    values = values.astype(np.int64)
+    return ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+
+def _unzigzag(values: np.ndarray) -> np.ndarray:
+    """Invert ``_zigzag``."""
+    return (values >> np.uint64(1)).astype(np.int64) ^ -(values & np.uint64(1)).astype(np.int64)
+
+
+def encode_varints(values: np.ndarray) -> bytes:
+    """
+    Encode unsigned integers as LEB128 varints.
+
+    Args:
+        values: Array of non-negative integers
+
+    Returns:
+        The encoded bytes
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    sizes = np.ones(len(values), dtype=np.int64)
+    rest = values >> np.uint64(7)
+    while rest.any():
+        sizes += rest > 0
+        rest >>= np.uint64(7)
+
+    out = np.empty(int(sizes.sum()), dtype=np.uint8)
+    offsets = np.cumsum(sizes) - sizes
+    for byte in range(int(sizes.max()) if len(sizes) else 0):
+        mask = sizes > byte
+        chunk = (values[mask] >> np.uint64(7 * byte)) & np.uint64(0x7F)
+        more = (sizes[mask] > byte + 1).astype(np.uint64) << np.uint64(7)
+        out[offsets[mask] + byte] = (chunk | more).astype(np.uint8)
+    return out.tobytes()
+
+
+def decode_varints(data: bytes, count: int) -> np.ndarray:
+    """
+    Decode a buffer holding exactly ``count`` LEB128 varints.
+
+    Args:
+        data: Encoded bytes
+        count: Expected number of values
+
+    Returns:
+        Array of uint64 values
+
+    Raises:
+        KeystrokeCodecError: If the buffer does not hold ``count`` varints
+    """
+    raw = np.frombuffer(data, dtype=np.uint8)
+    ends = np.flatnonzero(raw < 0x80)
+    if len(ends) != count or (count and ends[-1] != len(raw) - 1):
+        raise KeystrokeCodecError("Corrupt varint section")
+    if not count:
+        return np.zeros(0, dtype=np.uint64)
+
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    shifts = np.arange(len(raw)) - np.repeat(starts, ends - starts + 1)
+    if shifts.max() > 9:
+        raise KeystrokeCodecError("Varint too long")
+    chunks = (raw & 0x7F).astype(np.uint64) << (7 * shifts).astype(np.uint64)
+    return np.bitwise_or.reduceat(chunks, starts)
+
+
+class _Reader:
+    """Sequential reader over a decoded payload."""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.pos = 0
+
+    def varint(self) -> int:
+        result = shift = 0
+        while True:
+            if self.pos >= len(self.data):
+                raise KeystrokeCodecError("Truncated keystroke blob")
+            byte = self.data[self.pos]
+            self.pos += 1
+            result |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return result
+            shift += 7
+
+    def signed(self) -> int:
+        value = self.varint()
+        return (value >> 1) ^ -(value & 1)
+
+    def take(self, size: int) -> bytes:
+        if self.pos + size > len(self.data):
+            raise KeystrokeCodecError("Truncated keystroke blob")
+        chunk = self.data[self.pos:self.pos + size]
+        self.pos += size
+        return chunk
+
+
+def _write_varint(out: bytearray, value: int) -> None:
+    """Append a single varint."""
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _write_signed(out: bytearray, value: int) -> None:
+    """Append a single zigzag-encoded signed varint."""
+    _write_varint(out, (value << 1) ^ (value >> 63))
+
+
+def _columns(events: List[Dict[str, Any]]) -> Optional[Dict[str, list]]:
+    """
+    Split events into per-field columns.
+
+    Returns:
+        Dict of columns, or None if the events do not fit the columnar layout
+    """
+    if not all(isinstance(event, dict) and len(event) == len(EVENT_FIELDS) for event in events):
+        return None
+    try:
+        columns = {field: [event[field] for event in events] for field in EVENT_FIELDS}
+    except (KeyError, TypeError):
+        return None
+
+    if not set(map(type, columns['key'])) <= {str}:
+        return None
+    if not set(map(type, columns['shiftKey'])) <= {bool}:
+        return None
+    for field in ('keyCode', 'timestamp', 'position'):
+        values = columns[field]
+        if not set(map(type, values)) <= {int}:
+            return None
+        if values and (min(values) < _INT64_MIN // 4 or max(values) > _INT64_MAX // 4):
+            return None
+    return columns
+
+
+def _envelope(payload: bytes, flags: int, compress: bool) -> bytes:
+    """Wrap a payload in the version/flags header, compressing if it helps."""
+    if compress and len(payload) >= COMPRESS_MIN_BYTES:
+        compressed = zlib.compress(payload, 6)
+        if len(compressed) < len(payload):
+            payload, flags = compressed, flags | FLAG_ZLIB
+    return bytes((FORMAT_VERSION, flags)) + payload
+
+
+class KeystrokeLog:
+    """
+    Keystrokes of one typing test, stored as a blob and decoded on demand.
+
+    Behaves like a read-only list of keystroke dicts; ``arrays()`` returns
+    the columns as KeystrokeArrays without building the dicts.
+    """
+
+    __slots__ = ('_blob', '_events', '_arrays', '_count', 'legacy')
+
+    def __init__(self, blob: bytes, events: Optional[List[Dict[str, Any]]] = None,
+                 arrays: Optional[KeystrokeArrays] = None, legacy: bool = False):
+        """
+        Initialize a log. Use ``from_events`` or ``from_storage`` instead.
+
+        Args:
+            blob: Encoded keystrokes
+            events: Decoded events, if already known
+            arrays: Decoded arrays, if already known
+            legacy: Whether the stored value was a bare JSON list
+        """
+        self._blob = blob
+        self._events = events
+        self._arrays = arrays
+        self._count = len(events) if events is not None else None
+        self.legacy = legacy
+
+    @classmethod
+    def from_events(cls, events: List[Dict[str, Any]], compress: bool = True) -> 'KeystrokeLog':
+        """
+        Encode keystroke events.
+
+        The arrays for the analyzer are built from the same columns, so
+        encoding a submission and analyzing it share one pass over the dicts.
+
+        Args:
+            events: Keystroke dicts as recorded by the client
+            compress: Whether to zlib-compress the payload when it gets smaller
+
+        Returns:
+            KeystrokeLog holding the encoded blob
+        """
+        events = list(events or [])
+        columns = _columns(events)
+        if columns is None:
+            payload = json.dumps(events, separators=(',', ':')).encode('utf-8')
+            return cls(_envelope(payload, FLAG_JSON, compress), events=events)
+
+        out = bytearray()
+        _write_varint(out, len(events))
+
+        # Dictionary of distinct (key, keyCode) pairs in order of first appearance
+        pairs = list(zip(columns['key'], columns['keyCode']))
+        entries = {pair: i for i, pair in enumerate(dict.fromkeys(pairs))}
+        entry_ids = list(map(entries.__getitem__, pairs))
+        _write_varint(out, len(entries))
+        for key, key_code in entries:
+            encoded = key.encode('utf-8')
+            _write_varint(out, len(encoded))
+            out += encoded
+            _write_signed(out, key_code)
+
+        entry_ids = np.array(entry_ids, dtype=np.uint64)
+        timestamps = np.array(columns['timestamp'], dtype=np.int64)
+        positions = np.array(columns['position'], dtype=np.int64)
+        for section in (encode_varints(entry_ids),
+                        encode_varints(_zigzag(np.diff(timestamps, prepend=0))),
+                        encode_varints(_zigzag(np.diff(positions, prepend=0)))):
+            _write_varint(out, len(section))
+            out += section
+        out += np.packbits(np.array(columns['shiftKey'], dtype=bool), bitorder='little').tobytes()
+
+        # Arrays for the analyzer: key ids index distinct key strings, '' meaning no key
+        key_index = {'': 0}
+        entry_keys = np.array([key_index.setdefault(key, len(key_index)) for key, _ in entries],
+                              dtype=np.intp)
+        arrays = KeystrokeArrays(timestamps.astype(np.float64),
+                                 entry_keys[entry_ids.astype(np.intp)], list(key_index))
+        return cls(_envelope(bytes(out), 0, compress), events=events, arrays=arrays)
+
+    @classmethod
+    def from_storage(cls, value: Union[bytes, str]) -> 'KeystrokeLog':
+        """
+        Wrap a stored column value without decoding it.
+
+        Args:
+            value: A blob, or a legacy JSON list as text or bytes
+
+        Returns:
+            KeystrokeLog for the value
+        """
+        if isinstance(value, str):
+            return cls(b'', events=json.loads(value) or [], legacy=True)
+        value = bytes(value)
+        if value[:1] in (b'[', b'n', b' '):
+            return cls(b'', events=json.loads(value.decode('utf-8') or 'null') or [], legacy=True)
+        return cls(value)
+
+    @property
+    def blob(self) -> bytes:
+        """The encoded keystrokes, encoding legacy values on first access."""
+        if not self._blob:
+            self._blob = KeystrokeLog.from_events(self._events)._blob
+        return self._blob
+
+    def _payload(self) -> Tuple[int, bytes]:
+        """Return the flags and the decompressed payload."""
+        blob = self._blob
+        if len(blob) < 2 or blob[0] != FORMAT_VERSION:
+            raise KeystrokeCodecError(f"Unsupported keystroke blob version {blob[:1]!r}")
+        flags, payload = blob[1], blob[2:]
+        if flags & FLAG_ZLIB:
+            payload = zlib.decompress(payload)
+        return flags, payload
+
+    def _decode_columns(self) -> Tuple[int, List[Tuple[str, int]], np.ndarray, np.ndarray,
+                                       np.ndarray, np.ndarray]:
+        """Decode a columnar payload into its dictionary and column arrays."""
+        _, payload = self._payload()
+        reader = _Reader(payload)
+        count = reader.varint()
+        entries = []
+        for _ in range(reader.varint()):
+            key = reader.take(reader.varint()).decode('utf-8')
+            entries.append((key, reader.signed()))
+
+        entry_ids = decode_varints(reader.take(reader.varint()), count).astype(np.intp)
+        timestamps = np.cumsum(_unzigzag(decode_varints(reader.take(reader.varint()), count)))
+        positions = np.cumsum(_unzigzag(decode_varints(reader.take(reader.varint()), count)))
+        shift = np.unpackbits(np.frombuffer(reader.take((count + 7) // 8), dtype=np.uint8),
+                              count=count, bitorder='little').astype(bool)
+        if count and entry_ids.max() >= len(entries):
+            raise KeystrokeCodecError("Keystroke references an unknown key")
+        return count, entries, entry_ids, timestamps, positions, shift
+
+    def events(self) -> List[Dict[str, Any]]:
+        """Decode the keystrokes into dicts (cached)."""
+        if self._events is None:
+            flags, payload = self._payload()
+            if flags & FLAG_JSON:
+                self._events = json.loads(payload.decode('utf-8'))
+            else:
+                count, entries, entry_ids, timestamps, positions, shift = self._decode_columns()
+                self._events = [
+                    {'key': entries[e][0], 'keyCode': entries[e][1], 'timestamp': t,
+                     'shiftKey': s, 'position': p}
+                    for e, t, s, p in zip(entry_ids.tolist(), timestamps.tolist(),
+                                          shift.tolist(), positions.tolist())
+                ]
+            self._count = len(self._events)
+        return self._events
+
+    def arrays(self) -> KeystrokeArrays:
+        """Decode the keystrokes into KeystrokeArrays for the analyzer (cached)."""
+        if self._arrays is None:
+            if self._events is not None or self._payload()[0] & FLAG_JSON:
+                self._arrays = KeystrokeArrays.from_events(self.events())
+            else:
+                count, entries, entry_ids, timestamps, _, _ = self._decode_columns()
+                key_index = {'': 0}
+                entry_keys = np.array([key_index.setdefault(key, len(key_index)) for key, _ in entries],
+                                      dtype=np.intp)
+                self._arrays = KeystrokeArrays(timestamps.astype(np.float64),
+                                               entry_keys[entry_ids],
+                                               list(key_index))
+                self._count = count
+        return self._arrays
+
+    def __len__(self) -> int:
+        if self._count is None:
+            self.arrays()
+        return self._count
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self.events())
+
+    def __getitem__(self, index):
+        return self.events()[index]
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, KeystrokeLog):
+            return self.events() == other.events()
+        if isinstance(other, list):
+            return self.events() == other
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"<KeystrokeLog {len(self.blob)} bytes>"
@@ -0,0 +1,206 @@
+"""
+In-process fan-out of live test metrics over Server-Sent Events.
+
+Each SSE connection subscribes to a channel (a live test session id) and
+holds only a small queue and a wake-up event, so thousands of idle
+connections are cheap when the app runs under a gevent worker:
+
+    gunicorn -k gevent --worker-connections 2000 main:app
+
+Subscribers get a comment heartbeat while idle, which also lets the
+server notice disconnected clients, and are dropped after a period with
+no events.
+"""
+import json
+import time
+import logging
+import threading
+from collections import deque
+from typing import Any, Dict, Iterator, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+def format_event(event: str, data: Dict[str, Any]) -> str:
+    """
+    Format a message in the text/event-stream wire format.
+
+    Args:
+        event: Event name
+        data: JSON-serializable payload
+
+    Returns:
+        The encoded event
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class Subscription:
+    """A single SSE connection listening on a channel."""
+
+    def __init__(self, channel: str, backlog: int = 16):
+        """
+        Initialize a subscription.
+
+        Args:
+            channel: Channel the subscriber listens on
+            backlog: Maximum undelivered events kept; older ones are dropped
+        """
+        self.channel = channel
+        self.closed = False
+        self._pending = deque(maxlen=backlog)
+        self._wakeup = threading.Event()
+
+    def push(self, message: str) -> None:
+        """Queue an encoded event for delivery."""
+        self._pending.append(message)
+        self._wakeup.set()
+
+    def close(self) -> None:
+        """Ask the stream to finish after delivering queued events."""
+        self.closed = True
+        self._wakeup.set()
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Block until an event is pushed or the subscription is closed.
+
+        Args:
+            timeout: Maximum seconds to wait
+
+        Returns:
+            False if the wait timed out
+        """
+        woke = self._wakeup.wait(timeout)
+        self._wakeup.clear()
+        return woke
+
+    def drain(self) -> Iterator[str]:
+        """Yield and remove the queued events."""
+        while self._pending:
+            yield self._pending.popleft()
+
+
+class LiveEventHub:
+    """Fans out live test events to the SSE subscribers of each channel."""
+
+    def __init__(self, max_subscribers: int = 10000, heartbeat: float = 15,
+                 idle_timeout: float = 120):
+        """
+        Initialize the hub.
+
+        Args:
+            max_subscribers: Maximum number of open SSE connections
+            heartbeat: Seconds between heartbeats on an idle connection
+            idle_timeout: Seconds without events after which a connection is closed
+        """
+        self.max_subscribers = max_subscribers
+        self.heartbeat = heartbeat
+        self.idle_timeout = idle_timeout
+        self._channels: Dict[str, Set[Subscription]] = {}
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel: str) -> Optional[Subscription]:
+        """
+        Subscribe to a channel.
+
+        Args:
+            channel: Channel to listen on
+
+        Returns:
+            The Subscription, or None if the hub is full
+        """
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                return None
+            subscription = Subscription(channel)
+            self._channels.setdefault(channel, set()).add(subscription)
+            self._count += 1
+            return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """Remove a subscription from its channel."""
+        with self._lock:
+            subscribers = self._channels.get(subscription.channel)
+            if subscribers is None or subscription not in subscribers:
+                return
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._channels[subscription.channel]
+            self._count -= 1
+
+    def publish(self, channel: str, event: str, data: Dict[str, Any]) -> int:
+        """
+        Send an event to every subscriber of a channel.
+
+        Args:
+            channel: Channel to publish on
+            event: Event name
+            data: JSON-serializable payload
+
+        Returns:
+            Number of subscribers the event was queued for
+        """
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        if not subscribers:
+            return 0
+
+        message = format_event(event, data)
+        for subscription in subscribers:
+            subscription.push(message)
+        return len(subscribers)
+
+    def close_channel(self, channel: str, reason: str = 'closed') -> None:
+        """
+        End every stream on a channel.
+
+        Args:
+            channel: Channel to close
+            reason: Reason sent to subscribers in the final ``end`` event
+        """
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        message = format_event('end', {'reason': reason})
+        for subscription in subscribers:
+            subscription.push(message)
+            subscription.close()
+
+    def stream(self, subscription: Subscription) -> Iterator[str]:
+        """
+        Yield encoded events for a subscription until it ends.
+
+        The subscription is removed when the stream finishes or the client
+        disconnects (the server closes the generator on a failed write).
+
+        Args:
+            subscription: Subscription to stream
+
+        Yields:
+            Encoded events and heartbeats
+        """
+        try:
+            # Ask EventSource to wait a few seconds before reconnecting
+            yield "retry: 3000\n\n"
+            last_event = time.monotonic()
+            while True:
+                woke = subscription.wait(self.heartbeat)
+                for message in subscription.drain():
+                    yield message
+                    last_event = time.monotonic()
+
+                if subscription.closed:
+                    return
+                if not woke:
+                    if time.monotonic() - last_event >= self.idle_timeout:
+                        yield format_event('end', {'reason': 'idle'})
+                        return
+                    yield ": heartbeat\n\n"
+        finally:
+            self.unsubscribe(subscription)
+
+    def stats(self) -> Dict[str, int]:
+        """Return the number of open channels and subscribers."""
+        with self._lock:
+            return {'channels': len(self._channels), 'subscribers': self._count}
@@ -0,0 +1,162 @@
+"""
+Live typing test sessions for incremental WPM prediction.
+
+The client opens a session when a test starts and then sends only the
+keystrokes recorded since its last batch, tagged with the sequence number
+of the first one. The session keeps the timestamps it has seen so far, so
+each prediction costs time proportional to the batch, not to the test.
+
+Sessions live in a bounded, expiring in-memory store; they are per
+process, so deployments with several workers need sticky routing.
+"""
+import uuid
+import logging
+import threading
+from array import array
+from typing import Any, Dict, List, Optional
+from keystroke_codec import InvalidKeystrokesError, validate_events
+from ml_models import WPMPredictor, WPMRunningStats
+from user_cache import LRUCacheBackend, MISSING
+
+logger = logging.getLogger(__name__)
+
+
+class SequenceGapError(Exception):
+    """Raised when a batch starts after keystrokes the session has not seen."""
+
+    def __init__(self, expected_seq: int):
+        super().__init__(f"Expected keystroke sequence {expected_seq}")
+        self.expected_seq = expected_seq
+
+
+def validate_batch(seq: Any, keystrokes: Any) -> None:
+    """
+    Check a keystroke batch before any of it is applied.
+
+    Args:
+        seq: Sequence number of the first keystroke in the batch
+        keystrokes: Keystroke events
+
+    Raises:
+        InvalidKeystrokesError: If ``seq`` is not a non-negative integer or
+            the keystrokes fail ``keystroke_codec.validate_events``
+    """
+    if isinstance(seq, bool) or not isinstance(seq, int) or seq < 0:
+        raise InvalidKeystrokesError("seq must be a non-negative integer")
+    validate_events(keystrokes)
+
+
+class LiveTestSession:
+    """Keystroke timestamps and WPM statistics for one in-progress test."""
+
+    def __init__(self, session_id: str, user_id: str, wpm_stats: WPMRunningStats):
+        """
+        Initialize a live session.
+
+        Args:
+            session_id: Unique session identifier
+            user_id: Owner of the session
+            wpm_stats: The user's WPM statistics when the test started
+        """
+        self.session_id = session_id
+        self.user_id = user_id
+        self.wpm_stats = wpm_stats
+        self.keystroke_count = 0
+        self.timestamps = array('d')  # non-zero timestamps, as the predictor expects
+        self._lock = threading.Lock()
+
+    def append(self, seq: int, keystrokes: List[Dict[str, Any]]) -> int:
+        """
+        Append a batch of keystrokes.
+
+        Batches may overlap keystrokes already received (e.g. a retried
+        request); the overlapping part is skipped.
+
+        Args:
+            seq: Sequence number of the first keystroke in the batch
+            keystrokes: Keystroke events recorded since the last batch
+
+        Returns:
+            Sequence number the next batch should start at
+
+        Raises:
+            InvalidKeystrokesError: If the batch is malformed (see ``validate_batch``)
+            SequenceGapError: If the batch starts after the next expected keystroke
+        """
+        validate_batch(seq, keystrokes)
+        with self._lock:
+            if seq > self.keystroke_count:
+                raise SequenceGapError(self.keystroke_count)
+
+            for keystroke in keystrokes[self.keystroke_count - seq:]:
+                timestamp = keystroke.get('timestamp')
+                if timestamp:
+                    self.timestamps.append(timestamp)
+                self.keystroke_count += 1
+            return self.keystroke_count
+
+    def predict(self, predictor: WPMPredictor, current_wpm: float) -> float:
+        """
+        Predict the final WPM of the test from the keystrokes received so far.
+
+        Args:
+            predictor: WPM predictor to use
+            current_wpm: Current WPM based on partial typing
+
+        Returns:
+            Predicted final WPM
+        """
+        with self._lock:
+            return predictor.predict_from_timestamps(
+                current_wpm, self.timestamps, self.keystroke_count, self.wpm_stats)
+
+
+class LiveSessionStore:
+    """Bounded, expiring store of live test sessions."""
+
+    def __init__(self, max_sessions: int = 1000, ttl: float = 600):
+        """
+        Initialize the store.
+
+        Args:
+            max_sessions: Maximum number of sessions kept in memory
+            ttl: Seconds a session is kept after its last use
+        """
+        self._sessions = LRUCacheBackend(max_size=max_sessions, ttl=ttl)
+
+    def open(self, user_id: str, wpm_stats: WPMRunningStats) -> LiveTestSession:
+        """
+        Open a new live session for a user.
+
+        Args:
+            user_id: Unique user identifier
+            wpm_stats: The user's WPM statistics
+
+        Returns:
+            The new LiveTestSession
+        """
+        live_session = LiveTestSession(str(uuid.uuid4()), user_id, wpm_stats)
+        self._sessions.set(live_session.session_id, live_session)
+        return live_session
+
+    def get(self, session_id: str, user_id: str) -> Optional[LiveTestSession]:
+        """
+        Get a user's live session, refreshing its expiry.
+
+        Args:
+            session_id: Unique session identifier
+            user_id: User the session must belong to
+
+        Returns:
+            The LiveTestSession, or None if it is unknown, expired or not the user's
+        """
+        live_session = self._sessions.get(session_id)
+        if live_session is MISSING or live_session.user_id != user_id:
+            return None
+        # Re-setting pushes the expiry forward for active sessions
+        self._sessions.set(session_id, live_session)
+        return live_session
+
+    def close(self, session_id: str) -> None:
+        """Discard a live session."""
+        self._sessions.delete(session_id)
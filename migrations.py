@@ -0,0 +1,482 @@
+"""
+Data migrations for the TypeMaster database.
+
+Each migration is a function registered in ``MIGRATIONS`` and can be run
+from the command line:
+
+    python migrations.py <migration_name> [--dry-run]
+
+``compact_anonymous_profiles`` is meant to be run on a schedule (e.g. daily
+from cron) rather than once.
+"""
+import sys
+import logging
+import argparse
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+from flask import current_app
+from sqlalchemy import delete, exists, func, inspect, or_, select, text, update
+from models import (db, TypingTest, GameResult, PredictorState, UserProfile, User, LessonProgress, TestAnalysis,
+                    ErrorEvent, RECENT_WORD_ERRORS, iter_test_history)
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS: Dict[str, Callable[..., Dict[str, int]]] = {}
+
+# Submissions written twice by the old dual write path landed within this window
+DUPLICATE_WINDOW = timedelta(seconds=5)
+BATCH_SIZE = 500
+# Profiles deleted per transaction by compact_anonymous_profiles; each one takes its
+# tests and results with it, so batches are kept small to hold locks briefly
+COMPACTION_BATCH_SIZE = 100
+DEFAULT_ANONYMOUS_PROFILE_TTL_DAYS = 30
+
+
+def migration(fn: Callable[..., Dict[str, int]]) -> Callable[..., Dict[str, int]]:
+    """Register a function as a named migration."""
+    MIGRATIONS[fn.__name__] = fn
+    return fn
+
+
+def _delete_in_batches(model, ids, dry_run: bool) -> int:
+    """Delete rows by primary key in batches, committing after each batch."""
+    if dry_run:
+        return len(ids)
+
+    for start in range(0, len(ids), BATCH_SIZE):
+        batch = ids[start:start + BATCH_SIZE]
+        model.query.filter(model.id.in_(batch)).delete(synchronize_session=False)
+        db.session.commit()
+    return len(ids)
+
+
+def _rebuild_error_statistics(profile: UserProfile) -> None:
+    """
+    Recompute a profile's error statistics from the error details of its stored tests.
+
+    The tests' errors are summed and applied as one update, as
+    ``record_scored_tests`` does for a batch. The caller commits.
+
+    Args:
+        profile: Profile to rebuild
+    """
+    totals = {'character_errors': {}, 'word_errors': [], 'total_errors': 0, 'total_characters': 0}
+    details = db.session.execute(
+        select(TypingTest.error_details)
+        .where(TypingTest.user_id == profile.user_id)
+        .order_by(TypingTest.timestamp)
+        .execution_options(yield_per=BATCH_SIZE)
+    ).scalars()
+    for error_details in details:
+        if not error_details:
+            continue
+        character_errors = totals['character_errors']
+        for error_char, count in (error_details.get('character_errors') or {}).items():
+            character_errors[error_char] = character_errors.get(error_char, 0) + count
+        word_errors = totals['word_errors'] + list(error_details.get('word_errors') or [])
+        totals['word_errors'] = word_errors[-RECENT_WORD_ERRORS:]
+        totals['total_errors'] += error_details.get('total_errors', 0)
+        totals['total_characters'] += error_details.get('total_characters', 0)
+
+    db.session.execute(delete(ErrorEvent).where(ErrorEvent.user_id == profile.user_id))
+    profile.error_statistics = {}
+    profile.update_error_statistics(totals, commit=False)
+
+
+@migration
+def reconcile_duplicate_submissions(dry_run: bool = False) -> Dict[str, int]:
+    """
+    Remove the duplicate rows written by the old DataManager dual write.
+
+    Every test submission used to be stored twice: once with the full
+    texts and once by ``DataManager.save_test_result`` with empty texts
+    and no time taken. Game results were stored twice with identical
+    values. The copies are recognised by matching values written within
+    a few seconds of the original row.
+
+    Each submission also updated the error statistics twice, so those
+    of the users who had duplicate tests are recomputed from the tests
+    that remain.
+
+    Args:
+        dry_run: Only count the duplicates without deleting them
+
+    Returns:
+        Dict with the number of test and game rows removed and of
+        profiles whose error statistics were recomputed
+    """
+    # Typing tests: only scalar columns are needed to find the copies
+    is_copy = ((func.coalesce(TypingTest.original_text, '') == '') &
+               (func.coalesce(TypingTest.typed_text, '') == '') &
+               (func.coalesce(TypingTest.time_taken, 0) == 0))
+    rows = db.session.query(
+        TypingTest.id, TypingTest.user_id, TypingTest.wpm, TypingTest.accuracy,
+        TypingTest.difficulty, TypingTest.timestamp, is_copy.label('is_copy')
+    ).order_by(TypingTest.user_id, TypingTest.timestamp).all()
+
+    duplicate_tests = []
+    affected_users = set()
+    for i, row in enumerate(rows):
+        if not row.is_copy:
+            continue
+        # Look for the original among the neighbouring rows of the same user
+        for j in (i - 1, i + 1, i - 2, i + 2):
+            if 0 <= j < len(rows):
+                other = rows[j]
+                if (not other.is_copy and other.user_id == row.user_id
+                        and other.wpm == row.wpm and other.accuracy == row.accuracy
+                        and other.difficulty == row.difficulty
+                        and abs(other.timestamp - row.timestamp) <= DUPLICATE_WINDOW):
+                    duplicate_tests.append(row.id)
+                    affected_users.add(row.user_id)
+                    break
+
+    # Game results: the copy is the later of two identical consecutive rows
+    games = db.session.query(
+        GameResult.id, GameResult.user_id, GameResult.score, GameResult.words_typed,
+        GameResult.accuracy, GameResult.difficulty, GameResult.timestamp
+    ).order_by(GameResult.user_id, GameResult.timestamp, GameResult.id).all()
+
+    duplicate_games = set()
+    previous = None
+    for game in games:
+        if (previous is not None and previous.id not in duplicate_games
+                and game[1:6] == previous[1:6]
+                and game.timestamp - previous.timestamp <= DUPLICATE_WINDOW):
+            duplicate_games.add(game.id)
+        previous = game
+
+    result = {
+        'typing_tests_removed': _delete_in_batches(TypingTest, duplicate_tests, dry_run),
+        'game_results_removed': _delete_in_batches(GameResult, sorted(duplicate_games), dry_run)
+    }
+
+    user_ids = sorted(user_id for user_id in affected_users if user_id is not None)
+    recomputed = 0
+    for start in range(0, len(user_ids), BATCH_SIZE):
+        profiles = UserProfile.query.filter(UserProfile.user_id.in_(user_ids[start:start + BATCH_SIZE])).all()
+        recomputed += len(profiles)
+        if dry_run:
+            continue
+        for profile in profiles:
+            _rebuild_error_statistics(profile)
+        db.session.commit()
+        db.session.expunge_all()
+    result['profiles_recomputed'] = recomputed
+    logger.info(f"Reconciled duplicate submissions: {result}")
+    return result
+
+
+@migration
+def backfill_predictor_state(dry_run: bool = False) -> Dict[str, int]:
+    """
+    Seed every user's running WPM statistics from their stored tests.
+
+    Existing states are rebuilt, so this can also repair drift.
+
+    Args:
+        dry_run: Only count the users without writing
+
+    Returns:
+        Dict with the number of users seeded
+    """
+    from ml_models import WPMRunningStats
+
+    user_ids = [user_id for (user_id,) in
+                db.session.query(TypingTest.user_id).distinct()
+                if user_id is not None]
+
+    for start in range(0, len(user_ids), BATCH_SIZE):
+        for user_id in user_ids[start:start + BATCH_SIZE]:
+            stats = WPMRunningStats()
+            for _, wpm, _ in iter_test_history(user_id):
+                stats.update(wpm)
+            if not dry_run:
+                db.session.merge(PredictorState(user_id=user_id, stats=stats.to_dict()))
+        if not dry_run:
+            db.session.commit()
+
+    result = {'users_seeded': len(user_ids)}
+    logger.info(f"Backfilled predictor state: {result}")
+    return result
+
+
+@migration
+def encode_keystroke_blobs(dry_run: bool = False) -> Dict[str, int]:
+    """
+    Re-encode keystroke data stored as JSON text into the binary format.
+
+    On PostgreSQL the column is first changed to ``bytea``; SQLite stores
+    blobs in the existing column as is. Rows are rewritten in primary key
+    order, one batch per commit, so the migration can be interrupted and
+    resumed. SQLite only returns the freed pages to the filesystem after
+    a ``VACUUM``.
+
+    Args:
+        dry_run: Only count the rows and bytes without writing
+
+    Returns:
+        Dict with the number of rows converted and their size before and after
+    """
+    if db.engine.dialect.name == 'postgresql' and not dry_run:
+        columns = {c['name']: c['type'] for c in inspect(db.engine).get_columns('typing_tests')}
+        if columns['keystroke_data'].__visit_name__.upper() != 'BYTEA':
+            db.session.execute(text(
+                "ALTER TABLE typing_tests ALTER COLUMN keystroke_data "
+                "TYPE bytea USING convert_to(keystroke_data, 'UTF8')"))
+            db.session.commit()
+
+    converted = bytes_before = bytes_after = 0
+    last_id = ''
+    while True:
+        batch = db.session.query(
+            TypingTest.id, TypingTest.keystroke_data,
+            func.length(TypingTest.keystroke_data).label('stored_bytes')
+        ).filter(TypingTest.id > last_id).order_by(TypingTest.id).limit(BATCH_SIZE).all()
+        if not batch:
+            break
+        last_id = batch[-1].id
+
+        updates = []
+        for row in batch:
+            if row.keystroke_data is None or not row.keystroke_data.legacy:
+                continue
+            bytes_before += row.stored_bytes or 0
+            bytes_after += len(row.keystroke_data.blob)
+            updates.append({'id': row.id, 'keystroke_data': row.keystroke_data})
+
+        converted += len(updates)
+        if updates and not dry_run:
+            db.session.execute(update(TypingTest), updates)
+            db.session.commit()
+        db.session.expunge_all()
+
+    result = {'rows_converted': converted, 'bytes_before': bytes_before, 'bytes_after': bytes_after}
+    logger.info(f"Encoded keystroke blobs: {result}")
+    return result
+
+
+@migration
+def normalize_error_statistics(dry_run: bool = False) -> Dict[str, int]:
+    """
+    Move every profile's ``character_errors`` blob into the ErrorEvent table.
+
+    Afterwards profiles only keep the top-K most common errors, a bounded
+    window of recent word errors and the totals. Profiles are also
+    normalized on their next submission, so this only front-loads the work.
+
+    Args:
+        dry_run: Only count the profiles without writing
+
+    Returns:
+        Dict with the number of profiles normalized and error pairs moved
+    """
+    user_ids = [user_id for (user_id,) in db.session.query(UserProfile.user_id).order_by(UserProfile.user_id)]
+
+    normalized = pairs = 0
+    for start in range(0, len(user_ids), BATCH_SIZE):
+        profiles = UserProfile.query.filter(
+            UserProfile.user_id.in_(user_ids[start:start + BATCH_SIZE])).all()
+        for profile in profiles:
+            stats = profile.error_statistics or {}
+            if 'character_errors' not in stats:
+                continue
+            normalized += 1
+            pairs += len(stats['character_errors'] or {})
+            if not dry_run:
+                profile.error_statistics = profile.normalize_error_statistics(stats)
+        if not dry_run:
+            db.session.commit()
+        db.session.expunge_all()
+
+    result = {'profiles_normalized': normalized, 'error_pairs_moved': pairs}
+    logger.info(f"Normalized error statistics: {result}")
+    return result
+
+
+@migration
+def create_missing_indexes(dry_run: bool = False) -> Dict[str, int]:
+    """
+    Create every index declared on the models that an existing database lacks.
+
+    Args:
+        dry_run: Only count the missing indexes
+
+    Returns:
+        Dict with the number of indexes created (or missing, on a dry run)
+    """
+    inspector = inspect(db.engine)
+    tables = set(inspector.get_table_names())
+    created = 0
+    for table in db.metadata.sorted_tables:
+        if table.name not in tables:
+            continue  # db.create_all creates new tables with their indexes
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            created += 1
+            logger.info(f"{'Missing' if dry_run else 'Creating'} index {index.name} on {table.name}")
+            if not dry_run:
+                index.create(db.engine)
+
+    result = {'indexes_created': created}
+    logger.info(f"Created missing indexes: {result}")
+    return result
+
+
+@migration
+def add_missing_columns(dry_run: bool = False) -> Dict[str, int]:
+    """
+    Add every nullable column declared on the models that an existing table lacks.
+
+    Run ``create_missing_indexes`` afterwards to index the new columns.
+
+    Args:
+        dry_run: Only count the missing columns
+
+    Returns:
+        Dict with the number of columns added (or missing, on a dry run)
+    """
+    inspector = inspect(db.engine)
+    tables = set(inspector.get_table_names())
+    added = 0
+    for table in db.metadata.sorted_tables:
+        if table.name not in tables:
+            continue  # db.create_all creates new tables with all their columns
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            if not column.nullable or column.primary_key:
+                raise RuntimeError(f"Cannot add required column {table.name}.{column.name} to existing rows")
+            added += 1
+            logger.info(f"{'Missing' if dry_run else 'Adding'} column {column.name} on {table.name}")
+            if not dry_run:
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                with db.engine.begin() as connection:
+                    connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+
+    result = {'columns_added': added}
+    logger.info(f"Added missing columns: {result}")
+    return result
+
+
+@migration
+def compact_anonymous_profiles(dry_run: bool = False, ttl_days: Optional[int] = None) -> Dict[str, int]:
+    """
+    Delete anonymous profiles that have been idle for longer than a TTL.
+
+    A profile is anonymous when no registered User is linked to it. It is
+    idle when its last submission (``last_active_at``) is older than the
+    TTL; profiles from before the column existed have no timestamp and
+    count as idle unless they have a recent test or game result. Each
+    batch of profiles is deleted with all their rows in its own short
+    transaction, so the job can run on a schedule next to live traffic.
+
+    Args:
+        dry_run: Only count the profiles and rows without deleting
+        ttl_days: Idle days before a profile is deleted (default:
+            ``ANONYMOUS_PROFILE_TTL_DAYS``)
+
+    Returns:
+        Dict with the number of profiles and dependent rows deleted
+    """
+    if ttl_days is None:
+        ttl_days = current_app.config.get('ANONYMOUS_PROFILE_TTL_DAYS', DEFAULT_ANONYMOUS_PROFILE_TTL_DAYS)
+    cutoff = datetime.now() - timedelta(days=ttl_days)
+
+    stale = db.session.query(UserProfile.user_id).filter(
+        or_(UserProfile.last_active_at < cutoff, UserProfile.last_active_at.is_(None)),
+        ~exists().where(User.profile_id == UserProfile.user_id),
+        ~exists().where(TypingTest.user_id == UserProfile.user_id, TypingTest.timestamp >= cutoff),
+        ~exists().where(GameResult.user_id == UserProfile.user_id, GameResult.timestamp >= cutoff))
+
+    profiles = rows = 0
+    last_id = ''
+    while True:
+        query = stale.filter(UserProfile.user_id > last_id).order_by(UserProfile.user_id).limit(COMPACTION_BATCH_SIZE)
+        if not dry_run:
+            # Skip profiles a concurrent submission is updating; the next run catches them if still idle
+            query = query.with_for_update(skip_locked=True)
+        user_ids = [user_id for (user_id,) in query]
+        if not user_ids:
+            break
+        last_id = user_ids[-1]
+
+        test_ids = select(TypingTest.id).where(TypingTest.user_id.in_(user_ids))
+        # Children first, so the deletes also hold where foreign keys are enforced
+        statements = [
+            delete(TestAnalysis).where(TestAnalysis.test_id.in_(test_ids)),
+            delete(TypingTest).where(TypingTest.user_id.in_(user_ids)),
+            delete(GameResult).where(GameResult.user_id.in_(user_ids)),
+            delete(LessonProgress).where(LessonProgress.user_id.in_(user_ids)),
+            delete(PredictorState).where(PredictorState.user_id.in_(user_ids)),
+            delete(ErrorEvent).where(ErrorEvent.user_id.in_(user_ids)),
+        ]
+        if dry_run:
+            for statement in statements:
+                rows += db.session.scalar(select(func.count()).select_from(statement.table).where(
+                    statement.whereclause))
+            db.session.rollback()
+        else:
+            for statement in statements:
+                rows += db.session.execute(statement).rowcount
+            db.session.execute(delete(UserProfile).where(UserProfile.user_id.in_(user_ids)))
+            db.session.commit()
+        profiles += len(user_ids)
+
+    result = {'profiles_deleted': profiles, 'rows_deleted': rows}
+    logger.info(f"Compacted anonymous profiles idle for {ttl_days} days: {result}")
+    return result
+
+
+@migration
+def upgrade(dry_run: bool = False) -> Dict[str, int]:
+    """
+    Bring the schema up to date: create missing tables, columns and indexes.
+
+    ``create_app`` runs this at startup unless ``SCHEMA_AUTO_CREATE`` is
+    off; such deployments run it at deploy time instead.
+
+    Args:
+        dry_run: Only count what is missing
+
+    Returns:
+        Dict with the number of tables, columns and indexes created
+    """
+    tables = set(db.metadata.tables) - set(inspect(db.engine).get_table_names())
+    if tables:
+        logger.info(f"{'Missing' if dry_run else 'Creating'} tables {', '.join(sorted(tables))}")
+        if not dry_run:
+            db.create_all()
+
+    result = {'tables_created': len(tables)}
+    result.update(add_missing_columns(dry_run=dry_run))
+    result.update(create_missing_indexes(dry_run=dry_run))
+    logger.info(f"Upgraded schema: {result}")
+    return result
+
+
+def main(argv=None) -> int:
+    """Run a migration from the command line."""
+    parser = argparse.ArgumentParser(description="Run a TypeMaster data migration.")
+    parser.add_argument('migration', choices=sorted(MIGRATIONS))
+    parser.add_argument('--dry-run', action='store_true',
+                        help="Report what would change without writing")
+    args = parser.parse_args(argv)
+
+    from app import create_app
+
+    # The migration itself decides what to create
+    app = create_app({'SCHEMA_AUTO_CREATE': False})
+    with app.app_context():
+        result = MIGRATIONS[args.migration](dry_run=args.dry_run)
+
+    for key, value in result.items():
+        print(f"{key}: {value}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
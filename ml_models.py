@@ -1,63 +1,107 @@
 import numpy as np
-from typing import List, Dict, Any, Optional
-from sklearn.linear_model import LinearRegression
+from types import MappingProxyType
+from typing import List, Dict, Any, Optional, Union, Tuple, Mapping, Sequence
 import logging
 
 logger = logging.getLogger(__name__)
 
-class WPMPredictor:
-    """Class for predicting typing speed (WPM) using machine learning."""
+class WPMRunningStats:
+    """
+    Sufficient statistics for a user's WPM trend, updated in O(1) per test.
+    
+    Tests are indexed 0..n-1 in the order they were taken (the regression
+    feature used by WPMPredictor). Means and co-moments are maintained
+    with Welford's method, which gives the least-squares slope and
+    intercept as well as the WPM mean and variance without revisiting
+    the history.
+    """
+    
+    RECENT_WINDOW = 5
     
-    def __init__(self):
-        """Initialize the WPM predictor."""
-        self.model = LinearRegression()
-        self.is_trained = False
+    def __init__(self, n: int = 0, mean_x: float = 0.0, mean_y: float = 0.0,
+                 m2_x: float = 0.0, m2_y: float = 0.0, c_xy: float = 0.0,
+                 recent: Optional[List[float]] = None):
+        """Initialize the statistics (all zero for a user without tests)."""
+        self.n = n
+        self.mean_x = mean_x
+        self.mean_y = mean_y
+        self.m2_x = m2_x
+        self.m2_y = m2_y
+        self.c_xy = c_xy
+        self.recent = list(recent or [])
     
-    def _prepare_training_data(self, historical_wpm: List[Dict[str, Any]]) -> np.ndarray:
+    @classmethod
+    def from_history(cls, historical_wpm: List[Dict[str, Any]]) -> 'WPMRunningStats':
         """
-        Prepare training data from historical WPM data.
+        Build the statistics from a full WPM history.
         
         Args:
             historical_wpm: List of dictionaries with 'timestamp' and 'wpm' keys
             
         Returns:
-            X: Feature array for training
-            y: Target array for training
+            WPMRunningStats for the history
         """
-        if not historical_wpm or len(historical_wpm) < 3:
-            return None, None
-        
-        # For simplicity, we'll use the index as a feature
-        # In a real application, we might use more features
-        X = np.array(range(len(historical_wpm))).reshape(-1, 1)
-        y = np.array([entry['wpm'] for entry in historical_wpm])
-        
-        return X, y
+        stats = cls()
+        for entry in historical_wpm:
+            stats.update(entry['wpm'])
+        return stats
     
-    def train(self, historical_wpm: List[Dict[str, Any]]) -> bool:
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> 'WPMRunningStats':
+        """Restore statistics saved with to_dict()."""
+        return cls(**data) if data else cls()
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize the statistics for storage."""
+        return {
+            'n': self.n,
+            'mean_x': self.mean_x,
+            'mean_y': self.mean_y,
+            'm2_x': self.m2_x,
+            'm2_y': self.m2_y,
+            'c_xy': self.c_xy,
+            'recent': list(self.recent)
+        }
+    
+    def update(self, wpm: float) -> None:
         """
-        Train the WPM prediction model with historical data.
+        Add the result of a new test.
         
         Args:
-            historical_wpm: List of dictionaries with 'timestamp' and 'wpm' keys
-            
-        Returns:
-            bool: True if training was successful, False otherwise
+            wpm: WPM of the new test
         """
-        X, y = self._prepare_training_data(historical_wpm)
-        
-        if X is None or len(X) < 3:
-            self.is_trained = False
-            return False
-        
-        try:
-            self.model.fit(X, y)
-            self.is_trained = True
-            return True
-        except Exception as e:
-            logger.error(f"Error training WPM model: {e}")
-            self.is_trained = False
-            return False
+        x = self.n
+        self.n += 1
+        dx = x - self.mean_x
+        dy = wpm - self.mean_y
+        self.mean_x += dx / self.n
+        self.mean_y += dy / self.n
+        self.m2_x += dx * (x - self.mean_x)
+        self.m2_y += dy * (wpm - self.mean_y)
+        self.c_xy += dx * (wpm - self.mean_y)
+        
+        self.recent.append(wpm)
+        if len(self.recent) > self.RECENT_WINDOW:
+            del self.recent[0]
+    
+    @property
+    def slope(self) -> float:
+        """Least-squares slope of WPM against test index."""
+        return self.c_xy / self.m2_x if self.m2_x > 0 else 0.0
+    
+    @property
+    def intercept(self) -> float:
+        """Least-squares intercept of WPM against test index."""
+        return self.mean_y - self.slope * self.mean_x
+    
+    @property
+    def variance(self) -> float:
+        """Population variance of WPM."""
+        return self.m2_y / self.n if self.n else 0.0
+
+
+class WPMPredictor:
+    """Class for predicting typing speed (WPM) using machine learning."""
     
     def predict_future_wpm(self, historical_wpm: List[Dict[str, Any]], 
                           time_ahead: int = 5) -> Dict[str, Any]:
@@ -71,7 +115,20 @@ class WPMPredictor:
         Returns:
             Dict with prediction results
         """
-        if not historical_wpm:
+        return self.predict_from_stats(WPMRunningStats.from_history(historical_wpm), time_ahead)
+    
+    def predict_from_stats(self, stats: WPMRunningStats, time_ahead: int = 5) -> Dict[str, Any]:
+        """
+        Predict future WPM from a user's running statistics in constant time.
+        
+        Args:
+            stats: The user's WPMRunningStats
+            time_ahead: Number of future tests to predict
+            
+        Returns:
+            Dict with prediction results
+        """
+        if not stats.n:
             return {
                 'status': 'insufficient_data',
                 'message': 'Not enough historical data for prediction',
@@ -79,15 +136,13 @@ class WPMPredictor:
                 'predicted': 0
             }
         
-        # Calculate current average WPM
-        recent_wpm = [entry['wpm'] for entry in historical_wpm[-5:]] if len(historical_wpm) >= 5 else [entry['wpm'] for entry in historical_wpm]
-        current_avg = sum(recent_wpm) / len(recent_wpm)
+        # Calculate current average WPM over the most recent tests
+        current_avg = sum(stats.recent) / len(stats.recent)
         
-        # Try to train the model if we have enough data
-        if self.train(historical_wpm):
-            X, _ = self._prepare_training_data(historical_wpm)
-            next_point = np.array([[len(X) + time_ahead - 1]])
-            predicted_wpm = self.model.predict(next_point)[0]
+        # Linear regression on test index needs at least 3 data points
+        if stats.n >= 3:
+            next_point = stats.n + time_ahead - 1
+            predicted_wpm = stats.intercept + stats.slope * next_point
             
             # Calculate improvement percentage
             improvement = ((predicted_wpm - current_avg) / current_avg) * 100 if current_avg > 0 else 0
@@ -97,7 +152,7 @@ class WPMPredictor:
                 'current_avg': round(current_avg, 2),
                 'predicted': round(predicted_wpm, 2),
                 'improvement': round(improvement, 2),
-                'confidence': self._calculate_confidence(historical_wpm)
+                'confidence': self._calculate_confidence(stats)
             }
         else:
             # If we can't train a model, use simple averaging
@@ -112,14 +167,39 @@ class WPMPredictor:
     
     def predict_current_test_wpm(self, current_wpm: float, 
                                keystroke_data: List[Dict[str, Any]],
-                               historical_wpm: List[Dict[str, Any]]) -> float:
+                               historical_wpm: Union[List[Dict[str, Any]], WPMRunningStats]) -> float:
         """
         Predict WPM for the current typing test based on partial data.
         
         Args:
             current_wpm: Current WPM based on partial typing
             keystroke_data: List of keystroke timing data
-            historical_wpm: List of historical WPM data
+            historical_wpm: List of historical WPM data or the user's WPMRunningStats
+            
+        Returns:
+            Predicted final WPM for the current test
+        """
+        if isinstance(historical_wpm, WPMRunningStats):
+            stats = historical_wpm
+        else:
+            stats = WPMRunningStats.from_history(historical_wpm or [])
+        
+        timestamps = [k.get('timestamp', 0) for k in keystroke_data if k.get('timestamp')] if keystroke_data else []
+        return self.predict_from_timestamps(current_wpm, timestamps, len(keystroke_data or []), stats)
+    
+    def predict_from_timestamps(self, current_wpm: float, timestamps: Sequence[float],
+                                keystroke_count: int, stats: WPMRunningStats) -> float:
+        """
+        Predict WPM for the current typing test from its keystroke timestamps.
+        
+        Runs in constant time for any indexable sequence of timestamps, so
+        live sessions can call it after every appended batch.
+        
+        Args:
+            current_wpm: Current WPM based on partial typing
+            timestamps: Non-zero keystroke timestamps in order
+            keystroke_count: Total number of keystrokes recorded
+            stats: The user's WPMRunningStats
             
         Returns:
             Predicted final WPM for the current test
@@ -128,54 +208,49 @@ class WPMPredictor:
         predicted_wpm = current_wpm
         
         # Factor 1: Typing pattern from keystroke data
-        if keystroke_data and len(keystroke_data) > 10:
-            # Calculate if the user is slowing down or speeding up
-            timestamps = [k.get('timestamp', 0) for k in keystroke_data if k.get('timestamp')]
-            if len(timestamps) >= 10:
-                first_half = timestamps[:len(timestamps)//2]
-                second_half = timestamps[len(timestamps)//2:]
-                
-                if first_half and second_half:
-                    first_avg_interval = sum(first_half[i+1] - first_half[i] for i in range(len(first_half)-1)) / (len(first_half)-1)
-                    second_avg_interval = sum(second_half[i+1] - second_half[i] for i in range(len(second_half)-1)) / (len(second_half)-1)
-                    
-                    if first_avg_interval > 0 and second_avg_interval > 0:
-                        # If intervals are decreasing (faster typing), adjust prediction up
-                        interval_ratio = first_avg_interval / second_avg_interval
-                        predicted_wpm *= min(1.5, interval_ratio)
+        if keystroke_count > 10 and len(timestamps) >= 10:
+            # Calculate if the user is slowing down or speeding up. Consecutive
+            # differences telescope, so each half's average interval only
+            # needs the first and last timestamp of that half.
+            half = len(timestamps) // 2
+            first_avg_interval = (timestamps[half - 1] - timestamps[0]) / (half - 1)
+            second_avg_interval = (timestamps[-1] - timestamps[half]) / (len(timestamps) - half - 1)
+            
+            if first_avg_interval > 0 and second_avg_interval > 0:
+                # If intervals are decreasing (faster typing), adjust prediction up
+                interval_ratio = first_avg_interval / second_avg_interval
+                predicted_wpm *= min(1.5, interval_ratio)
         
         # Factor 2: Historical performance patterns
-        if historical_wpm and len(historical_wpm) >= 3:
+        if stats.n >= 3:
             # Use historical average completion pattern
-            historical_avg = sum(entry['wpm'] for entry in historical_wpm) / len(historical_wpm)
+            historical_avg = stats.mean_y
             
             # Blend predictions (70% current pace, 30% historical pattern)
             predicted_wpm = (0.7 * predicted_wpm) + (0.3 * historical_avg)
         
         return round(predicted_wpm, 2)
     
-    def _calculate_confidence(self, historical_wpm: List[Dict[str, Any]]) -> float:
+    def _calculate_confidence(self, stats: WPMRunningStats) -> float:
         """
         Calculate confidence level for the prediction.
         
         Args:
-            historical_wpm: List of historical WPM data
+            stats: The user's WPMRunningStats
             
         Returns:
             Confidence score between 0 and 1
         """
-        if not self.is_trained or not historical_wpm:
+        if not stats.n:
             return 0.0
         
         # More data points = higher confidence, up to a point
-        data_points = min(len(historical_wpm) / 10, 1.0)
+        data_points = min(stats.n / 10, 1.0)
         
         # Check consistency of historical data
-        wpm_values = [entry['wpm'] for entry in historical_wpm]
-        if len(wpm_values) >= 3:
-            mean_wpm = sum(wpm_values) / len(wpm_values)
-            variance = sum((x - mean_wpm) ** 2 for x in wpm_values) / len(wpm_values)
-            std_dev = variance ** 0.5
+        if stats.n >= 3:
+            mean_wpm = stats.mean_y
+            std_dev = stats.variance ** 0.5
             
             # Lower variance = higher confidence
             # Normalize by mean to get coefficient of variation
@@ -189,65 +264,209 @@ class WPMPredictor:
         return round(confidence, 2)
 
 
+def _sequential_sum(values: np.ndarray) -> float:
+    """
+    Sum an array left to right, like the builtin ``sum``.
+    
+    ``np.sum`` uses pairwise summation, which can differ from ``sum`` in
+    the last bits; the last running sum matches it exactly.
+    """
+    return float(np.cumsum(values)[-1]) if len(values) else 0.0
+
+
+class KeystrokeArrays:
+    """
+    Keystroke events converted once into compact arrays for vectorized analysis.
+    
+    Attributes:
+        timestamps: float64 timestamps, 0 where an event has none
+        key_ids: Index into ``keys`` for each event
+        keys: Distinct keys in order of first appearance; ``keys[0]`` is ''
+            and stands for events without a key
+    """
+    
+    __slots__ = ('timestamps', 'key_ids', 'keys')
+    
+    def __init__(self, timestamps: np.ndarray, key_ids: np.ndarray, keys: List[str]):
+        self.timestamps = timestamps
+        self.key_ids = key_ids
+        self.keys = keys
+    
+    @classmethod
+    def from_events(cls, keystroke_data: List[Dict[str, Any]]) -> 'KeystrokeArrays':
+        """
+        Build arrays from keystroke dicts as recorded by the client.
+        
+        Args:
+            keystroke_data: List of keystroke events with timestamps and keys
+            
+        Returns:
+            KeystrokeArrays for the events
+        """
+        timestamps = np.array([k.get('timestamp') or 0 for k in keystroke_data], dtype=np.float64)
+        key_index = {'': 0}
+        key_ids = np.array([key_index.setdefault(k.get('key') or '', len(key_index))
+                            for k in keystroke_data], dtype=np.intp)
+        return cls(timestamps, key_ids, list(key_index))
+    
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+
+class KeystrokeBaseline:
+    """
+    Immutable baseline of a user's average keystroke interval per key.
+    
+    Updating a baseline returns a new instance, so one can be shared
+    between threads without locking.
+    """
+    
+    __slots__ = ('intervals', 'established')
+    
+    def __init__(self, intervals: Optional[Dict[str, float]] = None, established: bool = False):
+        """
+        Initialize the baseline.
+        
+        Args:
+            intervals: Average interval per key
+            established: Whether enough keys have been measured
+        """
+        object.__setattr__(self, 'intervals', MappingProxyType(dict(intervals or {})))
+        object.__setattr__(self, 'established', established)
+    
+    def __setattr__(self, name, value):
+        raise AttributeError("KeystrokeBaseline is immutable")
+    
+    def updated(self, key_intervals: Dict[str, List[float]]) -> 'KeystrokeBaseline':
+        """
+        Return a new baseline that includes intervals from another test.
+        
+        Args:
+            key_intervals: Dict mapping keys to their timing intervals
+            
+        Returns:
+            The updated KeystrokeBaseline
+        """
+        return self.updated_with_means({key: (len(key_times), sum(key_times) / len(key_times))
+                                        for key, key_times in key_intervals.items() if key_times})
+    
+    def updated_with_means(self, key_means: Dict[str, Tuple[int, float]]) -> 'KeystrokeBaseline':
+        """
+        Return a new baseline that includes per-key averages from another test.
+        
+        Args:
+            key_means: Dict mapping keys to (sample count, average interval)
+            
+        Returns:
+            The updated KeystrokeBaseline
+        """
+        intervals = dict(self.intervals)
+        for key, (count, mean) in key_means.items():
+            if count >= 5:  # Only establish baseline with enough samples
+                intervals[key] = mean
+        
+        # Need baselines for at least 10 keys
+        return KeystrokeBaseline(intervals, self.established or len(intervals) >= 10)
+
+
 class KeystrokeDynamicsAnalyzer:
-    """Class for analyzing keystroke dynamics patterns."""
+    """
+    Class for analyzing keystroke dynamics patterns.
     
-    def __init__(self):
-        """Initialize the keystroke dynamics analyzer."""
-        self.baseline_intervals = {}  # Average intervals per key
-        self.baseline_established = False
+    An analyzer never mutates itself: it is bound to an immutable
+    KeystrokeBaseline and reports the updated baseline alongside each
+    analysis, so instances are safe to share between threads.
+    """
     
-    def analyze(self, keystroke_data: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def __init__(self, baseline: Optional[KeystrokeBaseline] = None):
+        """
+        Initialize the keystroke dynamics analyzer.
+        
+        Args:
+            baseline: The user's baseline (empty if not given)
+        """
+        self.baseline = baseline if baseline is not None else KeystrokeBaseline()
+    
+    @property
+    def baseline_intervals(self) -> Mapping[str, float]:
+        """Average intervals per key (read-only)."""
+        return self.baseline.intervals
+    
+    @property
+    def baseline_established(self) -> bool:
+        """Whether the baseline covers enough keys."""
+        return self.baseline.established
+    
+    def analyze(self, keystroke_data: Union[List[Dict[str, Any]], KeystrokeArrays]) -> Dict[str, Any]:
         """
         Analyze keystroke dynamics from typing test data.
         
         Args:
-            keystroke_data: List of keystroke events with timestamps and keys
+            keystroke_data: List of keystroke events with timestamps and keys,
+                or KeystrokeArrays
             
         Returns:
             Dict with keystroke dynamics analysis
         """
+        return self.analyze_with_baseline(keystroke_data)[0]
+    
+    def analyze_with_baseline(self, keystroke_data: Union[List[Dict[str, Any]], KeystrokeArrays]
+                              ) -> Tuple[Dict[str, Any], KeystrokeBaseline]:
+        """
+        Analyze keystroke dynamics and compute the resulting baseline.
+        
+        Args:
+            keystroke_data: List of keystroke events with timestamps and keys,
+                or the same events already converted to KeystrokeArrays
+            
+        Returns:
+            Tuple of (analysis dict, updated baseline). The baseline is
+            ``self.baseline`` itself when nothing changed.
+        """
         if not keystroke_data or len(keystroke_data) < 10:
             return {
                 'status': 'insufficient_data',
                 'message': 'Not enough keystroke data for analysis'
-            }
-        
-        # Calculate intervals between keystrokes
-        intervals = []
-        key_intervals = {}
+            }, self.baseline
         
-        for i in range(1, len(keystroke_data)):
-            prev = keystroke_data[i-1]
-            curr = keystroke_data[i]
-            
-            if prev.get('timestamp') and curr.get('timestamp'):
-                interval = curr['timestamp'] - prev['timestamp']
-                key = curr.get('key', '')
-                
-                # Filter out extremely long pauses (e.g., user took a break)
-                if interval < 5000:  # 5 seconds max
-                    intervals.append(interval)
-                    
-                    if key:
-                        if key not in key_intervals:
-                            key_intervals[key] = []
-                        key_intervals[key].append(interval)
+        if isinstance(keystroke_data, KeystrokeArrays):
+            arrays = keystroke_data
+        else:
+            arrays = KeystrokeArrays.from_events(keystroke_data)
+        
+        # Calculate intervals between keystrokes. A pair only counts when both
+        # keystrokes have a timestamp; extremely long pauses (e.g. the user
+        # took a break) are filtered out
+        timestamps = arrays.timestamps
+        has_timestamp = timestamps != 0
+        intervals = np.diff(timestamps)
+        kept = has_timestamp[:-1] & has_timestamp[1:] & (intervals < 5000)  # 5 seconds max
+        intervals = intervals[kept]
+        interval_keys = arrays.key_ids[1:][kept]
+        
+        # Group intervals by key (id 0 is "no key"), in order of first appearance
+        keyed = interval_keys != 0
+        key_counts = np.bincount(interval_keys[keyed], minlength=len(arrays.keys))
+        key_sums = np.bincount(interval_keys[keyed], weights=intervals[keyed], minlength=len(arrays.keys))
+        first_seen = np.full(len(arrays.keys), len(interval_keys))
+        np.minimum.at(first_seen, interval_keys[keyed], np.flatnonzero(keyed))
+        key_order = np.argsort(first_seen, kind='stable')
+        key_order = key_order[first_seen[key_order] < len(interval_keys)]
         
         # Update baseline if needed
-        if not self.baseline_established and len(keystroke_data) > 50:
-            self._update_baseline(key_intervals)
+        baseline = self.baseline
+        if not baseline.established and len(keystroke_data) > 50:
+            baseline = baseline.updated_with_means(
+                {arrays.keys[k]: (int(key_counts[k]), key_sums[k] / key_counts[k]) for k in key_order})
         
         # Calculate average interval
-        avg_interval = sum(intervals) / len(intervals) if intervals else 0
+        avg_interval = _sequential_sum(intervals) / len(intervals) if len(intervals) else 0
         
-        # Find keys with slow typing
-        slow_keys = []
-        for key, key_times in key_intervals.items():
-            if len(key_times) >= 3:  # Only consider keys with enough data
-                avg_key_time = sum(key_times) / len(key_times)
-                if avg_key_time > (avg_interval * 1.5):  # If 50% slower than average
-                    slow_keys.append(key)
+        # Find keys with slow typing: enough data and 50% slower than average
+        with np.errstate(divide='ignore', invalid='ignore'):
+            key_means = key_sums / key_counts
+        slow = (key_counts >= 3) & (key_means > avg_interval * 1.5)
+        slow_keys = [arrays.keys[k] for k in key_order if slow[k]]
         
         # Calculate typing rhythm consistency
         rhythm_consistency = self._calculate_rhythm_consistency(intervals)
@@ -263,37 +482,23 @@ class KeystrokeDynamicsAnalyzer:
             'fatigue_detected': fatigue_detected,
             'fatigue_point': fatigue_point if fatigue_detected else None,
             'total_keystrokes': len(keystroke_data)
-        }
-    
-    def _update_baseline(self, key_intervals: Dict[str, List[float]]) -> None:
-        """
-        Update baseline intervals for each key.
-        
-        Args:
-            key_intervals: Dict mapping keys to their timing intervals
-        """
-        for key, intervals in key_intervals.items():
-            if len(intervals) >= 5:  # Only establish baseline with enough samples
-                self.baseline_intervals[key] = sum(intervals) / len(intervals)
-        
-        if len(self.baseline_intervals) >= 10:  # Need baselines for at least 10 keys
-            self.baseline_established = True
+        }, baseline
     
-    def _calculate_rhythm_consistency(self, intervals: List[float]) -> float:
+    def _calculate_rhythm_consistency(self, intervals: np.ndarray) -> float:
         """
         Calculate typing rhythm consistency based on interval variance.
         
         Args:
-            intervals: List of time intervals between keystrokes
+            intervals: Array of time intervals between keystrokes
             
         Returns:
             Consistency score between 0 and 100
         """
-        if not intervals or len(intervals) < 5:
+        if len(intervals) < 5:
             return 50.0  # Neutral score for insufficient data
         
-        mean = sum(intervals) / len(intervals)
-        variance = sum((x - mean) ** 2 for x in intervals) / len(intervals)
+        mean = _sequential_sum(intervals) / len(intervals)
+        variance = _sequential_sum((intervals - mean) ** 2) / len(intervals)
         std_dev = variance ** 0.5
         
         # Calculate coefficient of variation (normalized standard deviation)
@@ -305,26 +510,24 @@ class KeystrokeDynamicsAnalyzer:
         
         return consistency
     
-    def _detect_fatigue(self, intervals: List[float]) -> tuple:
+    def _detect_fatigue(self, intervals: np.ndarray) -> tuple:
         """
         Detect signs of typing fatigue based on interval patterns.
         
         Args:
-            intervals: List of time intervals between keystrokes
+            intervals: Array of time intervals between keystrokes
             
         Returns:
             Tuple of (fatigue_detected, fatigue_point)
         """
-        if not intervals or len(intervals) < 20:
+        if len(intervals) < 20:
             return False, None
         
-        # Use moving average to smooth the data
+        # Use moving average to smooth the data, computed from a running sum
+        # instead of re-summing every window
         window_size = min(10, len(intervals) // 5)
-        moving_avgs = []
-        
-        for i in range(len(intervals) - window_size + 1):
-            window = intervals[i:i+window_size]
-            moving_avgs.append(sum(window) / window_size)
+        running = np.concatenate(([0.0], np.cumsum(intervals)))
+        moving_avgs = (running[window_size:] - running[:-window_size]) / window_size
         
         # Check if intervals are consistently increasing (sign of fatigue)
         fatigue_threshold = 1.3  # 30% increase in typing interval
@@ -333,18 +536,18 @@ class KeystrokeDynamicsAnalyzer:
         first_quarter = moving_avgs[:len(moving_avgs)//4]
         last_quarter = moving_avgs[-len(moving_avgs)//4:]
         
-        if first_quarter and last_quarter:
-            first_avg = sum(first_quarter) / len(first_quarter)
-            last_avg = sum(last_quarter) / len(last_quarter)
+        if len(first_quarter) and len(last_quarter):
+            first_avg = _sequential_sum(first_quarter) / len(first_quarter)
+            last_avg = _sequential_sum(last_quarter) / len(last_quarter)
             
             if last_avg > (first_avg * fatigue_threshold):
                 # Find approximate point where fatigue begins
                 fatigue_point = None
                 
-                for i in range(len(moving_avgs) // 2, len(moving_avgs)):
-                    if moving_avgs[i] > (first_avg * fatigue_threshold):
-                        fatigue_point = i / len(moving_avgs)  # As percentage through the test
-                        break
+                start = len(moving_avgs) // 2
+                above = np.flatnonzero(moving_avgs[start:] > (first_avg * fatigue_threshold))
+                if len(above):
+                    fatigue_point = (start + int(above[0])) / len(moving_avgs)  # As percentage through the test
                 
                 return True, fatigue_point
         
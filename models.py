@@ -1,36 +1,194 @@
 import os
-import json 
+import time
+import functools
+import json_codec
 from datetime import datetime
-from typing import List, Dict, Any, Optional
-from sqlalchemy import Column, String, Float, Integer, DateTime, ForeignKey, Text, Boolean
-from sqlalchemy.orm import relationship, declarative_mixin, declared_attr
-from sqlalchemy.ext.mutable import MutableDict, MutableList
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+from sqlalchemy import Column, String, Float, Integer, BigInteger, DateTime, ForeignKey, Text, Boolean, LargeBinary, Index, select, event, and_, or_
+from sqlalchemy.orm import (relationship, declarative_mixin, declared_attr, deferred, undefer_group, Mapper,
+                            Session, scoped_session, sessionmaker)
+from sqlalchemy.engine import Engine
+from flask import Flask, g, has_app_context, has_request_context, session as flask_session
+from flask.globals import app_ctx
+from sqlalchemy.ext.mutable import MutableDict
 from sqlalchemy.types import TypeDecorator
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 
+# Size of the incrementally maintained most_common_errors ranking
+MOST_COMMON_ERRORS_K = 10
+# Number of recent word errors kept in a profile's error statistics
+RECENT_WORD_ERRORS = 50
+
 # Custom JSON type for SQLite
 class JSONEncodedDict(TypeDecorator):
-    """Represents a JSON structure as a text-based column."""
+    """
+    Represents a JSON structure as a text-based column.
+    
+    Encoding goes through json_codec (orjson when installed). Dicts are
+    loaded as EncodedMutableDict, which remembers its JSON text so an
+    unchanged value is not serialized again when it is written back.
+    """
     impl = Text
+    cache_ok = True
 
     def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        encoded = getattr(value, '_encoded', None)
+        if encoded is None:
+            encoded = json_codec.dumps(value)
+            if isinstance(value, EncodedMutableDict):
+                value._encoded = encoded
+        return encoded
+
+    def process_result_value(self, value, dialect):
         if value is not None:
-            value = json.dumps(value)
+            decoded = json_codec.loads(value)
+            if isinstance(decoded, dict):
+                decoded = EncodedMutableDict(decoded)
+                decoded._encoded = value
+            value = decoded
         return value
 
+class EncodedMutableDict(MutableDict):
+    """
+    MutableDict that caches its JSON encoding until it changes.
+    
+    The cache is dropped on every change SQLAlchemy is told about: a
+    top-level mutation (``changed()``) or ``flag_modified`` after a
+    nested one. Columns are only written after one of those (or after
+    being replaced), so a stale encoding is never written.
+    """
+    _encoded = None
+
+    def changed(self):
+        self._encoded = None
+        super().changed()
+
+@event.listens_for(Mapper, 'mapper_configured')
+def _track_encoded_dicts(mapper, class_):
+    """Drop cached encodings when an EncodedMutableDict column is flag_modified."""
+    for prop in mapper.column_attrs:
+        if not any(isinstance(column.type, JSONEncodedDict) for column in prop.columns):
+            continue
+
+        def modified(target, initiator, key=prop.key):
+            value = target.__dict__.get(key)
+            if isinstance(value, EncodedMutableDict):
+                value._encoded = None
+
+        event.listen(getattr(class_, prop.key), 'modified', modified)
+
+# Compact binary type for keystroke events
+class KeystrokeBlob(TypeDecorator):
+    """
+    Stores keystroke events as a columnar binary blob (see keystroke_codec).
+    
+    Accepts a list of keystroke dicts or a KeystrokeLog and loads a
+    KeystrokeLog, which is only decoded when it is used. Rows still
+    holding the legacy JSON text are read transparently.
+    """
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        # Imported here: the codec loads numpy, which importing the models should not
+        from keystroke_codec import KeystrokeLog
+        if value is None:
+            return None
+        if not isinstance(value, KeystrokeLog):
+            value = KeystrokeLog.from_events(value)
+        return value.blob
+
     def process_result_value(self, value, dialect):
+        from keystroke_codec import KeystrokeLog
         if value is not None:
-            value = json.loads(value)
+            value = KeystrokeLog.from_storage(value)
         return value
 
 # Initialize SQLAlchemy
 db = SQLAlchemy()
 
+
+class ReadPool:
+    """
+    Routes the reads of read-only requests to a separate engine.
+    
+    Views marked ``read_only`` query through ``read_session()``, which is
+    a session on the read engine (separate read-only connections to the
+    SQLite WAL file, or a replica) unless the request has written through
+    ``db.session`` or the user wrote within the last
+    ``READ_AFTER_WRITE_SECONDS``; then it is ``db.session`` itself, so a
+    user always reads their own writes. Without a read engine every read
+    goes to ``db.session``.
+    """
+    
+    def __init__(self):
+        self.engine: Optional[Engine] = None
+        self.read_after_write = 0.0
+        self._sessions: Optional[scoped_session] = None
+    
+    def init_app(self, app: Flask, engine: Engine) -> None:
+        """
+        Route an app's read-only requests to an engine.
+        
+        Args:
+            app: Flask app
+            engine: Engine for read-only queries
+        """
+        self.engine = engine
+        self.read_after_write = float(app.config.get("READ_AFTER_WRITE_SECONDS", 5))
+        # One session per app context, like db.session
+        self._sessions = scoped_session(sessionmaker(bind=engine),
+                                        scopefunc=lambda: id(app_ctx._get_current_object()))
+        app.teardown_appcontext(self._remove_session)
+    
+    def _remove_session(self, exc: Optional[BaseException]) -> None:
+        self._sessions.remove()
+    
+    def session(self) -> Session:
+        """Return the session the current request should read through."""
+        if (self._sessions is None or not has_app_context() or not g.get('_read_only')
+                or db.session().info.get('wrote')):
+            return db.session
+        if has_request_context() and time.time() - flask_session.get('_wrote_at', 0) < self.read_after_write:
+            return db.session
+        return self._sessions()
+
+
+read_pool = ReadPool()
+
+
+def read_session() -> Session:
+    """Return the session for read-only queries in the current request."""
+    return read_pool.session()
+
+
+def read_only(view):
+    """Mark a view as read-only, so its queries may use the read pool."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        g._read_only = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@event.listens_for(db.session, 'after_flush')
+def _record_write(session, flush_context):
+    """Remember that this request, and its user, wrote to the primary."""
+    session.info['wrote'] = True
+    if has_request_context():
+        flask_session['_wrote_at'] = time.time()
+
 class TypingTest(db.Model):
     """Model for storing typing test data."""
     __tablename__ = 'typing_tests'
+    __table_args__ = (
+        # History reads are range scans over one user's tests in time order
+        Index('ix_typing_tests_user_timestamp', 'user_id', 'timestamp'),
+    )
     
     id = Column(String(36), primary_key=True)
     user_id = Column(String(36), ForeignKey('user_profiles.user_id'))
@@ -41,12 +199,24 @@ class TypingTest(db.Model):
     time_taken = Column(Float)  # in seconds
     difficulty = Column(String(20))
     timestamp = Column(DateTime, default=datetime.now)
-    error_details = Column(MutableDict.as_mutable(JSONEncodedDict), default={})
-    keystroke_data = Column(MutableList.as_mutable(JSONEncodedDict), default=[])
+    # Heavy columns are only fetched when accessed or requested with
+    # TEST_DETAILS / TEST_KEYSTROKES
+    error_details = deferred(Column(EncodedMutableDict.as_mutable(JSONEncodedDict), default={}),
+                             group='details')
+    keystroke_data = deferred(Column(KeystrokeBlob, default=[]), group='keystrokes')
+
+# Query options that load the deferred TypingTest columns up front
+TEST_DETAILS = undefer_group('details')
+TEST_KEYSTROKES = undefer_group('keystrokes')
 
 class GameResult(db.Model):
     """Model for storing game results."""
     __tablename__ = 'game_results'
+    __table_args__ = (
+        Index('ix_game_results_user_timestamp', 'user_id', 'timestamp'),
+        # A game token can only be submitted once
+        Index('ix_game_results_game_seed', 'game_seed', unique=True),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(String(36), ForeignKey('user_profiles.user_id'))
@@ -55,6 +225,37 @@ class GameResult(db.Model):
     accuracy = Column(Float)
     timestamp = Column(DateTime, default=datetime.now)
     difficulty = Column(String(20))
+    # Seed of the game's token; NULL for results submitted before tokens
+    game_seed = Column(BigInteger)
+
+class TestAnalysis(db.Model):
+    """Model for storing the background analysis of a typing test."""
+    __tablename__ = 'test_analyses'
+    
+    test_id = Column(String(36), ForeignKey('typing_tests.id'), primary_key=True)
+    status = Column(String(20))  # complete or failed
+    result = Column(EncodedMutableDict.as_mutable(JSONEncodedDict), default={})
+    completed_at = Column(DateTime, default=datetime.now)
+
+class PredictorState(db.Model):
+    """Model for storing a user's running WPM regression statistics."""
+    __tablename__ = 'predictor_states'
+    
+    user_id = Column(String(36), ForeignKey('user_profiles.user_id'), primary_key=True)
+    stats = Column(EncodedMutableDict.as_mutable(JSONEncodedDict), default={})
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+class ErrorEvent(db.Model):
+    """Model for storing how often a user made a character error."""
+    __tablename__ = 'error_events'
+    __table_args__ = (
+        Index('ix_error_events_user_count', 'user_id', 'count'),
+    )
+    
+    user_id = Column(String(36), ForeignKey('user_profiles.user_id'), primary_key=True)
+    char_pair = Column(String(64), primary_key=True)  # e.g. "a->s", "∅->x"
+    count = Column(Integer, default=0, nullable=False)
+    last_seen = Column(DateTime, default=datetime.now)
 
 class User(UserMixin, db.Model):
     """User model for authentication."""
@@ -87,6 +288,9 @@ class User(UserMixin, db.Model):
 class LessonProgress(db.Model):
     """Model for storing lesson progress."""
     __tablename__ = 'lesson_progress'
+    __table_args__ = (
+        Index('ix_lesson_progress_user_lesson', 'user_id', 'lesson_id'),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(String(36), ForeignKey('user_profiles.user_id'))
@@ -100,7 +304,9 @@ class UserProfile(db.Model):
     __tablename__ = 'user_profiles'
     
     user_id = Column(String(36), primary_key=True)
-    error_statistics = Column(MutableDict.as_mutable(JSONEncodedDict), default={})
+    error_statistics = Column(EncodedMutableDict.as_mutable(JSONEncodedDict), default={})
+    # Time of the last submission; anonymous profiles idle for too long are compacted away
+    last_active_at = Column(DateTime, default=datetime.now, index=True)
     
     # Relationships
     tests = relationship("TypingTest", backref="user", lazy=True)
@@ -154,40 +360,53 @@ class UserProfile(db.Model):
         
         db.session.commit()
     
-    def update_error_statistics(self, error_data: Dict[str, Any]) -> None:
-        """Update error statistics based on new typing test data."""
-        # Initialize error statistics if not present
-        if not self.error_statistics:
-            self.error_statistics = {
-                'character_errors': {},
-                'word_errors': [],
-                'most_common_errors': {},
-                'total_errors': 0,
-                'total_characters': 0
-            }
+    def update_error_statistics(self, error_data: Dict[str, Any], commit: bool = True) -> None:
+        """
+        Update error statistics based on new typing test data.
+        
+        Character error counts are upserted into ErrorEvent rows; the
+        profile only keeps the top-K most common errors, a bounded window
+        of recent word errors and running totals, so the cost of a
+        submission does not grow with the user's history.
+        """
+        stats = dict(self.error_statistics or {})
+        if 'character_errors' in stats:
+            # Profile still holds the old unbounded blob; move it into the table once
+            stats = self.normalize_error_statistics(stats)
         
         # Update character error counts
-        for char, count in error_data.get('character_errors', {}).items():
-            if char in self.error_statistics['character_errors']:
-                self.error_statistics['character_errors'][char] += count
-            else:
-                self.error_statistics['character_errors'][char] = count
-        
-        # Add word errors
-        self.error_statistics['word_errors'].extend(error_data.get('word_errors', []))
-        
-        # Update total error and character counts
-        self.error_statistics['total_errors'] += error_data.get('total_errors', 0)
-        self.error_statistics['total_characters'] += error_data.get('total_characters', 0)
-        
-        # Recalculate most common errors
-        char_errors = self.error_statistics['character_errors']
-        self.error_statistics['most_common_errors'] = dict(
-            sorted(char_errors.items(), key=lambda x: x[1], reverse=True)[:10]
-        )
+        counts = upsert_error_events(self.user_id, error_data.get('character_errors', {}))
+        
+        # Keep a bounded window of the most recent word errors
+        word_errors = list(stats.get('word_errors', [])) + list(error_data.get('word_errors', []))
+        
+        self.error_statistics = {
+            'word_errors': word_errors[-RECENT_WORD_ERRORS:],
+            'most_common_errors': merge_top_errors(stats.get('most_common_errors', {}), counts),
+            'total_errors': stats.get('total_errors', 0) + error_data.get('total_errors', 0),
+            'total_characters': stats.get('total_characters', 0) + error_data.get('total_characters', 0)
+        }
         
         # Save changes to database
-        db.session.commit()
+        if commit:
+            db.session.commit()
+    
+    def normalize_error_statistics(self, stats: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Move a legacy ``character_errors`` dict into ErrorEvent rows.
+        
+        Args:
+            stats: Error statistics holding a ``character_errors`` dict
+            
+        Returns:
+            The statistics without ``character_errors``, with a recomputed
+            top-K and capped word errors
+        """
+        stats = dict(stats)
+        upsert_error_events(self.user_id, stats.pop('character_errors') or {})
+        stats['most_common_errors'] = top_error_events(self.user_id)
+        stats['word_errors'] = list(stats.get('word_errors', []))[-RECENT_WORD_ERRORS:]
+        return stats
     
     def get_average_wpm(self) -> float:
         """Calculate the average WPM across all tests."""
@@ -203,16 +422,201 @@ class UserProfile(db.Model):
     
     def get_historical_wpm(self) -> List[Dict[str, Any]]:
         """Get historical WPM data for visualization."""
-        tests = TypingTest.query.filter_by(user_id=self.user_id).order_by(TypingTest.timestamp).all()
         return [
-            {'timestamp': test.timestamp.isoformat(), 'wpm': test.wpm}
-            for test in tests
+            {'timestamp': timestamp.isoformat(), 'wpm': wpm}
+            for timestamp, wpm, _ in iter_test_history(self.user_id)
         ]
     
     def get_historical_accuracy(self) -> List[Dict[str, Any]]:
         """Get historical accuracy data for visualization."""
-        tests = TypingTest.query.filter_by(user_id=self.user_id).order_by(TypingTest.timestamp).all()
         return [
-            {'timestamp': test.timestamp.isoformat(), 'accuracy': test.accuracy}
-            for test in tests
+            {'timestamp': timestamp.isoformat(), 'accuracy': accuracy}
+            for timestamp, _, accuracy in iter_test_history(self.user_id)
         ]
+
+
+def iter_test_history(user_id: str, batch_size: int = 1000, start: Optional[datetime] = None,
+                      end: Optional[datetime] = None) -> Iterator[Tuple[datetime, float, float]]:
+    """
+    Stream a user's (timestamp, wpm, accuracy) rows in timestamp order.
+    
+    Only the three scalar columns are selected and rows are fetched in
+    batches without building ORM objects, so the text and keystroke
+    columns are never loaded or decoded. The (user_id, timestamp) index
+    limits the scan to the requested time range.
+    
+    Args:
+        user_id: Unique user identifier
+        batch_size: Number of rows fetched per round trip
+        start: Only tests taken at or after this time
+        end: Only tests taken before this time
+        
+    Yields:
+        Tuples of (timestamp, wpm, accuracy)
+    """
+    stmt = (
+        select(TypingTest.timestamp, TypingTest.wpm, TypingTest.accuracy)
+        .where(TypingTest.user_id == user_id)
+        .order_by(TypingTest.timestamp)
+        .execution_options(yield_per=batch_size)
+    )
+    if start is not None:
+        stmt = stmt.where(TypingTest.timestamp >= start)
+    if end is not None:
+        stmt = stmt.where(TypingTest.timestamp < end)
+    for row in read_session().execute(stmt):
+        yield row.timestamp, row.wpm, row.accuracy
+
+
+def get_test_history_page(user_id: str, limit: int, after: Optional[Tuple[datetime, str]] = None,
+                          start: Optional[datetime] = None,
+                          end: Optional[datetime] = None) -> List[Tuple[str, datetime, float, float]]:
+    """
+    Get one page of a user's tests in (timestamp, id) order.
+    
+    Pages are addressed by the last row of the previous page rather than
+    an offset, so every page is a bounded range scan of the
+    (user_id, timestamp) index however deep it is.
+    
+    Args:
+        user_id: Unique user identifier
+        limit: Maximum number of rows
+        after: (timestamp, id) of the last row of the previous page
+        start: Only tests taken at or after this time
+        end: Only tests taken before this time
+        
+    Returns:
+        List of (id, timestamp, wpm, accuracy) tuples
+    """
+    stmt = (
+        select(TypingTest.id, TypingTest.timestamp, TypingTest.wpm, TypingTest.accuracy)
+        .where(TypingTest.user_id == user_id)
+        .order_by(TypingTest.timestamp, TypingTest.id)
+        .limit(limit)
+    )
+    if after is not None:
+        timestamp, test_id = after
+        # The timestamp bound alone lets the index skip the earlier pages
+        stmt = stmt.where(TypingTest.timestamp >= timestamp, or_(
+            TypingTest.timestamp > timestamp,
+            and_(TypingTest.timestamp == timestamp, TypingTest.id > test_id)))
+    if start is not None:
+        stmt = stmt.where(TypingTest.timestamp >= start)
+    if end is not None:
+        stmt = stmt.where(TypingTest.timestamp < end)
+    return [tuple(row) for row in read_session().execute(stmt)]
+
+
+def get_test_history(user_id: str) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Get a user's WPM and accuracy history with a single query.
+    
+    Args:
+        user_id: Unique user identifier
+        
+    Returns:
+        Dict with 'wpm_history' and 'accuracy_history' lists
+    """
+    wpm_history = []
+    accuracy_history = []
+    for timestamp, wpm, accuracy in iter_test_history(user_id):
+        timestamp = timestamp.isoformat()
+        wpm_history.append({'timestamp': timestamp, 'wpm': wpm})
+        accuracy_history.append({'timestamp': timestamp, 'accuracy': accuracy})
+    return {'wpm_history': wpm_history, 'accuracy_history': accuracy_history}
+
+
+def upsert_error_events(user_id: str, character_errors: Dict[str, int],
+                        seen_at: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    Add character error counts to a user's ErrorEvent rows.
+    
+    Uses a single ``INSERT ... ON CONFLICT DO UPDATE`` on SQLite and
+    PostgreSQL, so the cost depends only on the number of distinct
+    errors in ``character_errors``.
+    
+    Args:
+        user_id: Unique user identifier
+        character_errors: Dict mapping "orig->typed" pairs to counts
+        seen_at: Time of the errors (defaults to now)
+        
+    Returns:
+        Dict mapping each given pair to its new total count
+    """
+    if not character_errors:
+        return {}
+    seen_at = seen_at or datetime.now()
+    rows = [{'user_id': user_id, 'char_pair': pair, 'count': count, 'last_seen': seen_at}
+            for pair, count in character_errors.items()]
+    
+    # The profile may only be staged; foreign keys need it written first
+    db.session.flush()
+    
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(ErrorEvent).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ErrorEvent.user_id, ErrorEvent.char_pair],
+            set_={'count': ErrorEvent.count + stmt.excluded.count,
+                  'last_seen': stmt.excluded.last_seen}
+        ).returning(ErrorEvent.char_pair, ErrorEvent.count)
+        return dict(db.session.execute(stmt).tuples().all())
+    
+    # Other databases: read-modify-write through the session
+    counts = {}
+    for row in rows:
+        event_row = db.session.get(ErrorEvent, (user_id, row['char_pair']))
+        if event_row is None:
+            event_row = ErrorEvent(**row)
+            db.session.add(event_row)
+        else:
+            event_row.count += row['count']
+            event_row.last_seen = seen_at
+        counts[row['char_pair']] = event_row.count
+    return counts
+
+
+def merge_top_errors(top_errors: Dict[str, int], counts: Dict[str, int],
+                     k: int = MOST_COMMON_ERRORS_K) -> Dict[str, int]:
+    """
+    Fold updated error counts into a top-K ranking.
+    
+    Counts only ever grow, so an error outside the top K can only enter
+    it when its own count changes; merging the changed counts into the
+    current top K gives the exact new top K.
+    
+    Args:
+        top_errors: Current top-K ranking, most common first
+        counts: New totals of the errors that changed
+        k: Size of the ranking
+        
+    Returns:
+        The new top-K ranking, most common first
+    """
+    merged = dict(top_errors)
+    merged.update(counts)
+    return dict(sorted(merged.items(), key=lambda x: (-x[1], x[0]))[:k])
+
+
+def top_error_events(user_id: str, k: int = MOST_COMMON_ERRORS_K) -> Dict[str, int]:
+    """
+    Read a user's K most common errors from the ErrorEvent table.
+    
+    Args:
+        user_id: Unique user identifier
+        k: Number of errors to return
+        
+    Returns:
+        Dict mapping error pairs to counts, most common first
+    """
+    rows = db.session.execute(
+        select(ErrorEvent.char_pair, ErrorEvent.count)
+        .where(ErrorEvent.user_id == user_id)
+        .order_by(ErrorEvent.count.desc(), ErrorEvent.char_pair)
+        .limit(k)
+    ).tuples().all()
+    return dict(rows)
@@ -0,0 +1,90 @@
+"""
+NLTK data provisioning.
+
+The app itself does not need NLTK data at startup. Images or hosts that
+do are provisioned once, ahead of time, into a local cache directory:
+
+    python nltk_assets.py [--data-dir DIR] [--offline]
+
+Packages already in the cache are not downloaded again, so the command
+is cheap to rerun and, with ``--offline``, only checks the cache. Code
+that needs a package at runtime calls ``ensure_nltk_data``; ``nltk`` is
+only imported then.
+"""
+import os
+import sys
+import logging
+import argparse
+from typing import Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Package name -> resource path that nltk.data.find looks up
+NLTK_PACKAGES = {
+    'punkt': 'tokenizers/punkt',
+    'wordnet': 'corpora/wordnet',
+}
+DEFAULT_DATA_DIR = 'nltk_data'
+
+
+def data_dir(environ=os.environ) -> str:
+    """Return the cache directory: ``NLTK_DATA`` (its first entry) or ``./nltk_data``."""
+    return (environ.get('NLTK_DATA') or DEFAULT_DATA_DIR).split(os.pathsep)[0]
+
+
+def ensure_nltk_data(packages: Iterable[str] = tuple(NLTK_PACKAGES), directory: Optional[str] = None,
+                     download: bool = True) -> List[str]:
+    """
+    Make NLTK packages available from the local cache.
+
+    Args:
+        packages: Package names (keys of ``NLTK_PACKAGES`` or any NLTK package)
+        directory: Cache directory (default: ``data_dir()``)
+        download: Whether to download packages missing from the cache
+
+    Returns:
+        Names of the packages still missing
+    """
+    import nltk
+
+    directory = directory or data_dir()
+    if directory not in nltk.data.path:
+        nltk.data.path.insert(0, directory)
+
+    missing = []
+    for package in packages:
+        resource = NLTK_PACKAGES.get(package, package)
+        try:
+            nltk.data.find(resource)
+            continue
+        except LookupError:
+            pass
+        if download:
+            os.makedirs(directory, exist_ok=True)
+            logger.info(f"Downloading NLTK package {package} into {directory}")
+            if nltk.download(package, download_dir=directory, quiet=True, raise_on_error=False):
+                continue
+        missing.append(package)
+
+    if missing:
+        logger.warning(f"NLTK packages not available: {', '.join(missing)}")
+    return missing
+
+
+def main(argv=None) -> int:
+    """Provision the NLTK packages from the command line."""
+    parser = argparse.ArgumentParser(description="Provision NLTK data into a local cache.")
+    parser.add_argument('packages', nargs='*', default=list(NLTK_PACKAGES))
+    parser.add_argument('--data-dir', default=None, help=f"Cache directory (default: $NLTK_DATA or {DEFAULT_DATA_DIR})")
+    parser.add_argument('--offline', action='store_true', help="Only check the cache, never download")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    missing = ensure_nltk_data(args.packages, args.data_dir, download=not args.offline)
+    for package in args.packages:
+        print(f"{package}: {'missing' if package in missing else 'ok'}")
+    return 1 if missing else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
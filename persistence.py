@@ -0,0 +1,247 @@
+"""
+Transactional write path for typing test and game submissions.
+
+Each submission is written exactly once: the profile (created on demand),
+the result row and any derived statistics are staged in the session and
+committed together, so a failure leaves nothing half-written.
+"""
+import uuid
+import logging
+from datetime import datetime
+from typing import List, Dict, Any, Iterable, Union
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from models import db, UserProfile, TypingTest, GameResult, PredictorState, get_test_history
+from keystroke_codec import KeystrokeLog
+from ml_models import WPMRunningStats
+
+logger = logging.getLogger(__name__)
+
+
+class DuplicateGameError(Exception):
+    """Raised when a game's result has already been recorded."""
+
+
+def get_or_create_profile(user_id: str) -> UserProfile:
+    """
+    Get a user profile for a write, creating it if it does not exist.
+
+    Anonymous visitors only have a session cookie until their first
+    submission, which creates their profile here. The profile is marked
+    as active now.
+
+    Args:
+        user_id: Unique user identifier
+
+    Returns:
+        UserProfile for the user (flushed but not yet committed if new)
+    """
+    profile = db.session.get(UserProfile, user_id)
+    if profile is None:
+        profile = UserProfile(user_id=user_id, error_statistics={}, last_active_at=datetime.now())
+        db.session.add(profile)
+        # Rows referencing the profile without a relationship (predictor state,
+        # bulk inserted tests) must not reach the database before it
+        db.session.flush()
+        logger.debug(f"Created user profile on first write: {user_id}")
+    else:
+        profile.last_active_at = datetime.now()
+    return profile
+
+
+def update_predictor_state(user_id: str, wpm: float) -> WPMRunningStats:
+    """
+    Fold a new test into the user's running WPM statistics.
+
+    Users without a stored state (tests taken before the statistics were
+    introduced) are seeded from their history first. Must be called
+    before the new test is added to the session.
+
+    Args:
+        user_id: Unique user identifier
+        wpm: WPM of the new test
+        
+    Returns:
+        The updated WPMRunningStats (staged, not committed)
+    """
+    return fold_predictor_state(user_id, [wpm])
+
+
+def fold_predictor_state(user_id: str, wpms: Iterable[float]) -> WPMRunningStats:
+    """
+    Fold several new tests, oldest first, into the user's running WPM statistics.
+
+    Like ``update_predictor_state``, must be called before the new tests
+    are added to the session.
+
+    Args:
+        user_id: Unique user identifier
+        wpms: WPM of each new test
+
+    Returns:
+        The updated WPMRunningStats (staged, not committed)
+    """
+    state = db.session.get(PredictorState, user_id)
+    if state is None:
+        stats = WPMRunningStats.from_history(get_test_history(user_id)['wpm_history'])
+        state = PredictorState(user_id=user_id)
+        db.session.add(state)
+    else:
+        stats = WPMRunningStats.from_dict(state.stats)
+
+    for wpm in wpms:
+        stats.update(wpm)
+    state.stats = stats.to_dict()
+    return stats
+
+
+def record_test_submission(user_id: str, original_text: str, typed_text: str,
+                           wpm: float, accuracy: float, time_taken: float,
+                           difficulty: str, error_analysis: Dict[str, Any],
+                           keystroke_data: Union[List[Dict[str, Any]], KeystrokeLog]) -> TypingTest:
+    """
+    Persist a typing test and its error statistics in a single commit.
+
+    Args:
+        user_id: Unique user identifier
+        original_text: The text that was to be typed
+        typed_text: The text that was actually typed
+        wpm: Calculated words per minute
+        accuracy: Accuracy percentage
+        time_taken: Time taken in seconds
+        difficulty: Difficulty level of the text
+        error_analysis: Result of ``utils.analyze_errors``
+        keystroke_data: Raw keystroke events, or a KeystrokeLog already encoding them
+
+    Returns:
+        The committed TypingTest
+    """
+    try:
+        profile = get_or_create_profile(user_id)
+        update_predictor_state(user_id, wpm)
+
+        typing_test = TypingTest(
+            id=str(uuid.uuid4()),
+            user_id=user_id,
+            original_text=original_text,
+            typed_text=typed_text,
+            wpm=wpm,
+            accuracy=accuracy,
+            time_taken=time_taken,
+            difficulty=difficulty,
+            error_details=error_analysis,
+            keystroke_data=keystroke_data
+        )
+        db.session.add(typing_test)
+
+        profile.update_error_statistics(error_analysis, commit=False)
+
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    logger.debug(f"Saved test result for user {user_id}: WPM={wpm}, Accuracy={accuracy}")
+    return typing_test
+
+
+def record_scored_tests(user_id: str, submissions: List[Dict[str, Any]],
+                        results: List[Dict[str, Any]]) -> List[str]:
+    """
+    Bulk insert scored typing tests and their error statistics in a single commit.
+
+    The rows are written with one multi-row insert and the user's error
+    statistics and WPM statistics are updated once for the whole batch.
+
+    Args:
+        user_id: Unique user identifier
+        submissions: Submissions as accepted by ``batch_scoring.score_submission``
+        results: Their results, scored with ``encode_keystrokes=True``
+
+    Returns:
+        Ids of the inserted tests, in input order
+    """
+    test_ids = [str(uuid.uuid4()) for _ in submissions]
+    rows = []
+    batch_errors = {'character_errors': {}, 'word_errors': [], 'total_characters': 0}
+    for test_id, submission, result in zip(test_ids, submissions, results):
+        error_analysis = result['error_analysis']
+        rows.append({
+            'id': test_id,
+            'user_id': user_id,
+            'original_text': submission.get('original_text', ''),
+            'typed_text': submission.get('typed_text', ''),
+            'wpm': result['wpm'],
+            'accuracy': result['accuracy'],
+            'time_taken': submission.get('time_taken', 0),
+            'difficulty': submission.get('difficulty', 'medium'),
+            'error_details': error_analysis,
+            'keystroke_data': KeystrokeLog.from_storage(result['keystroke_blob'])
+        })
+
+        character_errors = batch_errors['character_errors']
+        for error_char, count in error_analysis.get('character_errors', {}).items():
+            character_errors[error_char] = character_errors.get(error_char, 0) + count
+        batch_errors['word_errors'].extend(error_analysis.get('word_errors', []))
+        batch_errors['total_characters'] += error_analysis.get('total_characters', 0)
+
+    try:
+        profile = get_or_create_profile(user_id)
+        fold_predictor_state(user_id, [result['wpm'] for result in results])
+
+        if rows:
+            db.session.execute(insert(TypingTest), rows)
+
+        profile.update_error_statistics(batch_errors, commit=False)
+
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    logger.debug(f"Saved {len(rows)} scored tests for user {user_id}")
+    return test_ids
+
+
+def record_game_submission(user_id: str, game_data: Dict[str, Any]) -> GameResult:
+    """
+    Persist a typing game result in a single commit.
+
+    Args:
+        user_id: Unique user identifier
+        game_data: Dictionary with score, words_typed, accuracy, difficulty
+            and the seed of the game's token
+
+    Returns:
+        The committed GameResult
+
+    Raises:
+        DuplicateGameError: If a result with the same seed already exists
+    """
+    try:
+        get_or_create_profile(user_id)
+
+        game_result = GameResult(
+            user_id=user_id,
+            score=game_data.get('score', 0),
+            words_typed=game_data.get('words_typed', 0),
+            accuracy=game_data.get('accuracy', 0),
+            difficulty=game_data.get('difficulty', 'medium'),
+            game_seed=game_data.get('seed')
+        )
+        db.session.add(game_result)
+
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        seed = game_data.get('seed')
+        # The unique seed makes a replayed token fail here, in any worker
+        if seed is not None and db.session.scalar(select(GameResult.id).where(GameResult.game_seed == seed)):
+            raise DuplicateGameError("Game has already been submitted")
+        raise
+    except Exception:
+        db.session.rollback()
+        raise
+
+    logger.debug(f"Saved game result for user {user_id}: Score={game_result.score}")
+    return game_result
@@ -0,0 +1,120 @@
+"""
+Registry handing out per-user scorers that are safe to use from many threads.
+
+Scorers never mutate shared state. Each user's keystroke baseline is an
+immutable KeystrokeBaseline; analyzing a test produces a new baseline
+that is published with a copy-on-write compare-and-swap, so concurrent
+requests never see a half-updated baseline or another user's data.
+"""
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Union
+from ml_models import WPMPredictor, KeystrokeDynamicsAnalyzer, KeystrokeBaseline, KeystrokeArrays
+
+logger = logging.getLogger(__name__)
+
+_EMPTY_BASELINE = KeystrokeBaseline()
+
+
+class ScorerRegistry:
+    """Thread-safe source of per-user WPM predictors and keystroke analyzers."""
+
+    def __init__(self, max_users: int = 10000):
+        """
+        Initialize the registry.
+
+        Args:
+            max_users: Maximum number of user baselines kept in memory
+        """
+        self.max_users = max_users
+        self._baselines = OrderedDict()  # user_id -> KeystrokeBaseline
+        self._lock = threading.Lock()
+
+        # WPMPredictor keeps no state between calls, so one instance serves everyone
+        self._predictor = WPMPredictor()
+
+    def predictor_for(self, user_id: str) -> WPMPredictor:
+        """
+        Get the WPM predictor for a user.
+
+        Args:
+            user_id: Unique user identifier
+
+        Returns:
+            A stateless WPMPredictor
+        """
+        return self._predictor
+
+    def baseline_for(self, user_id: str) -> KeystrokeBaseline:
+        """
+        Get the current keystroke baseline snapshot for a user.
+
+        Args:
+            user_id: Unique user identifier
+
+        Returns:
+            The user's immutable KeystrokeBaseline
+        """
+        with self._lock:
+            baseline = self._baselines.get(user_id)
+            if baseline is None:
+                return _EMPTY_BASELINE
+            self._baselines.move_to_end(user_id)
+            return baseline
+
+    def analyzer_for(self, user_id: str) -> KeystrokeDynamicsAnalyzer:
+        """
+        Get a keystroke analyzer bound to the user's current baseline.
+
+        Args:
+            user_id: Unique user identifier
+
+        Returns:
+            KeystrokeDynamicsAnalyzer for the user
+        """
+        return KeystrokeDynamicsAnalyzer(self.baseline_for(user_id))
+
+    def analyze_keystrokes(self, user_id: str,
+                           keystroke_data: Union[List[Dict[str, Any]], KeystrokeArrays]) -> Dict[str, Any]:
+        """
+        Analyze a user's keystrokes and publish the updated baseline.
+
+        Args:
+            user_id: Unique user identifier
+            keystroke_data: List of keystroke events with timestamps and keys,
+                or KeystrokeArrays
+
+        Returns:
+            Dict with keystroke dynamics analysis
+        """
+        analyzer = self.analyzer_for(user_id)
+        analysis, baseline = analyzer.analyze_with_baseline(keystroke_data)
+        if baseline is not analyzer.baseline:
+            self._publish(user_id, analyzer.baseline, baseline)
+        return analysis
+
+    def _publish(self, user_id: str, expected: KeystrokeBaseline,
+                 baseline: KeystrokeBaseline) -> bool:
+        """
+        Replace a user's baseline if nobody else has replaced it meanwhile.
+
+        Args:
+            user_id: Unique user identifier
+            expected: Baseline the new one was derived from
+            baseline: New baseline to publish
+
+        Returns:
+            True if the baseline was published
+        """
+        with self._lock:
+            current = self._baselines.get(user_id, _EMPTY_BASELINE)
+            if current is not expected:
+                # A concurrent test already advanced this user's baseline
+                return False
+
+            self._baselines[user_id] = baseline
+            self._baselines.move_to_end(user_id)
+            while len(self._baselines) > self.max_users:
+                self._baselines.popitem(last=False)
+            return True
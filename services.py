@@ -0,0 +1,169 @@
+"""
+Shared application objects, built on first use.
+
+``create_app`` binds ``services`` to the app without building anything,
+so a worker starts without indexing the corpus or the chatbot knowledge
+base. Each object is built the first time a view uses it. With
+``PRELOAD_SHARED_STATE`` (for ``gunicorn --preload``), ``warm`` builds
+the read-only indexes in the master process instead, so the forked
+workers share their memory copy-on-write.
+"""
+import gc
+import os
+import logging
+import threading
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+# Built in the master by ``warm``: never modified after construction
+READ_ONLY_SERVICES = ('data_manager', 'chatbot_engine', 'lesson_payloads', 'lesson_not_found', 'drill_index')
+
+
+class built_once:
+    """Descriptor building an attribute of Services on first access."""
+
+    def __init__(self, build: Callable[['Services'], Any]):
+        self.build = build
+        self.name = build.__name__
+        self.__doc__ = build.__doc__
+
+    def __get__(self, services: 'Services', owner: type) -> Any:
+        if services is None:
+            return self
+        with services._lock:
+            # Another thread may have built it while this one waited
+            if self.name not in services.__dict__:
+                services.__dict__[self.name] = self.build(services)
+                logger.debug(f"Built {self.name}")
+        # The instance attribute now shadows this descriptor: later reads take no lock
+        return services.__dict__[self.name]
+
+
+class Services:
+    """The objects the views share."""
+
+    def __init__(self):
+        self.app = None
+        self._lock = threading.RLock()
+
+    def init_app(self, app) -> None:
+        """
+        Bind the services to a Flask app, dropping any built for a previous app.
+
+        Args:
+            app: Flask application
+        """
+        for name in list(self.__dict__):
+            if isinstance(getattr(type(self), name, None), built_once):
+                del self.__dict__[name]
+        self.app = app
+        app.extensions['services'] = self
+
+    def warm(self) -> None:
+        """
+        Build the read-only services now and freeze them out of the garbage collector.
+
+        Call in the master before workers are forked: collections would
+        otherwise write to every object's header and copy its page.
+        """
+        for name in READ_ONLY_SERVICES:
+            getattr(self, name)
+        gc.freeze()
+        logger.info(f"Preloaded {', '.join(READ_ONLY_SERVICES)} ({gc.get_freeze_count()} objects frozen)")
+
+    @built_once
+    def user_cache(self):
+        """Bounded cache for per-user state."""
+        from user_cache import UserStateCache, create_cache_backend
+        config = self.app.config
+        return UserStateCache(create_cache_backend(config["USER_CACHE_BACKEND"], max_size=config["USER_CACHE_SIZE"],
+                                                   ttl=config["USER_CACHE_TTL"], path=config["USER_CACHE_PATH"]))
+
+    @built_once
+    def chatbot_engine(self):
+        """Chatbot over the bundled responses and the optional FAQ file."""
+        from chatbot_engine import ChatbotEngine, KnowledgeEntry
+        from text_data import CHATBOT_RESPONSES
+        faq_path = self.app.config["CHATBOT_FAQ_PATH"]
+        return ChatbotEngine(
+            [KnowledgeEntry((pattern,), response) for pattern, response in CHATBOT_RESPONSES.items()] +
+            (ChatbotEngine.load_faq(faq_path) if faq_path else []),
+            cache_size=self.app.config["CHATBOT_CACHE_SIZE"])
+
+    @built_once
+    def data_manager(self):
+        """DataManager over the configured corpus."""
+        from corpus import Corpus
+        from data_manager import DataManager
+        corpus_path = self.app.config["CORPUS_PATH"]
+        return DataManager(cache=self.user_cache, corpus=Corpus(corpus_path) if corpus_path else None,
+                           chatbot=self.chatbot_engine)
+
+    @built_once
+    def scorers(self):
+        """Per-user WPM predictors and keystroke baselines."""
+        from scorer_registry import ScorerRegistry
+        return ScorerRegistry()
+
+    @built_once
+    def lesson_payloads(self):
+        """Lessons never change while the app runs: encoded once."""
+        from static_responses import build_payloads
+        from text_data import LESSONS
+        return build_payloads({lesson_id: self.data_manager.get_lesson(lesson_id) for lesson_id in LESSONS})
+
+    @built_once
+    def lesson_not_found(self):
+        """Payload for unknown lesson ids."""
+        from static_responses import StaticPayload
+        return StaticPayload.from_value(self.data_manager.get_lesson(''))
+
+    @built_once
+    def drill_index(self):
+        """Drill words: the active corpus, plus the bundled words when a custom corpus is loaded."""
+        from corpus import default_corpus
+        from drills import DrillIndex
+        words = [self.data_manager.corpus.words]
+        if self.app.config["CORPUS_PATH"]:
+            words.append(default_corpus(os.path.join(self.data_manager.data_dir, "corpus")).words)
+        return DrillIndex(words)
+
+    @built_once
+    def analysis_pipeline(self):
+        """Background analysis of submitted tests."""
+        from analysis_pipeline import AnalysisPipeline
+        return AnalysisPipeline(self.app)
+
+    @built_once
+    def live_sessions(self):
+        """Open live test sessions of this worker."""
+        from live_sessions import LiveSessionStore
+        return LiveSessionStore(max_sessions=self.app.config["LIVE_SESSION_MAX"],
+                                ttl=self.app.config["LIVE_SESSION_TTL"])
+
+    @built_once
+    def live_events(self):
+        """Server-Sent Events channels of the live test sessions."""
+        from live_events import LiveEventHub
+        config = self.app.config
+        return LiveEventHub(max_subscribers=config["LIVE_EVENTS_MAX_SUBSCRIBERS"],
+                            heartbeat=config["LIVE_EVENTS_HEARTBEAT"],
+                            idle_timeout=config["LIVE_EVENTS_IDLE_TIMEOUT"])
+
+    @built_once
+    def game_tokens(self):
+        """Signer of typing game tokens."""
+        from game_stream import GameTokens
+        return GameTokens(self.app.secret_key, max_age=self.app.config["GAME_TOKEN_MAX_AGE"])
+
+    @built_once
+    def batch_scorer(self):
+        """Process pool scorer for /api/batch-score."""
+        from batch_scoring import BatchScorer
+        return BatchScorer(workers=self.app.config["BATCH_SCORING_WORKERS"],
+                           chunk_size=self.app.config["BATCH_SCORING_CHUNK_SIZE"],
+                           start_method=self.app.config["BATCH_SCORING_START_METHOD"])
+
+
+services = Services()
@@ -0,0 +1,149 @@
+"""
+Pre-serialized JSON responses for read-mostly endpoints.
+
+A StaticPayload holds a value already encoded to JSON bytes, a gzipped
+copy when that is worth sending, and a strong ETag per encoding. Views
+decorated with ``static_json`` return payloads (built once, e.g. at
+startup) and the decorator answers with the stored bytes, cache headers,
+and ``304 Not Modified`` when the client already holds the current
+version.
+"""
+import gzip
+import hashlib
+import functools
+import logging
+from typing import Any, Callable, Optional
+from flask import Response, current_app, request
+import json_codec
+
+logger = logging.getLogger(__name__)
+
+# Bodies smaller than this are sent uncompressed: gzip would save less than its headers cost
+MIN_GZIP_SIZE = 256
+DEFAULT_MAX_AGE = 300
+
+
+class StaticPayload:
+    """A JSON response body encoded once, with its validators."""
+
+    __slots__ = ('body', 'etag', 'gzipped', 'gzip_etag')
+
+    def __init__(self, body: bytes, compress: bool = True):
+        """
+        Initialize a payload.
+
+        Args:
+            body: Encoded JSON body
+            compress: Whether to keep a gzipped copy of large bodies
+        """
+        self.body = body
+        self.etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        self.gzipped = None
+        self.gzip_etag = None
+        if compress and len(body) >= MIN_GZIP_SIZE:
+            # mtime=0 keeps the compressed bytes, and so the ETag, identical across restarts
+            gzipped = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(gzipped) < len(body):
+                self.gzipped = gzipped
+                # Each encoding is a different representation and needs its own strong ETag
+                self.gzip_etag = f"{self.etag}-gz"
+
+    @classmethod
+    def from_value(cls, value: Any, compress: bool = True) -> 'StaticPayload':
+        """
+        Encode a JSON-serializable value.
+
+        Args:
+            value: Value to encode
+            compress: Whether to keep a gzipped copy of large bodies
+
+        Returns:
+            The StaticPayload
+        """
+        return cls(json_codec.dumps(value).encode('utf-8'), compress)
+
+    def __len__(self) -> int:
+        return len(self.body)
+
+
+def payload_response(payload: StaticPayload, status: int = 200, max_age: int = DEFAULT_MAX_AGE,
+                     private: bool = True) -> Response:
+    """
+    Build the response for a payload in the current request.
+
+    The gzipped copy is sent to clients that accept it. A successful
+    response whose ETag the client sent in ``If-None-Match`` becomes an
+    empty ``304 Not Modified``.
+
+    Args:
+        payload: Payload to send
+        status: HTTP status code
+        max_age: Seconds the client may reuse the response without revalidating
+        private: Whether only the client (not shared caches) may store the response
+
+    Returns:
+        The Response
+    """
+    use_gzip = payload.gzipped is not None and request.accept_encodings['gzip'] > 0
+    etag = payload.gzip_etag if use_gzip else payload.etag
+
+    headers = [('ETag', f'"{etag}"'),
+               ('Cache-Control', f"{'private' if private else 'public'}, max-age={max_age}")]
+    if payload.gzipped is not None:
+        headers.append(('Vary', 'Accept-Encoding'))
+
+    if status == 200 and request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+    if use_gzip:
+        headers.append(('Content-Encoding', 'gzip'))
+    response = Response(payload.gzipped if use_gzip else payload.body, status=status, headers=headers,
+                        mimetype='application/json')
+    return response
+
+
+def static_json(max_age: Optional[int] = None, private: bool = True) -> Callable:
+    """
+    Decorate a view returning a StaticPayload, or a (payload, status) tuple.
+
+    Views may also return a plain JSON-serializable value; it is encoded
+    (uncompressed) on every call but still gets validators, so unchanged
+    results are answered with ``304 Not Modified``.
+
+    Args:
+        max_age: Seconds the client may reuse a response without revalidating
+            (default: the app's ``STATIC_MAX_AGE``)
+        private: Whether only the client (not shared caches) may store responses
+
+    Returns:
+        The decorator
+    """
+    def decorator(view: Callable) -> Callable:
+        @functools.wraps(view)
+        def wrapper(*args: Any, **kwargs: Any) -> Response:
+            result = view(*args, **kwargs)
+            status = 200
+            if isinstance(result, tuple):
+                result, status = result
+            if not isinstance(result, StaticPayload):
+                result = StaticPayload.from_value(result, compress=False)
+            age = current_app.config.get('STATIC_MAX_AGE', DEFAULT_MAX_AGE) if max_age is None else max_age
+            return payload_response(result, status, age, private)
+        return wrapper
+    return decorator
+
+
+def build_payloads(values: dict, compress: bool = True) -> dict:
+    """
+    Encode every value of a dict.
+
+    Args:
+        values: Mapping of keys to JSON-serializable values
+        compress: Whether to keep gzipped copies of large bodies
+
+    Returns:
+        Dict mapping the same keys to StaticPayloads
+    """
+    payloads = {key: StaticPayload.from_value(value, compress) for key, value in values.items()}
+    logger.debug(f"Pre-serialized {len(payloads)} payloads "
+                 f"({sum(len(payload) for payload in payloads.values())} bytes)")
+    return payloads
@@ -0,0 +1,35 @@
+"""Fixtures for tests that go through the Flask app."""
+import pytest
+from app import create_app
+from services import services
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """An app on its own SQLite file, with the data directory under tmp_path."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'typing.db'}")
+    app = create_app({
+        'TESTING': True,
+        'WTF_CSRF_ENABLED': False,
+        'USER_CACHE_PATH': str(tmp_path / 'user_cache.sqlite'),
+    })
+    yield app
+    if 'batch_scorer' in services.__dict__:
+        services.batch_scorer.close()
+
+
+def log_in(client, username):
+    """Register a user and log the client in as them."""
+    client.post('/register', data={'username': username, 'email': f"{username}@example.com",
+                                   'password': 'password123', 'password2': 'password123'})
+    response = client.post('/login', data={'username': username, 'password': 'password123'})
+    assert response.status_code == 302
+
+
+@pytest.fixture
+def client(app):
+    """A test client logged in as a freshly registered user."""
+    client = app.test_client()
+    log_in(client, 'typist')
+    return client
@@ -0,0 +1,136 @@
+"""Tests for the typed text alignment and the error analysis built on it."""
+import random
+import pytest
+from alignment import MISSING, align_chars, align_texts
+from utils import analyze_errors
+
+
+def levenshtein(a, b):
+    """Textbook edit distance, independent of align_chars."""
+    previous = list(range(len(b) + 1))
+    for i, x in enumerate(a, 1):
+        current = [i]
+        for j, y in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (x != y)))
+        previous = current
+    return previous[-1]
+
+
+def apply_ops(a, b, ops):
+    """Check that the ops walk both strings in order and rebuild b from a."""
+    i = j = 0
+    rebuilt = []
+    for op, oi, oj in ops:
+        assert (oi, oj) == (i, j)
+        if op == 'equal':
+            assert a[i] == b[j]
+            rebuilt.append(a[i])
+            i, j = i + 1, j + 1
+        elif op == 'substitution':
+            assert a[i] != b[j]
+            rebuilt.append(b[j])
+            i, j = i + 1, j + 1
+        elif op == 'deletion':
+            i += 1
+        else:
+            assert op == 'insertion'
+            rebuilt.append(b[j])
+            j += 1
+    assert (i, j) == (len(a), len(b))
+    return ''.join(rebuilt)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_align_chars_is_optimal(seed):
+    rng = random.Random(seed)
+    for _ in range(50):
+        a = ''.join(rng.choice('abc ') for _ in range(rng.randint(0, 12)))
+        b = ''.join(rng.choice('abc ') for _ in range(rng.randint(0, 12)))
+        ops = align_chars(a, b)
+        assert apply_ops(a, b, ops) == b
+        assert sum(op != 'equal' for op, _, _ in ops) == levenshtein(a, b)
+
+
+@pytest.mark.parametrize('a, b', [('', ''), ('abc', ''), ('', 'abc'), ('abc', 'abc'), ('kitten', 'sitting')])
+def test_align_chars_edge_cases(a, b):
+    ops = align_chars(a, b)
+    assert apply_ops(a, b, ops) == b
+    assert sum(op != 'equal' for op, _, _ in ops) == levenshtein(a, b)
+
+
+def test_exact_copy():
+    result = analyze_errors("the quick brown fox", "the quick brown fox")
+    assert result['error_count'] == 0
+    assert result['accuracy'] == 100
+    assert result['word_errors'] == []
+
+
+@pytest.mark.parametrize('typed', ["thequick brown fox", "the quick brownfox"])
+def test_merged_words_cost_one_deletion(typed):
+    result = analyze_errors("the quick brown fox", typed)
+    assert result['error_count'] == 1
+    assert result['deletions'] == 1
+    assert result['character_errors'] == {f" ->{MISSING}": 1}
+
+
+def test_merged_words_at_the_end():
+    result = analyze_errors("hello world", "helloworld")
+    assert result['error_count'] == 1
+    assert result['character_errors'] == {f" ->{MISSING}": 1}
+    assert result['word_errors'] == [{'original': 'hello world', 'typed': 'helloworld', 'position': 0}]
+
+
+@pytest.mark.parametrize('original, typed', [
+    ("the quick brown fox", "the qui ck brown fox"),
+    ("the quick brown fox", "the quick brown fo x"),
+])
+def test_split_word_costs_one_insertion(original, typed):
+    result = analyze_errors(original, typed)
+    assert result['error_count'] == 1
+    assert result['character_errors'] == {f"{MISSING}-> ": 1}
+
+
+def test_skipped_word_only_costs_itself():
+    result = analyze_errors("the quick brown fox jumps over", "the brown fox jumps over")
+    assert result['error_count'] == len("quick")
+    assert result['insertions'] == result['substitutions'] == 0
+    assert result['word_errors'] == [{'original': 'quick', 'typed': '', 'position': 1}]
+
+
+def test_extra_word_only_costs_itself():
+    result = analyze_errors("the quick brown fox jumps over", "the quick very brown fox jumps over")
+    assert result['error_count'] == len("very")
+    assert result['deletions'] == result['substitutions'] == 0
+    assert result['word_errors'] == [{'original': '', 'typed': 'very', 'position': 2}]
+
+
+def test_correct_word_between_typos_is_not_an_error():
+    alignment = align_texts("the cat sat on", "teh cat sta on")
+    assert [(e.original, e.typed) for e in alignment.word_errors] == [('the', 'teh'), ('sat', 'sta')]
+    assert len(alignment.char_errors) == 4
+
+
+def test_skipped_word_then_typo():
+    alignment = align_texts("the big cat sat on", "the cat sta on")
+    assert [(e.original, e.typed) for e in alignment.word_errors] == [('big', ''), ('sat', 'sta')]
+    assert [e.position for e in alignment.word_errors] == [1, 3]
+
+
+def test_extra_words_after_the_end():
+    result = analyze_errors("the quick", "the quick fox")
+    assert result['insertions'] == len("fox")
+    assert result['word_errors'] == [{'original': '', 'typed': 'fox', 'position': 2}]
+
+
+def test_unreached_words_count_one_error_each():
+    alignment = align_texts("the quick brown fox jumps", "the quick bro")
+    assert alignment.unreached_words == 2
+    result = analyze_errors("the quick brown fox jumps", "the quick bro")
+    assert result['error_count'] == len("wn") + 2
+
+
+def test_error_positions_point_into_the_original():
+    original = "the quick brown fox"
+    result = analyze_errors(original, "the quack brown fox")
+    assert result['character_errors'] == {'i->a': 1}
+    assert [original[p] for p in result['error_positions']] == ['i']
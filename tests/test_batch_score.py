@@ -0,0 +1,75 @@
+"""Tests for /api/batch-score."""
+import json
+import pytest
+from batch_scoring import score_submission
+from models import TypingTest
+
+ORIGINAL = "the quick brown fox jumps over the lazy dog"
+
+
+def submission(i):
+    # Each submission drops a different number of characters, so each scores differently
+    return {'original_text': ORIGINAL, 'typed_text': ORIGINAL[:len(ORIGINAL) - i], 'time_taken': 10 + i}
+
+
+def ndjson(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_results_stream_in_input_order(app, client, workers):
+    app.config.update(BATCH_SCORING_WORKERS=workers, BATCH_SCORING_CHUNK_SIZE=3)
+    submissions = [submission(i) for i in range(20)]
+    response = client.post('/api/batch-score', json={'submissions': submissions})
+    assert response.status_code == 200
+    results = ndjson(response)
+    assert [result['index'] for result in results] == list(range(20))
+    for result, sub in zip(results, submissions):
+        expected = score_submission(sub)
+        assert (result['wpm'], result['accuracy']) == (expected['wpm'], expected['accuracy'])
+
+
+def test_store_saves_the_tests(app, client):
+    submissions = [submission(i) for i in range(5)]
+    response = client.post('/api/batch-score', json={'submissions': submissions, 'store': True})
+    assert response.status_code == 201
+    body = response.get_json()
+    assert body['stored'] == 5
+    with app.app_context():
+        stored = {test.id: test for test in TypingTest.query.all()}
+    assert [stored[result['test_id']].typed_text for result in body['results']] == \
+        [sub['typed_text'] for sub in submissions]
+
+
+@pytest.mark.parametrize('bad', [
+    'not an object',
+    None,
+    {'original_text': 5},
+    {'typed_text': ['a']},
+    {'time_taken': 'x'},
+    {'time_taken': -1},
+    {'time_taken': float('inf')},
+    {'time_taken': True},
+    {'difficulty': 3},
+    {'keystroke_data': [{'key': 'a', 'timestamp': 'now'}]},
+])
+def test_invalid_submission_is_rejected_with_its_index(app, client, bad):
+    submissions = [submission(0), submission(1), bad if not isinstance(bad, dict) else dict(submission(2), **bad)]
+    # json.dumps would write inf as Infinity, which the server's parser accepts
+    response = client.post('/api/batch-score', data=json.dumps({'submissions': submissions}),
+                           content_type='application/json')
+    assert response.status_code == 400
+    assert response.get_json()['message'].startswith('submission 2:')
+    with app.app_context():
+        assert TypingTest.query.count() == 0
+
+
+@pytest.mark.parametrize('body', [{}, {'submissions': 'abc'}, [1, 2]])
+def test_submissions_must_be_a_list(client, body):
+    assert client.post('/api/batch-score', json=body).status_code == 400
+
+
+def test_oversized_batch_is_rejected_before_validation(app, client):
+    app.config['BATCH_SCORING_MAX_SUBMISSIONS'] = 3
+    response = client.post('/api/batch-score', json={'submissions': [None] * 4})
+    assert response.status_code == 413
@@ -0,0 +1,90 @@
+"""Tests for typing game tokens and the verification of submitted games."""
+import time
+import pytest
+import game_stream
+from conftest import log_in
+from corpus import default_corpus
+from game_stream import GAME_SECONDS, GameTicket, GameVerificationError, WordStream, verify_game
+from models import GameResult
+
+
+@pytest.fixture
+def later(monkeypatch):
+    """Move the clock forward, as if a game had been played for some seconds."""
+    def advance(seconds):
+        now = time.time() + seconds
+        monkeypatch.setattr(game_stream.time, 'time', lambda: now)
+    return advance
+
+
+def start(client, difficulty='easy'):
+    response = client.post('/api/game/start', json={'difficulty': difficulty})
+    assert response.status_code == 201
+    return response.get_json()['game_token']
+
+
+def test_game_is_scored_once(app, client, later):
+    token = start(client)
+    later(GAME_SECONDS)
+    response = client.post('/api/submit-game', json={'game_token': token, 'words_completed': 20, 'accuracy': 95})
+    assert response.status_code == 200
+    assert response.get_json()['score'] > 0
+
+    replay = client.post('/api/submit-game', json={'game_token': token, 'words_completed': 20, 'accuracy': 95})
+    assert replay.status_code == 403
+    with app.app_context():
+        assert GameResult.query.count() == 1
+
+
+def test_too_many_words_for_the_time_is_rejected(app, client, later):
+    token = start(client)
+    later(2)
+    response = client.post('/api/submit-game', json={'game_token': token, 'words_completed': 100, 'accuracy': 95})
+    assert response.status_code == 422
+    with app.app_context():
+        assert GameResult.query.count() == 0
+
+
+def test_token_of_another_user_is_rejected(app, client, later):
+    other = app.test_client()
+    log_in(other, 'other')
+    token = start(other)
+    later(GAME_SECONDS)
+    assert client.post('/api/submit-game', json={'game_token': token, 'words_completed': 5}).status_code == 403
+
+
+@pytest.mark.parametrize('body', [
+    {},
+    {'game_token': ''},
+    {'words_completed': 'abc'},
+    {'words_completed': None},
+    {'accuracy': 150},
+    {'accuracy': '90'},
+    {'accuracy': True},
+])
+def test_malformed_submission_is_rejected(client, body):
+    if 'game_token' not in body and body:
+        body = dict(body, game_token=start(client))
+    assert client.post('/api/submit-game', json=body).status_code == 400
+
+
+@pytest.mark.parametrize('difficulty', ['insane', ['easy'], None])
+def test_unknown_difficulty_is_rejected(client, difficulty):
+    assert client.post('/api/game/start', json={'difficulty': difficulty}).status_code == 400
+
+
+def test_forged_token_is_rejected(client):
+    token = start(client)
+    response = client.post('/api/submit-game', json={'game_token': token[:-2] + 'xx', 'words_completed': 5})
+    assert response.status_code == 403
+
+
+def test_late_submission_does_not_buy_typing_time(tmp_path):
+    stream = WordStream(default_corpus(str(tmp_path)).words, 42, 'easy')
+    ticket = GameTicket('u1', 42, 'easy', issued_at=0.0, seconds=GAME_SECONDS)
+    score, words = verify_game(stream, ticket, 100, submitted_at=GAME_SECONDS)
+    assert len(words) == 100 and score > 0
+    # An hour later the player still only had the game's length to type
+    with pytest.raises(GameVerificationError):
+        verify_game(stream, ticket, 1000, submitted_at=3600.0)
+    verify_game(stream, ticket._replace(seconds=3600), 1000, submitted_at=3600.0)
@@ -0,0 +1,137 @@
+"""Tests for the keystroke blob format."""
+import json
+import numpy as np
+import pytest
+from keystroke_codec import (FLAG_JSON, FLAG_ZLIB, FORMAT_VERSION, InvalidKeystrokesError,
+                             KeystrokeCodecError, KeystrokeLog, decode_varints, encode_varints,
+                             validate_events)
+from ml_models import KeystrokeArrays
+
+
+def keystroke(key, timestamp, position, shift=False, key_code=None):
+    return {'key': key, 'keyCode': ord(key[0]) if key_code is None else key_code,
+            'timestamp': timestamp, 'shiftKey': shift, 'position': position}
+
+
+def round_trip(events, compress=True):
+    """Encode, store and decode events the way the database column does."""
+    return KeystrokeLog.from_storage(KeystrokeLog.from_events(events, compress=compress).blob)
+
+
+def assert_same_arrays(actual, expected):
+    np.testing.assert_array_equal(actual.timestamps, expected.timestamps)
+    assert [actual.keys[i] for i in actual.key_ids] == [expected.keys[i] for i in expected.key_ids]
+
+
+SENTENCE = [keystroke(c, 1700000000000 + 97 * i, i, shift=c.isupper())
+            for i, c in enumerate("The quick brown fox jumps over the lazy dog")]
+
+
+@pytest.mark.parametrize('compress', [True, False])
+def test_round_trip(compress):
+    log = round_trip(SENTENCE, compress=compress)
+    assert log.events() == SENTENCE
+    assert len(log) == len(SENTENCE)
+    assert_same_arrays(log.arrays(), KeystrokeArrays.from_events(SENTENCE))
+
+
+def test_columnar_blob_is_smaller_than_json():
+    blob = KeystrokeLog.from_events(SENTENCE).blob
+    assert blob[0] == FORMAT_VERSION
+    assert not blob[1] & FLAG_JSON
+    assert blob[1] & FLAG_ZLIB
+    assert len(blob) < len(json.dumps(SENTENCE)) / 4
+
+
+def test_negative_deltas():
+    # Clock adjustments and backspaces move timestamps and positions backwards
+    events = [keystroke('a', 5000, 3), keystroke('b', 4000, 1), keystroke('c', -20, 0),
+              keystroke('Backspace', 2 ** 40, -7, key_code=8), keystroke('d', -(2 ** 40), 2)]
+    log = round_trip(events)
+    assert not log.blob[1] & FLAG_JSON
+    assert log.events() == events
+    assert_same_arrays(log.arrays(), KeystrokeArrays.from_events(events))
+
+
+def test_unicode_keys():
+    events = [keystroke(key, 100 * i, i) for i, key in enumerate(['é', 'ß', '中', '🙂', 'é', 'Dead', 'ü'])]
+    log = round_trip(events)
+    assert not log.blob[1] & FLAG_JSON
+    assert log.events() == events
+    assert_same_arrays(log.arrays(), KeystrokeArrays.from_events(events))
+
+
+def test_same_key_with_different_key_codes():
+    events = [keystroke('a', 0, 0, key_code=65), keystroke('a', 10, 1, key_code=97)]
+    assert round_trip(events).events() == events
+
+
+@pytest.mark.parametrize('events', [[], None])
+def test_empty_log(events):
+    log = round_trip(events)
+    assert log.events() == []
+    assert len(log) == 0
+    assert len(log.arrays()) == 0
+
+
+@pytest.mark.parametrize('events', [
+    [{'key': 'a', 'timestamp': 1}],
+    [dict(keystroke('a', 1, 0), extra=True)],
+    [keystroke('a', 1.5, 0)],
+    [keystroke('a', 1, 0) | {'keyCode': None}],
+    [keystroke('a', 1, 0) | {'shiftKey': 0}],
+    [keystroke('a', 2 ** 62, 0)],
+    [keystroke('a', 1, 0), {'key': 'b'}],
+    [keystroke('a', 1, 0), 'b', 3, None, ['c']],
+])
+def test_non_canonical_events_are_stored_as_json(events):
+    log = round_trip(events)
+    assert log.blob[1] & FLAG_JSON
+    assert log.events() == events
+
+
+def test_legacy_json_rows():
+    text = json.dumps(SENTENCE)
+    for value in (text, text.encode('utf-8'), b' ' + text.encode('utf-8')):
+        log = KeystrokeLog.from_storage(value)
+        assert log.legacy
+        assert log.events() == SENTENCE
+        assert_same_arrays(log.arrays(), KeystrokeArrays.from_events(SENTENCE))
+        # Legacy rows are re-encoded in the current format on first access
+        assert round_trip(list(log)) == log
+
+
+@pytest.mark.parametrize('value', ['null', b'null', '[]', b'[]'])
+def test_empty_legacy_rows(value):
+    log = KeystrokeLog.from_storage(value)
+    assert log.legacy
+    assert log.events() == []
+    assert len(log.arrays()) == 0
+
+
+def test_unknown_version_is_rejected():
+    with pytest.raises(KeystrokeCodecError):
+        KeystrokeLog.from_storage(bytes((FORMAT_VERSION + 1, 0)) + b'\x00').events()
+
+
+def test_varints_round_trip():
+    values = np.array([0, 1, 127, 128, 300, 2 ** 32, 2 ** 63 - 1], dtype=np.uint64)
+    np.testing.assert_array_equal(decode_varints(encode_varints(values), len(values)), values)
+
+
+@pytest.mark.parametrize('events', [
+    {'key': 'a'},
+    'abc',
+    [keystroke('a', 1, 0), 'b'],
+    [keystroke('a', True, 0)],
+    [keystroke('a', 'now', 0)],
+    [keystroke('a', float('nan'), 0)],
+])
+def test_validate_events_rejects(events):
+    with pytest.raises(InvalidKeystrokesError):
+        validate_events(events)
+
+
+@pytest.mark.parametrize('events', [[], SENTENCE, [{'key': 'a'}], [keystroke('a', 1.5, 0)]])
+def test_validate_events_accepts(events):
+    validate_events(events)
@@ -0,0 +1,57 @@
+"""Tests for the data migrations."""
+from datetime import datetime, timedelta
+import pytest
+import migrations
+from models import db, ErrorEvent, TypingTest, UserProfile
+from utils import analyze_errors
+
+
+@pytest.fixture
+def doubled(app):
+    """Two users whose submissions were each written, and counted, twice by the old dual write."""
+    with app.app_context():
+        start = datetime(2024, 1, 1)
+        for user_id, typed in (('u1', "teh quick brwon fox"), ('u2', "the quick brown fxo")):
+            profile = UserProfile(user_id=user_id, error_statistics={})
+            db.session.add(profile)
+            for i in range(3):
+                error_analysis = analyze_errors("the quick brown fox", typed)
+                timestamp = start + timedelta(minutes=i)
+                db.session.add(TypingTest(id=f"{user_id}-{i}", user_id=user_id, original_text="the quick brown fox",
+                                          typed_text=typed, wpm=50 + i, accuracy=90, time_taken=10,
+                                          timestamp=timestamp, error_details=error_analysis))
+                db.session.add(TypingTest(id=f"{user_id}-{i}-copy", user_id=user_id, original_text='', typed_text='',
+                                          wpm=50 + i, accuracy=90, time_taken=0,
+                                          timestamp=timestamp + timedelta(seconds=1)))
+                profile.update_error_statistics(error_analysis, commit=False)
+                profile.update_error_statistics(error_analysis, commit=False)
+        db.session.commit()
+        yield
+
+
+def error_counts(user_id):
+    return {event.char_pair: event.count for event in ErrorEvent.query.filter_by(user_id=user_id)}
+
+
+def test_duplicates_are_removed_and_error_statistics_recomputed(doubled):
+    typos = analyze_errors("the quick brown fox", "teh quick brwon fox")
+    expected = typos['character_errors']
+    assert error_counts('u1') == {pair: count * 6 for pair, count in expected.items()}
+
+    result = migrations.reconcile_duplicate_submissions()
+    assert result == {'typing_tests_removed': 6, 'game_results_removed': 0, 'profiles_recomputed': 2}
+    assert TypingTest.query.count() == 6
+
+    assert error_counts('u1') == {pair: count * 3 for pair, count in expected.items()}
+    stats = db.session.get(UserProfile, 'u1').error_statistics
+    assert stats['most_common_errors'] == dict(sorted(error_counts('u1').items(), key=lambda x: (-x[1], x[0])))
+    assert stats['word_errors'] == typos['word_errors'] * 3
+    assert stats['total_characters'] == 3 * len("the quick brown fox")
+
+
+def test_dry_run_changes_nothing(doubled):
+    before = error_counts('u2')
+    result = migrations.reconcile_duplicate_submissions(dry_run=True)
+    assert result['profiles_recomputed'] == 2
+    assert TypingTest.query.count() == 12
+    assert error_counts('u2') == before
@@ -0,0 +1,59 @@
+"""Tests for routing read-only requests to the read pool."""
+import time
+import pytest
+from flask import g, session
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from models import User, db, read_pool
+
+
+@pytest.fixture
+def read_request(app):
+    """A request context of a read-only view."""
+    with app.test_request_context():
+        g._read_only = True
+        yield
+
+
+def test_sqlite_file_gets_a_read_engine(app):
+    with app.app_context():
+        assert read_pool.engine is not None
+        assert read_pool.engine is not db.engine
+
+
+def test_read_only_request_reads_from_the_pool(read_request):
+    reader = read_pool.session()
+    assert reader is not db.session
+    assert reader.get_bind() is read_pool.engine
+    assert reader.execute(text("SELECT count(*) FROM users")).scalar() == 0
+
+
+def test_read_pool_connections_cannot_write(read_request):
+    with pytest.raises(OperationalError):
+        read_pool.session().execute(text("DELETE FROM users"))
+
+
+def test_other_requests_use_the_primary(app):
+    with app.test_request_context():
+        assert read_pool.session() is db.session
+
+
+def test_request_reads_its_own_writes(read_request):
+    db.session.add(User(username='writer', email='writer@example.com', password_hash='x'))
+    db.session.flush()
+    assert read_pool.session() is db.session
+    assert read_pool.session().query(User).filter_by(username='writer').count() == 1
+    db.session.rollback()
+
+
+def test_user_reads_from_the_primary_after_a_write(app, read_request):
+    session['_wrote_at'] = time.time()
+    assert read_pool.session() is db.session
+    session['_wrote_at'] = time.time() - app.config['READ_AFTER_WRITE_SECONDS'] - 1
+    assert read_pool.session() is not db.session
+
+
+def test_write_is_remembered_in_the_user_session(client):
+    # Registering and logging in wrote the user's rows
+    with client.session_transaction() as cookie_session:
+        assert time.time() - cookie_session['_wrote_at'] < 5
@@ -0,0 +1,79 @@
+"""Concurrency tests for the per-user scorer registry."""
+import random
+import string
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from ml_models import WPMRunningStats
+from scorer_registry import ScorerRegistry
+
+USERS = 64
+TESTS_PER_USER = 4
+
+
+def user_keys(user):
+    """Each user types their own set of keys, so a leaked baseline entry is visible."""
+    return [f"{string.ascii_lowercase[k]}{user}" for k in range(6)]
+
+
+def keystrokes(user, test):
+    rng = random.Random(user * 1000 + test)
+    keys = user_keys(user)
+    timestamp = 0
+    events = []
+    for position in range(120):
+        # A per-user pace makes each baseline's intervals distinct as well
+        timestamp += 80 + 7 * user + rng.randint(0, 60)
+        events.append({'key': rng.choice(keys), 'keyCode': 0, 'timestamp': timestamp,
+                       'shiftKey': False, 'position': position})
+    return events
+
+
+TESTS = {f"user-{u}": [keystrokes(u, t) for t in range(TESTS_PER_USER)] for u in range(USERS)}
+HISTORIES = {user_id: WPMRunningStats.from_history([{'wpm': 30 + (u * 7 + i * 3) % 40} for i in range(20)])
+             for u, user_id in enumerate(TESTS)}
+
+
+def run_user(registry, user_id, start=None):
+    if start is not None:
+        start.wait()
+    results = []
+    for events in TESTS[user_id]:
+        results.append(registry.analyze_keystrokes(user_id, events))
+        results.append(registry.predictor_for(user_id).predict_from_stats(HISTORIES[user_id]))
+    return results
+
+
+@pytest.fixture(scope='module')
+def expected():
+    """Each user scored alone on a single thread."""
+    registry = ScorerRegistry()
+    results = {user_id: run_user(registry, user_id) for user_id in TESTS}
+    baselines = {user_id: dict(registry.baseline_for(user_id).intervals) for user_id in TESTS}
+    return results, baselines
+
+
+@pytest.mark.parametrize('threads', [4, 16, 64])
+def test_concurrent_results_match_single_threaded(expected, threads):
+    expected_results, expected_baselines = expected
+    registry = ScorerRegistry()
+    order = list(TESTS)
+    random.Random(threads).shuffle(order)
+    # Release the threads together so their tests interleave
+    start = threading.Barrier(min(threads, len(order)))
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = dict(zip(order, pool.map(lambda user_id: run_user(registry, user_id, start), order)))
+
+    for u, user_id in enumerate(TESTS):
+        assert results[user_id] == expected_results[user_id]
+        baseline = dict(registry.baseline_for(user_id).intervals)
+        assert baseline == expected_baselines[user_id]
+        # No other user's keys leaked into this user's baseline
+        assert set(baseline) <= set(user_keys(u))
+
+
+def test_expected_baselines_are_distinct(expected):
+    _, baselines = expected
+    assert all(baselines.values())
+    assert len({tuple(sorted(b.items())) for b in baselines.values()}) == USERS
@@ -0,0 +1,66 @@
+"""Tests for the per-user state cache and its backends."""
+import pytest
+from user_cache import LRUCacheBackend, MISSING, SQLiteCacheBackend, UserStateCache
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def backend(request, tmp_path):
+    if request.param == 'sqlite':
+        return SQLiteCacheBackend(str(tmp_path / 'cache.sqlite'))
+    return LRUCacheBackend()
+
+
+def test_loaded_value_is_cached(backend):
+    cache = UserStateCache(backend)
+    assert cache.get_or_load('u1', 'wpm_history', lambda: [40, 42]) == [40, 42]
+    assert cache.get_or_load('u1', 'wpm_history', lambda: pytest.fail("loaded twice")) == [40, 42]
+    assert cache.stats()['hits'] == 1
+
+
+def test_invalidation_during_load_is_not_overwritten(backend):
+    cache = UserStateCache(backend)
+
+    def stale_load():
+        cache.invalidate('u1', 'wpm_history')
+        return [40]
+
+    assert cache.get_or_load('u1', 'wpm_history', stale_load) == [40]
+    assert backend.get('wpm_history:u1') is MISSING
+    assert cache.get_or_load('u1', 'wpm_history', lambda: [40, 45]) == [40, 45]
+
+
+def test_invalidation_in_another_worker_during_load(tmp_path):
+    # Two workers share the cache file but not their in-process load tracking
+    path = str(tmp_path / 'cache.sqlite')
+    worker_a = UserStateCache(SQLiteCacheBackend(path))
+    worker_b = UserStateCache(SQLiteCacheBackend(path))
+
+    def stale_load():
+        worker_b.invalidate('u1', 'wpm_history')
+        return [40]
+
+    assert worker_a.get_or_load('u1', 'wpm_history', stale_load) == [40]
+    assert worker_b.backend.get('wpm_history:u1') is MISSING
+    assert worker_b.get_or_load('u1', 'wpm_history', lambda: [40, 45]) == [40, 45]
+    assert worker_a.get_or_load('u1', 'wpm_history', lambda: pytest.fail("loaded twice")) == [40, 45]
+
+
+def test_sqlite_versions_count_deletes(tmp_path):
+    backend = SQLiteCacheBackend(str(tmp_path / 'cache.sqlite'))
+    assert backend.version('k') == 0
+    backend.delete('k')
+    backend.delete('k')
+    assert backend.version('k') == 2
+    assert not backend.set_if_version('k', 1, 1)
+    assert backend.set_if_version('k', 1, 2)
+    assert backend.get('k') == 1
+
+
+def test_sqlite_evicts_least_recently_used(tmp_path):
+    backend = SQLiteCacheBackend(str(tmp_path / 'cache.sqlite'), max_size=2)
+    backend.set('a', 1)
+    backend.set('b', 2)
+    backend.get('a')
+    backend.set('c', 3)
+    assert len(backend) == 2
+    assert backend.get('b') is MISSING
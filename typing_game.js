@@ -27,6 +27,9 @@ document.addEventListener('DOMContentLoaded', function() {
     let totalKeystrokes = 0;
     let correctKeystrokes = 0;
     let gameDifficulty = 'medium';
+    let gameToken = null; // signed token identifying this game's word stream
+    let wordCursor = 0; // stream position of the next page of words
+    let refilling = null; // pending page request, if any
     
     // Initialize the game
     function initialize() {
@@ -47,21 +50,50 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
     
-    // Fetch random words based on difficulty
+    // Start a game on the server and fetch its first page of words
     function fetchWords() {
-        return fetch(`/api/game-words?count=50&difficulty=${gameDifficulty}`)
+        return fetch('/api/game/start', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({ difficulty: gameDifficulty })
+        })
             .then(response => response.json())
             .then(data => {
+                gameToken = data.game_token;
                 words = data.words;
+                wordCursor = data.cursor;
                 return words;
             })
             .catch(error => {
                 console.error('Error fetching words:', error);
+                gameToken = null;
                 words = ['error', 'loading', 'words', 'please', 'refresh'];
                 return words;
             });
     }
     
+    // Fetch the next page of the game's word stream before the words run out
+    function refillWords() {
+        if (!gameToken || refilling) return refilling;
+        refilling = fetch(`/api/game/words?token=${encodeURIComponent(gameToken)}&cursor=${wordCursor}&count=50`)
+            .then(response => response.json())
+            .then(data => {
+                if (data.words) {
+                    words = words.concat(data.words);
+                    wordCursor = data.cursor;
+                }
+            })
+            .catch(error => {
+                console.error('Error fetching words:', error);
+            })
+            .finally(() => {
+                refilling = null;
+            });
+        return refilling;
+    }
+    
     // Start the game
     function startGame() {
         // Reset game state
@@ -110,18 +142,20 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
     
-    // Display the next word to type
+    // Display the next word to type, in stream order so the server can replay the game
     function nextWord() {
+        if (words.length < 10) {
+            refillWords();
+        }
         if (words.length === 0) {
-            fetchWords(); // Refill words if we run out
+            const pending = refillWords();
+            if (pending) {
+                pending.then(() => { if (gameActive && words.length) nextWord(); });
+            }
             return;
         }
         
-        const randomIndex = Math.floor(Math.random() * words.length);
-        currentWord = words[randomIndex];
-        
-        // Remove the used word
-        words.splice(randomIndex, 1);
+        currentWord = words.shift();
         
         // Display the word
         wordDisplay.textContent = currentWord;
@@ -188,6 +222,8 @@ document.addEventListener('DOMContentLoaded', function() {
                 'Content-Type': 'application/json'
             },
             body: JSON.stringify({
+                game_token: gameToken,
+                words_completed: correctWords,
                 score: score,
                 words_typed: correctWords + incorrectWords,
                 correct_words: correctWords,
@@ -198,6 +234,10 @@ document.addEventListener('DOMContentLoaded', function() {
         })
         .then(response => response.json())
         .then(data => {
+            // The server replays the game and has the final say on the score
+            if (data.status === 'success' && gameOverModal) {
+                finalScoreDisplay.textContent = data.score;
+            }
             console.log('Game results submitted successfully');
         })
         .catch(error => {
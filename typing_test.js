@@ -21,6 +21,9 @@ document.addEventListener('DOMContentLoaded', function() {
     let timerInterval;
     let keystrokeData = [];
     let lastPredictionTime = 0;
+    let liveSessionId = null;
+    let sentKeystrokes = 0; // keystrokes the live session has acknowledged
+    let liveEvents = null; // EventSource pushing live metrics, if connected
     let testDifficulty = 'medium';
     
     // Initialize the test
@@ -45,9 +48,10 @@ document.addEventListener('DOMContentLoaded', function() {
         endButton.style.display = 'none';
     }
     
-    // Fetch a random text based on selected difficulty
+    // Fetch a random text based on selected difficulty, or a drill of the user's weak keys
     function fetchText() {
-        return fetch(`/api/get-text?difficulty=${testDifficulty}`)
+        const url = testDifficulty === 'drill' ? '/api/drill' : `/api/get-text?difficulty=${testDifficulty}`;
+        return fetch(url)
             .then(response => response.json())
             .then(data => {
                 originalText = data.text;
@@ -72,9 +76,11 @@ document.addEventListener('DOMContentLoaded', function() {
         suggestionsList.innerHTML = '';
         resultsSection.style.display = 'none';
         keystrokeData = [];
+        closeLiveSession();
         
         // Fetch new text and set up test
         fetchText().then(() => {
+            openLiveSession();
             userInput.disabled = false;
             userInput.focus();
             startTime = new Date().getTime();
@@ -108,8 +114,9 @@ document.addEventListener('DOMContentLoaded', function() {
         // Update live WPM calculation
         updateLiveWPM(elapsedTime);
         
-        // Periodically predict WPM
-        if (elapsedTime > 5 && currentTime - lastPredictionTime > 5000) { // Every 5 seconds after first 5 seconds
+        // Periodically predict WPM (more often while metrics are pushed over the event stream)
+        const predictionInterval = liveEvents ? 2000 : 5000;
+        if (elapsedTime > 5 && currentTime - lastPredictionTime > predictionInterval) {
             predictWPM(elapsedTime);
             lastPredictionTime = currentTime;
         }
@@ -179,23 +186,52 @@ document.addEventListener('DOMContentLoaded', function() {
     function predictWPM(elapsedTimeInSeconds) {
         if (elapsedTimeInSeconds < 5) return; // Need at least 5 seconds of data
         
-        const typedText = userInput.value;
+        if (!liveSessionId) {
+            openLiveSession();
+            return;
+        }
         
-        // Send data to backend for prediction
-        fetch('/api/predict-wpm', {
+        // Nothing new to report; a pushed update would be identical
+        const streaming = liveEvents !== null && liveEvents.readyState === EventSource.OPEN;
+        if (streaming && keystrokeData.length === sentKeystrokes) return;
+        
+        // Send only the keystrokes recorded since the last acknowledged batch
+        const sessionId = liveSessionId;
+        fetch(`/api/live-test/${sessionId}/keystrokes`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
             },
             body: JSON.stringify({
-                partial_text: typedText,
+                seq: sentKeystrokes,
+                keystrokes: keystrokeData.slice(sentKeystrokes),
+                typed_length: userInput.value.length,
                 time_elapsed: elapsedTimeInSeconds,
-                keystroke_data: keystrokeData
+                stream: streaming
             })
         })
-        .then(response => response.json())
+        .then(response => {
+            if (response.status === 404) {
+                // Session expired; the next tick opens a fresh one
+                liveSessionId = null;
+                return null;
+            }
+            return response.json().then(data => {
+                if (sessionId !== liveSessionId) return null;
+                if (response.status === 409) {
+                    // Server is missing keystrokes; resend from where it stopped
+                    sentKeystrokes = data.expected_seq;
+                    return null;
+                }
+                sentKeystrokes = data.seq;
+                // 202 means the metrics were pushed over the event stream
+                return response.status === 202 ? null : data;
+            });
+        })
         .then(data => {
-            predictedWpmDisplay.textContent = `${Math.round(data.predicted_wpm)} WPM`;
+            if (data) {
+                displayLiveMetrics(data);
+            }
         })
         .catch(error => {
             console.error('Error predicting WPM:', error);
@@ -203,6 +239,60 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
+    // Open a server-side live session that accumulates keystrokes incrementally
+    function openLiveSession() {
+        sentKeystrokes = 0;
+        fetch('/api/live-test', { method: 'POST' })
+            .then(response => response.json())
+            .then(data => {
+                liveSessionId = data.session_id;
+                subscribeLiveEvents(data.session_id);
+            })
+            .catch(error => {
+                console.error('Error opening live session:', error);
+            });
+    }
+    
+    // Listen for live metrics pushed by the server
+    function subscribeLiveEvents(sessionId) {
+        if (!window.EventSource) return; // fall back to metrics in the POST responses
+        
+        const source = new EventSource(`/api/live-test/${sessionId}/events`);
+        source.addEventListener('metrics', event => {
+            displayLiveMetrics(JSON.parse(event.data));
+        });
+        source.addEventListener('end', () => {
+            source.close();
+            if (liveEvents === source) liveEvents = null;
+        });
+        source.onerror = () => {
+            // EventSource retries on its own unless the server refused the stream
+            if (source.readyState === EventSource.CLOSED && liveEvents === source) {
+                liveEvents = null;
+            }
+        };
+        liveEvents = source;
+    }
+    
+    // Show live metrics computed by the server
+    function displayLiveMetrics(data) {
+        predictedWpmDisplay.textContent = `${Math.round(data.predicted_wpm)} WPM`;
+    }
+    
+    // Discard the current live session
+    function closeLiveSession() {
+        if (liveEvents) {
+            liveEvents.close();
+            liveEvents = null;
+        }
+        if (liveSessionId) {
+            fetch(`/api/live-test/${liveSessionId}`, { method: 'DELETE' })
+                .catch(error => console.error('Error closing live session:', error));
+        }
+        liveSessionId = null;
+        sentKeystrokes = 0;
+    }
+    
     // End the typing test
     function endTest() {
         testActive = false;
@@ -218,6 +308,8 @@ document.addEventListener('DOMContentLoaded', function() {
         // Hide end test button
         endButton.style.display = 'none';
         
+        closeLiveSession();
+        
         // Submit results to backend
         submitResults(elapsedTimeInSeconds);
     }
@@ -241,6 +333,11 @@ document.addEventListener('DOMContentLoaded', function() {
         })
         .then(response => response.json())
         .then(data => {
+            if (data.status === 'busy') {
+                errorDetails.innerHTML = `<p>${data.message}</p>`;
+                return;
+            }
+            
             // Update detailed results
             wpmDisplay.textContent = data.wpm;
             accuracyDisplay.textContent = `${data.accuracy}%`;
@@ -248,20 +345,9 @@ document.addEventListener('DOMContentLoaded', function() {
             // Display error details
             displayErrorAnalysis(data.error_analysis);
             
-            // Display suggestions
-            displaySuggestions(data.suggestions);
-            
-            // Show prediction
-            if (data.prediction && data.prediction.status === 'success') {
-                const predictionElem = document.createElement('div');
-                predictionElem.innerHTML = `
-                    <h4>Performance Prediction</h4>
-                    <p>Your current average: <strong>${data.prediction.current_avg} WPM</strong></p>
-                    <p>Predicted future speed: <strong>${data.prediction.predicted} WPM</strong></p>
-                    <p>Potential improvement: <strong>${data.prediction.improvement}%</strong></p>
-                `;
-                resultsSection.appendChild(predictionElem);
-            }
+            // Wait for the background analysis
+            suggestionsList.innerHTML = '<p>Analyzing your typing...</p>';
+            pollAnalysis(data.analysis_url, 0);
         })
         .catch(error => {
             console.error('Error submitting results:', error);
@@ -269,6 +355,43 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
+    // Long-poll the server until the background analysis is ready
+    function pollAnalysis(analysisUrl, attempt) {
+        fetch(`${analysisUrl}?wait=20`)
+            .then(response => response.json())
+            .then(data => {
+                if (data.status === 'complete') {
+                    displayAnalysis(data.analysis);
+                } else if (data.status === 'failed' || attempt >= 5) {
+                    suggestionsList.innerHTML = '<p>Detailed analysis is unavailable for this test.</p>';
+                } else {
+                    pollAnalysis(analysisUrl, attempt + 1);
+                }
+            })
+            .catch(error => {
+                console.error('Error fetching analysis:', error);
+                suggestionsList.innerHTML = '<p>Detailed analysis is unavailable for this test.</p>';
+            });
+    }
+    
+    // Display suggestions and prediction from the background analysis
+    function displayAnalysis(analysis) {
+        // Display suggestions
+        displaySuggestions(analysis.suggestions);
+        
+        // Show prediction
+        if (analysis.prediction && analysis.prediction.status === 'success') {
+            const predictionElem = document.createElement('div');
+            predictionElem.innerHTML = `
+                <h4>Performance Prediction</h4>
+                <p>Your current average: <strong>${analysis.prediction.current_avg} WPM</strong></p>
+                <p>Predicted future speed: <strong>${analysis.prediction.predicted} WPM</strong></p>
+                <p>Potential improvement: <strong>${analysis.prediction.improvement}%</strong></p>
+            `;
+            resultsSection.appendChild(predictionElem);
+        }
+    }
+    
     // Display error analysis
     function displayErrorAnalysis(errorAnalysis) {
         if (!errorAnalysis) return;
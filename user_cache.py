@@ -0,0 +1,380 @@
+"""
+Bounded cache for per-user state derived from the database.
+
+The cache holds plain, JSON-serializable snapshots (historical WPM,
+accuracy and error statistics) rather than ORM objects, so entries can
+live in a per-process LRU or in a SQLite file shared by every worker on
+the node. Entries expire after a TTL, the cache never grows beyond its
+size limit, and writers invalidate a user's entry after each submission.
+
+A value loaded from the database is only stored if its key was not
+invalidated while it loaded; otherwise it may predate the write. The
+shared backend keeps a version per key for this, so an invalidation in
+one worker also stops a load in flight in another.
+"""
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+MISSING = object()
+
+
+class CacheBackend(ABC):
+    """Interface for user-state cache storage backends."""
+
+    def __init__(self, max_size: int = 1000, ttl: float = 300):
+        """
+        Initialize the backend.
+
+        Args:
+            max_size: Maximum number of entries kept
+            ttl: Seconds after which an entry expires
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.evictions = 0
+
+    @abstractmethod
+    def get(self, key: str) -> Any:
+        """Return the cached value for a key, or ``MISSING``."""
+
+    @abstractmethod
+    def set(self, key: str, value: Any) -> None:
+        """Store a value, evicting old entries if the cache is full."""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Remove a key if present."""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Remove every entry."""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Return the number of entries."""
+
+    def version(self, key: str) -> Optional[int]:
+        """
+        Return how many times a key has been deleted, for ``set_if_version``.
+
+        Returns:
+            The key's version, or None if the backend does not track versions
+            (in-process backends: ``UserStateCache`` tracks its own loads)
+        """
+        return None
+
+    def set_if_version(self, key: str, value: Any, version: Optional[int]) -> bool:
+        """
+        Store a value unless the key was deleted since ``version`` was read.
+
+        Args:
+            key: Cache key
+            value: Value to store
+            version: Result of ``version(key)`` taken before the value was loaded
+
+        Returns:
+            Whether the value was stored
+        """
+        self.set(key, value)
+        return True
+
+
+class LRUCacheBackend(CacheBackend):
+    """In-process least-recently-used cache with per-entry expiry."""
+
+    def __init__(self, max_size: int = 1000, ttl: float = 300):
+        super().__init__(max_size, ttl)
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.evictions += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """
+    Cache stored in a local SQLite file shared by all workers on a node.
+
+    Values are stored as JSON. The file uses WAL mode so readers in other
+    processes are not blocked by writers. Deleting a key bumps its version
+    in ``user_cache_versions``; versions are forgotten one TTL after their
+    last bump, as no load should take that long.
+    """
+
+    def __init__(self, path: str, max_size: int = 1000, ttl: float = 300):
+        """
+        Initialize the backend.
+
+        Args:
+            path: Path of the SQLite cache file
+            max_size: Maximum number of entries kept
+            ttl: Seconds after which an entry expires
+        """
+        super().__init__(max_size, ttl)
+        self.path = path
+        self._local = threading.local()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS user_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_user_cache_accessed ON user_cache (accessed_at)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS user_cache_versions ("
+            "key TEXT PRIMARY KEY, version INTEGER NOT NULL, bumped_at REAL NOT NULL)"
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return this thread's connection, reconnecting after a fork."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key: str) -> Any:
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT value, expires_at FROM user_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return MISSING
+
+        value, expires_at = row
+        now = time.time()
+        if expires_at < now:
+            conn.execute("DELETE FROM user_cache WHERE key = ?", (key,))
+            self.evictions += 1
+            return MISSING
+
+        conn.execute("UPDATE user_cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(value)
+
+    def set(self, key: str, value: Any) -> None:
+        conn = self._connection()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO user_cache (key, value, expires_at, accessed_at) "
+            "VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value), now + self.ttl, now)
+        )
+        self._evict(conn, now)
+
+    def version(self, key: str) -> Optional[int]:
+        row = self._connection().execute(
+            "SELECT version FROM user_cache_versions WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def set_if_version(self, key: str, value: Any, version: Optional[int]) -> bool:
+        if version is None:
+            self.set(key, value)
+            return True
+        conn = self._connection()
+        now = time.time()
+        # One statement, so a delete in another process lands either before the
+        # check (nothing is stored) or after the insert (the delete removes it)
+        stored = conn.execute(
+            "INSERT OR REPLACE INTO user_cache (key, value, expires_at, accessed_at) "
+            "SELECT ?, ?, ?, ? WHERE COALESCE("
+            "(SELECT version FROM user_cache_versions WHERE key = ?), 0) = ?",
+            (key, json.dumps(value), now + self.ttl, now, key, version)
+        ).rowcount > 0
+        self._evict(conn, now)
+        return stored
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        """Drop expired entries, then the least recently used ones over the limit."""
+        expired = conn.execute("DELETE FROM user_cache WHERE expires_at < ?", (now,)).rowcount
+        overflow = len(self) - self.max_size
+        if overflow > 0:
+            conn.execute(
+                "DELETE FROM user_cache WHERE key IN ("
+                "SELECT key FROM user_cache ORDER BY accessed_at LIMIT ?)", (overflow,)
+            )
+        self.evictions += expired + max(overflow, 0)
+        conn.execute("DELETE FROM user_cache_versions WHERE bumped_at < ?", (now - self.ttl,))
+
+    def delete(self, key: str) -> None:
+        conn = self._connection()
+        # Bump the version first: a conditional set between the two statements
+        # then sees the new version and stores nothing
+        conn.execute(
+            "INSERT INTO user_cache_versions (key, version, bumped_at) VALUES (?, 1, ?) "
+            "ON CONFLICT(key) DO UPDATE SET version = version + 1, bumped_at = excluded.bumped_at",
+            (key, time.time())
+        )
+        conn.execute("DELETE FROM user_cache WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        self._connection().execute("DELETE FROM user_cache")
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM user_cache").fetchone()[0]
+
+
+def create_cache_backend(backend: str = 'memory', max_size: int = 1000, ttl: float = 300,
+                         path: Optional[str] = None) -> CacheBackend:
+    """
+    Create a cache backend by name.
+
+    Args:
+        backend: ``memory`` for an in-process LRU or ``sqlite`` for a shared file
+        max_size: Maximum number of entries kept
+        ttl: Seconds after which an entry expires
+        path: Cache file path for the ``sqlite`` backend
+
+    Returns:
+        The configured CacheBackend
+    """
+    if backend == 'sqlite':
+        return SQLiteCacheBackend(path or os.path.join('data', 'user_cache.sqlite'), max_size, ttl)
+    if backend != 'memory':
+        logger.warning(f"Unknown user cache backend '{backend}', using in-process LRU")
+    return LRUCacheBackend(max_size, ttl)
+
+
+class UserStateCache:
+    """Per-user state cache with hit, miss, eviction and invalidation counters."""
+
+    def __init__(self, backend: Optional[CacheBackend] = None):
+        """
+        Initialize the cache.
+
+        Args:
+            backend: Storage backend (defaults to an in-process LRU)
+        """
+        self.backend = backend if backend is not None else LRUCacheBackend()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+        # key -> [loads in flight, generation]; invalidate bumps the generation
+        # so a load that read the database before the write is not stored.
+        # Invalidations in other processes are caught by the backend's version
+        self._loads: Dict[str, list] = {}
+
+    @staticmethod
+    def _key(user_id: str, field: str) -> str:
+        return f"{field}:{user_id}"
+
+    def get_or_load(self, user_id: str, field: str, loader: Callable[[], Any]) -> Any:
+        """
+        Return a cached field of a user's state, loading it on a miss.
+
+        Args:
+            user_id: Unique user identifier
+            field: Name of the state field (e.g. ``wpm_history``)
+            loader: Callable returning the fresh value from the database
+
+        Returns:
+            The cached or freshly loaded value
+        """
+        key = self._key(user_id, field)
+        value = self.backend.get(key)
+        if value is not MISSING:
+            with self._lock:
+                self.hits += 1
+            return value
+
+        with self._lock:
+            self.misses += 1
+            load = self._loads.setdefault(key, [0, 0])
+            load[0] += 1
+            generation = load[1]
+        version = self.backend.version(key)
+        try:
+            value = loader()
+        except Exception:
+            with self._lock:
+                self._finish_load(key, load)
+            raise
+
+        with self._lock:
+            self._finish_load(key, load)
+            # An invalidation during the load means the value may predate the write
+            if load[1] == generation:
+                self.backend.set_if_version(key, value, version)
+        return value
+
+    def _finish_load(self, key: str, load: list) -> None:
+        """Stop tracking a key once no load of it is in flight (lock held)."""
+        load[0] -= 1
+        if load[0] == 0:
+            del self._loads[key]
+
+    def invalidate(self, user_id: str, *fields: str) -> None:
+        """
+        Drop cached state for a user after a write.
+
+        Args:
+            user_id: Unique user identifier
+            *fields: Fields to drop
+        """
+        with self._lock:
+            for field in fields:
+                key = self._key(user_id, field)
+                load = self._loads.get(key)
+                if load is not None:
+                    load[1] += 1
+                self.backend.delete(key)
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, int]:
+        """Return cache counters for monitoring."""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.backend.evictions,
+            'invalidations': self.invalidations,
+            'size': len(self.backend),
+            'max_size': self.backend.max_size
+        }
@@ -1,7 +1,7 @@
 import re
-import difflib
-from typing import Dict, List, Any, Tuple
 import logging
+from typing import Dict, List, Any, Tuple
+from alignment import align_texts
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +17,20 @@ def calculate_wpm(original_text: str, typed_text: str, time_taken_seconds: float
         typed_text: The text that was actually typed
         time_taken_seconds: Time taken to type the text in seconds
         
+    Returns:
+        float: The calculated WPM
+    """
+    # Use typed_text length for WPM calculation
+    return calculate_wpm_from_length(len(typed_text), time_taken_seconds)
+
+def calculate_wpm_from_length(char_count: int, time_taken_seconds: float) -> float:
+    """
+    Calculate words per minute (WPM) from the number of characters typed.
+    
+    Args:
+        char_count: Number of characters typed
+        time_taken_seconds: Time taken to type them in seconds
+        
     Returns:
         float: The calculated WPM
     """
@@ -26,9 +40,6 @@ def calculate_wpm(original_text: str, typed_text: str, time_taken_seconds: float
     # Convert time to minutes
     time_taken_minutes = time_taken_seconds / 60.0
     
-    # Use typed_text length for WPM calculation
-    char_count = len(typed_text)
-    
     # Calculate WPM (characters / 5) / minutes
     # 5 is the standard word length used in typing tests
     wpm = (char_count / 5) / time_taken_minutes
@@ -49,55 +60,27 @@ def analyze_errors(original_text: str, typed_text: str) -> Dict[str, Any]:
         - error_count: Total number of errors
         - word_errors: List of incorrectly typed words
         - character_errors: Dict of character-level errors
-        - error_positions: List of error positions in the text
+        - error_positions: List of error positions in the original text
+        - substitutions, insertions, deletions: Character error counts by kind
     """
-    # Tokenize into words using simple split (avoids NLTK tokenization issues)
-    original_words = original_text.split()
-    typed_words = typed_text.split()
+    # Align the whole typed stream so a skipped or extra word only costs itself
+    alignment = align_texts(original_text, typed_text)
     
-    # Initialize error tracking
     total_chars = len(original_text)
-    error_count = 0
-    word_errors = []
+    word_errors = [error._asdict() for error in alignment.word_errors]
     character_errors = {}
     error_positions = []
+    operation_counts = {'substitution': 0, 'insertion': 0, 'deletion': 0}
     
-    # Compare word by word
-    for i, (orig_word, typed_word) in enumerate(zip(original_words, typed_words)):
-        if orig_word != typed_word:
-            word_errors.append({
-                'original': orig_word,
-                'typed': typed_word,
-                'position': i
-            })
-            
-            # Character-level analysis using difflib
-            matcher = difflib.SequenceMatcher(None, orig_word, typed_word)
-            for tag, i1, i2, j1, j2 in matcher.get_opcodes():
-                if tag != 'equal':
-                    error_count += max(i2 - i1, j2 - j1)
-                    
-                    # Track specific character errors
-                    if tag == 'replace':
-                        for o_idx, t_idx in zip(range(i1, i2), range(j1, j2)):
-                            if o_idx < len(orig_word) and t_idx < len(typed_word):
-                                error_char = f"{orig_word[o_idx]}->{typed_word[t_idx]}"
-                                character_errors[error_char] = character_errors.get(error_char, 0) + 1
-                    elif tag == 'delete':
-                        for o_idx in range(i1, i2):
-                            if o_idx < len(orig_word):
-                                error_char = f"{orig_word[o_idx]}->∅"  # missing character
-                                character_errors[error_char] = character_errors.get(error_char, 0) + 1
-                    elif tag == 'insert':
-                        for t_idx in range(j1, j2):
-                            if t_idx < len(typed_word):
-                                error_char = f"∅->{typed_word[t_idx]}"  # extra character
-                                character_errors[error_char] = character_errors.get(error_char, 0) + 1
-    
-    # Add additional errors for length difference
-    len_diff = abs(len(original_words) - len(typed_words))
-    if len_diff > 0:
-        error_count += len_diff
+    for error in alignment.char_errors:
+        error_char = f"{error.original}->{error.typed}"
+        character_errors[error_char] = character_errors.get(error_char, 0) + 1
+        operation_counts[error.kind] += 1
+        if not error_positions or error_positions[-1] != error.position:
+            error_positions.append(error.position)
+    
+    # Original words never reached count one error each
+    error_count = len(alignment.char_errors) + alignment.unreached_words
     
     # Calculate accuracy
     accuracy = max(0, (1 - (error_count / max(1, total_chars))) * 100)
@@ -112,6 +95,9 @@ def analyze_errors(original_text: str, typed_text: str) -> Dict[str, Any]:
         'character_errors': character_errors,
         'common_errors': common_errors,
         'error_positions': error_positions,
+        'substitutions': operation_counts['substitution'],
+        'insertions': operation_counts['insertion'],
+        'deletions': operation_counts['deletion'],
         'total_characters': total_chars
     }
 
@@ -147,6 +133,10 @@ def generate_personalized_suggestions(error_analysis: Dict[str, Any],
         if slow_keys:
             suggestions.append(f"Work on speed for keys: {', '.join(slow_keys)}")
     
+    # Point to the drill, which targets exactly these keys
+    if any(s.startswith(("Practice keys:", "Work on speed for keys:")) for s in suggestions):
+        suggestions.append("Choose the Weak Keys Drill to practise these keys")
+    
     # Analyze accuracy issues
     accuracy = error_analysis.get('accuracy', 0)
     if accuracy < 95: